@@ -1,16 +1,43 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from flask import Flask, render_template, request, jsonify, redirect, url_for, Response
 import os
-from datetime import datetime
+import hmac
+from functools import wraps
+from datetime import date
+import io
 import json
 from urllib.parse import urlparse
 from flask_cors import CORS
+from pool_db import crear_pool, PoolAgotado
+from catalogo import CacheCatalogo, RespuestaInvalida, preparar_envio
+from ingesta import ColaLlena, crear_cola
+import estadisticas
+import migraciones
+from repositorio import crear_repositorio
+import consultas_lentas
+from cache_resultados import CacheResultados
+from cache_paginas import CachePaginas
+import exportar
+import importar
+from difusion import DifusorLleno, crear_difusor
+import estaticos
+import compresion
+import metricas
 
 app = Flask(__name__)
+# Latencia, errores y consultas por ruta (/metrics); antes que los demás hooks para medirlos
+metricas.registrar(app)
 
 CORS(app)
 
+# script.js y style.css con huella y precomprimidos (asset_url en las plantillas)
+assets = estaticos.registrar(app)
+
+# HTML y JSON comprimidos según Accept-Encoding (una vez por ETag)
+compresor = compresion.registrar(app,
+                                 min_bytes=int(os.environ.get('COMPRESION_MIN_BYTES', 1024)),
+                                 nivel=int(os.environ.get('COMPRESION_NIVEL', 6)),
+                                 max_entradas=int(os.environ.get('COMPRESION_CACHE', 256)))
+
 # Configuración de la base de datos para Railway/Render
 DATABASE_URL = os.environ.get('DATABASE_URL')
 
@@ -24,519 +51,289 @@ else:
     if DATABASE_URL.startswith('postgres://'):
         DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
 
+# Pool de conexiones del worker (una conexión por hilo en SQLite)
+db_pool = crear_pool(DATABASE_URL, USE_SQLITE)
+
 def get_db_connection():
-    if USE_SQLITE:
-        import sqlite3
-        conn = sqlite3.connect('survey_local.db')
-        conn.row_factory = sqlite3.Row
-        return conn
-    else:
-        conn = psycopg2.connect(DATABASE_URL)
-        return conn
+    """Obtener una conexión del pool; conn.close() la devuelve"""
+    return db_pool.obtener()
+
+# Con un paso de release (python migraciones.py) los workers no necesitan migrar;
+# MIGRACIONES_AUTO=0 hace que un esquema atrasado se reporte en vez de migrarse
+MIGRACIONES_AUTO = os.environ.get('MIGRACIONES_AUTO', '1') != '0'
+
+# Sentencias calientes (catálogo, envíos, contadores, dashboard): una llamada por
+# operación, preparadas por conexión en PostgreSQL
+# Las que superan CONSULTAS_LENTAS_MS quedan en /api/consultas-lentas (con su plan si tardan más aún)
+consultas_lentas_registro = consultas_lentas.crear_registro()
+repositorio = crear_repositorio(db_pool, USE_SQLITE, consultas_lentas_registro)
+
+# Catálogo de preguntas/opciones en memoria (puntajes y validación sin consultas)
+catalogo = CacheCatalogo(repositorio)
 
 def init_db():
-    """Inicializar la base de datos con datos de ejemplo"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
+    """Verificar la versión del esquema (una lectura); migrar solo si está atrasado"""
     try:
-        # Crear tablas si no existen (compatible con SQLite y PostgreSQL)
-        if USE_SQLITE:
-            # Crear tablas para SQLite
-            cur.execute('''
-                CREATE TABLE IF NOT EXISTS questions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    texto TEXT NOT NULL
-                )
-            ''')
-            
-            cur.execute('''
-                CREATE TABLE IF NOT EXISTS options (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    pregunta_id INTEGER,
-                    texto TEXT NOT NULL,
-                    puntaje INTEGER NOT NULL DEFAULT 0,
-                    FOREIGN KEY (pregunta_id) REFERENCES questions (id)
-                )
-            ''')
-            
-            cur.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    nombre TEXT NOT NULL,
-                    email TEXT NOT NULL,
-                    edad INTEGER NOT NULL,
-                    sexo TEXT NOT NULL,
-                    puntaje_total INTEGER DEFAULT 0,
-                    clasificacion TEXT DEFAULT 'leve',
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            cur.execute('''
-                CREATE TABLE IF NOT EXISTS responses (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    pregunta_id INTEGER,
-                    respuesta INTEGER,
-                    puntaje INTEGER DEFAULT 0,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (id),
-                    FOREIGN KEY (pregunta_id) REFERENCES questions (id),
-                    FOREIGN KEY (respuesta) REFERENCES options (id)
-                )
-            ''')
-        else:
-            # Crear tablas para PostgreSQL
-            cur.execute('''
-                CREATE TABLE IF NOT EXISTS questions (
-                    id SERIAL PRIMARY KEY,
-                    texto TEXT NOT NULL
-                )
-            ''')
-            
-            cur.execute('''
-                CREATE TABLE IF NOT EXISTS options (
-                    id SERIAL PRIMARY KEY,
-                    pregunta_id INTEGER REFERENCES questions(id) ON DELETE CASCADE,
-                    texto TEXT NOT NULL,
-                    puntaje INTEGER NOT NULL DEFAULT 0
-                )
-            ''')
-            
-            cur.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id SERIAL PRIMARY KEY,
-                    nombre VARCHAR(255) NOT NULL,
-                    email VARCHAR(255) NOT NULL,
-                    edad INTEGER NOT NULL,
-                    sexo VARCHAR(50) NOT NULL,
-                    puntaje_total INTEGER DEFAULT 0,
-                    clasificacion VARCHAR(50) DEFAULT 'leve',
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            cur.execute('''
-                CREATE TABLE IF NOT EXISTS responses (
-                    id SERIAL PRIMARY KEY,
-                    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                    pregunta_id INTEGER REFERENCES questions(id) ON DELETE CASCADE,
-                    respuesta INTEGER REFERENCES options(id) ON DELETE CASCADE,
-                    puntaje INTEGER DEFAULT 0,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-
-        # Insertar preguntas de ejemplo si no existen
-        cur.execute("SELECT COUNT(*) FROM questions")
-        count_result = cur.fetchone()
-        count = count_result[0] if USE_SQLITE else count_result[0]
-        
-        if count == 0:
-            questions = [
-                "¿Cómo describirías el ambiente en tu hogar?",
-                "¿Te han hecho sentir miedo, humillado/a o culpable dentro de tu familia recientemente?",
-                "¿Te han hecho sentir miedo con miradas, gestos o silencios prolongados?",
-                "¿A quién acudirías si te sintieras en peligro dentro de tu hogar?",
-                "¿Alguna vez alguien en tu familia te ha golpeado, empujado o agredido físicamente?",
-                "¿Has presenciado actos de violencia hacia ti u otros miembros de tu familia?"
-            ]
-            
-            for i, question in enumerate(questions, 1):
-                if USE_SQLITE:
-                    cur.execute("INSERT INTO questions (texto) VALUES (?)", (question,))
-                else:
-                    cur.execute("INSERT INTO questions (texto) VALUES (%s)", (question,))
-            
-            # Insertar opciones para cada pregunta con puntajes
-            options = [
-                # Pregunta 1 - Ambiente en el hogar
-                (1, "Tranquilo y de respeto mutuo", 0),
-                (1, "A veces tenso, con discusiones esporádicas", 1),
-                (1, "Frecuentemente hay gritos, insultos o agresiones", 2),
-                (1, "Me siento incómodo/a o inseguro/a en casa", 3),
-                
-                # Pregunta 2 - Miedo, humillación, culpa
-                (2, "No, nunca", 0),
-                (2, "A veces, pero no sé si es normal", 1),
-                (2, "Sí, con frecuencia", 2),
-                (2, "Sí, siempre", 3),
-                
-                # Pregunta 3 - Miedo con gestos
-                (3, "No, nunca", 0),
-                (3, "A veces", 1),
-                (3, "Sí, frecuentemente", 2),
-                (3, "Sí, constantemente", 3),
-                
-                # Pregunta 4 - A quién acudir
-                (4, "A un amigo/familiar de confianza", 0),
-                (4, "A un profesional de salud, asistente social o Carabineros", 1),
-                (4, "No sabría qué hacer", 2),
-                (4, "No tengo a quién acudir", 3),
-                
-                # Pregunta 5 - Agresión física
-                (5, "No, nunca", 0),
-                (5, "Una vez, en una situación puntual", 1),
-                (5, "Varias veces", 2),
-                (5, "Sí, actualmente ocurre", 3),
-                
-                # Pregunta 6 - Presenciar violencia
-                (6, "No", 0),
-                (6, "Sí, una vez", 1),
-                (6, "Varias veces", 2),
-                (6, "Sí, recientemente", 3)
-            ]
-            
-            for question_id, texto, puntaje in options:
-                if USE_SQLITE:
-                    cur.execute("INSERT INTO options (pregunta_id, texto, puntaje) VALUES (?, ?, ?)", 
-                              (question_id, texto, puntaje))
-                else:
-                    cur.execute("INSERT INTO options (pregunta_id, texto, puntaje) VALUES (%s, %s, %s)", 
-                              (question_id, texto, puntaje))
-        
-        conn.commit()
-        print("✅ Base de datos inicializada correctamente")
+        aplicadas = migraciones.asegurar_esquema(get_db_connection, USE_SQLITE, auto=MIGRACIONES_AUTO)
+        if aplicadas:
+            # El cuestionario pudo cambiar: recargar el catálogo en memoria
+            catalogo.invalidar()
+            print("✅ Base de datos inicializada correctamente")
     except Exception as e:
         print(f"❌ Error inicializando DB: {e}")
-        conn.rollback()
-    finally:
-        cur.close()
-        conn.close()
+
+@app.errorhandler(PoolAgotado)
+def pool_agotado(e):
+    print(f"❌ Pool de conexiones agotado: {e}")
+    response = jsonify({'success': False, 'error': 'Servidor ocupado, intenta nuevamente'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+# Páginas renderizadas una vez por versión y servidas con ETag/304
+cache_paginas = CachePaginas(max_age=int(os.environ.get('PAGINAS_MAX_AGE', 60)))
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return cache_paginas.servir('index', None, lambda: render_template('index.html'))
 
 @app.route('/mision')
 def mision():
-    return render_template('mision.html')
+    return cache_paginas.servir('mision', None, lambda: render_template('mision.html'))
 
 @app.route('/survey')
 def survey():
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor) if not USE_SQLITE else conn.cursor()
-    
+    # Preguntas y opciones salen del catálogo en memoria: sin consultas en régimen estable
     try:
-        # Obtener preguntas y opciones
-        if USE_SQLITE:
-            cur.execute("SELECT id, texto as pregunta FROM questions ORDER BY id")
-            questions_data = cur.fetchall()
-            
-            questions = []
-            for q in questions_data:
-                cur.execute("SELECT id, texto FROM options WHERE pregunta_id = ? ORDER BY id", (q['id'],))
-                opciones = cur.fetchall()
-                questions.append({
-                    'id': q['id'],
-                    'pregunta': q['pregunta'],
-                    'opciones': [{'id': o['id'], 'texto': o['texto']} for o in opciones]
-                })
-        else:
-            cur.execute("""
-                SELECT q.id, q.texto as pregunta, 
-                       array_agg(json_build_object('id', o.id, 'texto', o.texto) ORDER BY o.id) as opciones
-                FROM questions q
-                LEFT JOIN options o ON q.id = o.pregunta_id
-                GROUP BY q.id, q.texto
-                ORDER BY q.id
-            """)
-            questions_raw = cur.fetchall()
-            questions = []
-            for q in questions_raw:
-                questions.append({
-                    'id': q['id'],
-                    'pregunta': q['pregunta'],
-                    'opciones': q['opciones'] if q['opciones'] else []
-                })
+        actual = catalogo.obtener()
     except Exception as e:
         print(f"❌ Error en survey: {e}")
-        questions = []
-    finally:
-        cur.close()
-        conn.close()
+        return render_template('survey.html', questions=[])
     
-    return render_template('survey.html', questions=questions)
+    return cache_paginas.servir('survey', actual.version,
+                                lambda: render_template('survey.html', questions=actual.preguntas))
+
+# Caché del contexto del dashboard: un solo recálculo a la vez por worker
+# (una entrada por rango de fechas). Todas las cifras salen de las tablas de
+# contadores (O(opciones) filas); con rango de fechas, de los rollups diarios
+cache_dashboard = CacheResultados(repositorio.leer_dashboard,
+                                  ttl=float(os.environ.get('DASHBOARD_CACHE_TTL', 5)))
+cache_series = CacheResultados(repositorio.leer_series,
+                               ttl=float(os.environ.get('DASHBOARD_CACHE_TTL', 5)))
+
+def invalidar_caches():
+    """Vencer los cálculos cacheados tras escribir envíos y avisar a los dashboards en vivo"""
+    cache_dashboard.invalidar()
+    cache_series.invalidar()
+    difusor.notificar()
+
+def leer_rango():
+    """Fechas ?from=&to= (YYYY-MM-DD, inclusivas); las inválidas se ignoran"""
+    rango = []
+    for parametro in ('from', 'to'):
+        try:
+            rango.append(date.fromisoformat(request.args.get(parametro, '')))
+        except ValueError:
+            rango.append(None)
+    desde, hasta = rango
+    if desde and hasta and desde > hasta:
+        desde, hasta = hasta, desde
+    return desde, hasta
 
 @app.route('/dashboard')
 def dashboard():
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor) if not USE_SQLITE else conn.cursor()
+    # Solo el armazón HTML (cacheable): las cifras llegan desde /api/stats
+    return cache_paginas.servir('dashboard', None, lambda: render_template('dashboard.html'))
+
+# Un hilo por worker revisa la versión de datos y reparte los deltas a todos los dashboards
+difusor = crear_difusor(repositorio.version_datos, repositorio.leer_contadores)
+
+@app.route('/api/stats/stream')
+def api_stats_stream():
+    """Server-Sent Events: deltas de contadores (absolutos) a medida que se confirman envíos"""
+    try:
+        suscripcion = difusor.suscribir()
+    except DifusorLleno:
+        response = jsonify({'error': 'Demasiadas conexiones en vivo, usa /api/stats'})
+        response.headers['Retry-After'] = '30'
+        return response, 503
     
+    version = request.headers.get('Last-Event-ID') or request.args.get('version')
+    response = Response(difusor.transmitir(suscripcion, version), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    # Si el cliente se va antes de empezar a transmitir, la suscripción igual se libera
+    response.call_on_close(lambda: difusor.cancelar(suscripcion))
+    return response
+
+@app.route('/api/stats')
+def api_stats():
+    """Cifras del dashboard en JSON (?from=&to=) con ETag según la versión de datos"""
+    desde, hasta = leer_rango()
+    sufijo = f"-{desde or ''}-{hasta or ''}" if desde or hasta else ''
     try:
-        # Total de ENCUESTAS COMPLETADAS
-        cur.execute("SELECT COUNT(*) as total FROM users")
-        result = cur.fetchone()
-        total_surveys = result[0] if USE_SQLITE else result['total']
-        
-        # Estadísticas por género CON PORCENTAJES
-        cur.execute("SELECT sexo, COUNT(*) as count FROM users GROUP BY sexo")
-        gender_data = cur.fetchall()
-        
-        # Calcular porcentajes de género
-        total_users = sum(row['count'] if not USE_SQLITE else row[1] for row in gender_data)
-        gender_stats = []
-        for row in gender_data:
-            count = row['count'] if not USE_SQLITE else row[1]
-            sexo = row['sexo'] if not USE_SQLITE else row[0]
-            percentage = (count / total_users * 100) if total_users > 0 else 0
-            gender_stats.append({
-                'sexo': sexo,
-                'count': count,
-                'percentage': round(percentage, 1)
-            })
+        # 304 con una sola búsqueda por clave si el cliente ya tiene la versión actual
+        version = repositorio.version_datos()
+        if request.if_none_match.contains(f"v{version}{sufijo}"):
+            response = Response(status=304)
+            response.set_etag(f"v{version}{sufijo}")
+            response.cache_control.no_cache = True
+            return response
         
-        # Contar encuestas anónimas
-        cur.execute("SELECT COUNT(*) as count FROM users WHERE nombre = 'Anónimo'")
-        result = cur.fetchone()
-        total_anonymous = result['count'] if not USE_SQLITE else result[0]
-        
-        # Porcentaje de encuestas anónimas
-        anonymous_percentage = (total_anonymous / total_surveys * 100) if total_surveys > 0 else 0
-        
-        # Estadísticas de CLASIFICACIÓN
-        cur.execute("SELECT clasificacion, COUNT(*) as count FROM users GROUP BY clasificacion")
-        classification_data = cur.fetchall()
-        
-        # Calcular porcentajes de clasificación
-        total_classified = sum(row['count'] if not USE_SQLITE else row[1] for row in classification_data)
-        classification_stats = []
-        for row in classification_data:
-            count = row['count'] if not USE_SQLITE else row[1]
-            clasificacion = row['clasificacion'] if not USE_SQLITE else row[0]
-            percentage = (count / total_classified * 100) if total_classified > 0 else 0
-            classification_stats.append({
-                'clasificacion': clasificacion,
-                'count': count,
-                'percentage': round(percentage, 1)
-            })
-        
-        # Estadísticas por pregunta
-        if USE_SQLITE:
-            cur.execute("""
-                SELECT q.id, q.texto as pregunta,
-                       o.id as option_id, o.texto as opcion, o.puntaje,
-                       COUNT(r.id) as count
-                FROM questions q
-                LEFT JOIN options o ON q.id = o.pregunta_id
-                LEFT JOIN responses r ON o.id = r.respuesta
-                GROUP BY q.id, q.texto, o.id, o.texto, o.puntaje
-                ORDER BY q.id, o.id
-            """)
-            question_stats = cur.fetchall()
+        if desde is None and hasta is None:
+            contexto = cache_dashboard.obtener()
         else:
-            cur.execute("""
-                SELECT q.id, q.texto as pregunta,
-                       o.id as option_id, o.texto as opcion, o.puntaje,
-                       COUNT(r.id) as count
-                FROM questions q
-                LEFT JOIN options o ON q.id = o.pregunta_id
-                LEFT JOIN responses r ON o.id = r.respuesta
-                GROUP BY q.id, q.texto, o.id, o.texto, o.puntaje
-                ORDER BY q.id, o.id
-            """)
-            question_stats = cur.fetchall()
-        
-        # Organizar estadísticas por pregunta
-        questions_data = {}
-        for stat in question_stats:
-            if USE_SQLITE:
-                q_id, pregunta, option_id, opcion, puntaje, count = stat
-            else:
-                q_id = stat['id']
-                pregunta = stat['pregunta']
-                opcion = stat['opcion']
-                count = stat['count']
-            
-            if q_id not in questions_data:
-                questions_data[q_id] = {
-                    'pregunta': pregunta,
-                    'opciones': [],
-                    'total_responses': 0
-                }
-            
-            questions_data[q_id]['opciones'].append({
-                'opcion': opcion,
-                'count': count
-            })
-            questions_data[q_id]['total_responses'] += count
-        
-        # Calcular porcentajes
-        for q_data in questions_data.values():
-            total = q_data['total_responses']
-            for opcion in q_data['opciones']:
-                opcion['percentage'] = round((opcion['count'] / total * 100), 1) if total > 0 else 0
-        
+            contexto = cache_dashboard.obtener((desde, hasta), desde, hasta)
+    except PoolAgotado:
+        raise
     except Exception as e:
-        print(f"❌ Error en dashboard: {e}")
-        total_surveys = 0
-        gender_stats = []
-        anonymous_percentage = 0
-        classification_stats = []
-        questions_data = {}
-    
-    finally:
-        cur.close()
-        conn.close()
+        print(f"❌ Error en stats: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
     
-    return render_template('dashboard.html', 
-                         total_surveys=total_surveys,
-                         gender_stats=gender_stats,
-                         anonymous_percentage=round(anonymous_percentage, 1),
-                         classification_stats=classification_stats,
-                         questions_data=questions_data)
+    # El ETag describe los datos entregados (el cálculo cacheado puede ser anterior)
+    response = jsonify(estadisticas.a_json(contexto, desde, hasta))
+    response.set_etag(f"v{contexto['data_version']}{sufijo}")
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@app.route('/api/series')
+def series():
+    """Envíos y mezcla de riesgo por hora o por día (por defecto, los últimos 30 días)"""
+    try:
+        desde, hasta = estadisticas.rango_series(*leer_rango())
+    except estadisticas.RangoInvalido as e:
+        return jsonify({'error': str(e)}), 400
+    granularidad = estadisticas.granularidad_series(request.args.get('granularidad'))
+    try:
+        return jsonify(cache_series.obtener((desde, hasta, granularidad), desde, hasta, granularidad))
+    except Exception as e:
+        print(f"❌ Error en series: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+def escribir_lote(envios):
+    """Escribir un lote de envíos en una transacción (usado por la cola de ingesta)"""
+    repositorio.guardar_encuestas(envios)
+    invalidar_caches()
+
+# Ingesta diferida opcional (INGESTA_MODO=cola)
+cola_ingesta = crear_cola(escribir_lote, db_pool.es_transitorio)
 
 @app.route('/api/submit-survey', methods=['POST'])
 def submit_survey():
     try:
-        data = request.json
-        if not data:
-            return jsonify({'success': False, 'error': 'No data received'}), 400
+        # Validar y puntuar contra el catálogo en memoria (sin consultas)
+        try:
+            envio = preparar_envio(catalogo, request.get_json(silent=True))
+        except RespuestaInvalida as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
-        conn = get_db_connection()
-        # IMPORTANTE: Usar RealDictCursor para PostgreSQL para evitar el error de tuple
-        cur = conn.cursor(cursor_factory=RealDictCursor) if not USE_SQLITE else conn.cursor()
+        resultado = {
+            'success': True, 
+            'puntaje': envio.puntaje_total, 
+            'clasificacion': envio.clasificacion
+        }
+        
+        if cola_ingesta is not None:
+            # Modo cola: se responde sin esperar a la base de datos
+            try:
+                cola_ingesta.encolar(envio)
+            except ColaLlena as e:
+                response = jsonify({'success': False, 'error': 'Servidor ocupado, intenta nuevamente'})
+                response.headers['Retry-After'] = str(e.retry_after)
+                return response, 503
+            resultado['encolada'] = True
+            return jsonify(resultado), 202
         
         try:
-            user_id = None
-            puntaje_total = 0
-            
-            # Validar que hay respuestas
-            if 'responses' not in data or not data['responses']:
-                return jsonify({'success': False, 'error': 'No responses provided'}), 400
-            
-            # Calcular puntaje total primero
-            for question_id, option_id in data['responses'].items():
-                if USE_SQLITE:
-                    cur.execute("SELECT puntaje FROM options WHERE id = ?", (int(option_id),))
-                    result = cur.fetchone()
-                    if result:
-                        puntaje_total += result['puntaje']
-                else:
-                    cur.execute("SELECT puntaje FROM options WHERE id = %s", (int(option_id),))
-                    result = cur.fetchone()
-                    if result:
-                        puntaje_total += result['puntaje']
-            
-            # Determinar clasificación
-            if puntaje_total <= 5:
-                clasificacion = 'Leve'
-            elif puntaje_total <= 11:
-                clasificacion = 'Moderado'
-            else:
-                clasificacion = 'Grave'
-            
-            # CREAR USUARIO SIEMPRE (anónimo o no)
-            if data.get('is_anonymous'):
-                # Para encuestas anónimas, usar datos genéricos
-                if USE_SQLITE:
-                    cur.execute("""
-                        INSERT INTO users (nombre, email, edad, sexo, puntaje_total, clasificacion, timestamp)
-                        VALUES (?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        "Anónimo",
-                        "anonimo@encuesta.com",
-                        0,
-                        "Prefiero no decirlo",
-                        puntaje_total,
-                        clasificacion,
-                        datetime.now()
-                    ))
-                    user_id = cur.lastrowid
-                else:
-                    cur.execute("""
-                        INSERT INTO users (nombre, email, edad, sexo, puntaje_total, clasificacion, timestamp)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s)
-                        RETURNING id
-                    """, (
-                        "Anónimo",
-                        "anonimo@encuesta.com",
-                        0,
-                        "Prefiero no decirlo",
-                        puntaje_total,
-                        clasificacion,
-                        datetime.now()
-                    ))
-                    result = cur.fetchone()
-                    user_id = result['id']
-            else:
-                # Para encuestas con datos personales
-                if USE_SQLITE:
-                    cur.execute("""
-                        INSERT INTO users (nombre, email, edad, sexo, puntaje_total, clasificacion, timestamp)
-                        VALUES (?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        data.get('nombre', ''),
-                        data.get('email', ''),
-                        data.get('edad', 0),
-                        data.get('sexo', ''),
-                        puntaje_total,
-                        clasificacion,
-                        datetime.now()
-                    ))
-                    user_id = cur.lastrowid
-                else:
-                    cur.execute("""
-                        INSERT INTO users (nombre, email, edad, sexo, puntaje_total, clasificacion, timestamp)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s)
-                        RETURNING id
-                    """, (
-                        data.get('nombre', ''),
-                        data.get('email', ''),
-                        data.get('edad', 0),
-                        data.get('sexo', ''),
-                        puntaje_total,
-                        clasificacion,
-                        datetime.now()
-                    ))
-                    result = cur.fetchone()
-                    user_id = result['id']
-            
-            # Insertar respuestas con puntajes
-            for question_id, option_id in data['responses'].items():
-                # Obtener puntaje de la opción
-                if USE_SQLITE:
-                    cur.execute("SELECT puntaje FROM options WHERE id = ?", (int(option_id),))
-                    result = cur.fetchone()
-                    puntaje_respuesta = result['puntaje'] if result else 0
-                else:
-                    cur.execute("SELECT puntaje FROM options WHERE id = %s", (int(option_id),))
-                    result = cur.fetchone()
-                    puntaje_respuesta = result['puntaje'] if result else 0
-                
-                if USE_SQLITE:
-                    cur.execute("""
-                        INSERT INTO responses (user_id, pregunta_id, respuesta, puntaje, timestamp)
-                        VALUES (?, ?, ?, ?, ?)
-                    """, (user_id, int(question_id), int(option_id), puntaje_respuesta, datetime.now()))
-                else:
-                    cur.execute("""
-                        INSERT INTO responses (user_id, pregunta_id, respuesta, puntaje, timestamp)
-                        VALUES (%s, %s, %s, %s, %s)
-                    """, (user_id, int(question_id), int(option_id), puntaje_respuesta, datetime.now()))
-            
-            conn.commit()
-            print(f"✅ Encuesta guardada - Usuario: {user_id}, Puntaje: {puntaje_total}, Clasificación: {clasificacion}")
-            
-            return jsonify({
-                'success': True, 
-                'puntaje': puntaje_total, 
-                'clasificacion': clasificacion
-            })
-            
+            user_id = repositorio.guardar_encuestas([envio])[0]
+        except PoolAgotado:
+            raise
         except Exception as e:
-            conn.rollback()
             print(f"❌ Error en submit_survey: {e}")
             return jsonify({'success': False, 'error': str(e)}), 500
-        finally:
-            cur.close()
-            conn.close()
+        
+        invalidar_caches()
+        print(f"✅ Encuesta guardada - Usuario: {user_id}, Puntaje: {envio.puntaje_total}, Clasificación: {envio.clasificacion}")
+        return jsonify(resultado)
             
+    except PoolAgotado:
+        raise
     except Exception as e:
         print(f"❌ Error general en submit_survey: {e}")
         return jsonify({'success': False, 'error': 'Internal server error'}), 500
 
+# Máximo de encuestas por lote (tablets y kioscos que envían lo acumulado sin conexión)
+LOTE_MAX_ENCUESTAS = int(os.environ.get('LOTE_MAX_ENCUESTAS', 500))
+
+def guardar_validas(validas):
+    """
+    Guardar [(indice, envio)] en una transacción con INSERT masivos; si el lote falla,
+    reintentar encuesta por encuesta para que las buenas no se pierdan.
+    Devuelve {indice: None si se guardó, o el mensaje de error}
+    """
+    try:
+        repositorio.guardar_encuestas([envio for indice, envio in validas])
+        return {indice: None for indice, envio in validas}
+    except PoolAgotado:
+        raise
+    except Exception as e:
+        print(f"❌ Lote rechazado, reintentando una por una: {e}")
+    
+    errores = {}
+    for indice, envio in validas:
+        try:
+            repositorio.guardar_encuestas([envio])
+            errores[indice] = None
+        except PoolAgotado:
+            raise
+        except Exception as e:
+            print(f"❌ Error guardando la encuesta {indice} del lote: {e}")
+            errores[indice] = 'Database error'
+    return errores
+
+@app.route('/api/submit-survey/batch', methods=['POST'])
+def submit_survey_batch():
+    """
+    Varias encuestas en un solo POST: {"surveys": [...]} o una lista, cada una con el
+    formato de /api/submit-survey y opcionalmente "completed_at". Resultado por ítem.
+    """
+    data = request.get_json(silent=True)
+    encuestas = data.get('surveys') if isinstance(data, dict) else data
+    if not isinstance(encuestas, list) or not encuestas:
+        return jsonify({'success': False, 'error': 'No surveys provided'}), 400
+    if len(encuestas) > LOTE_MAX_ENCUESTAS:
+        return jsonify({'success': False,
+                        'error': f'Too many surveys (max {LOTE_MAX_ENCUESTAS})'}), 413
+    
+    # Validar y puntuar cada una contra el catálogo en memoria
+    resultados = []
+    validas = []
+    for indice, encuesta in enumerate(encuestas):
+        try:
+            envio = preparar_envio(catalogo, encuesta, permitir_fecha=True)
+        except RespuestaInvalida as e:
+            resultados.append({'index': indice, 'success': False, 'error': str(e)})
+            continue
+        validas.append((indice, envio))
+        resultados.append({'index': indice, 'success': True,
+                           'puntaje': envio.puntaje_total, 'clasificacion': envio.clasificacion})
+    
+    if validas:
+        errores = guardar_validas(validas)
+        for indice, error in errores.items():
+            if error is not None:
+                resultados[indice] = {'index': indice, 'success': False, 'error': error}
+        if any(error is None for error in errores.values()):
+            invalidar_caches()
+    
+    aceptadas = sum(1 for r in resultados if r['success'])
+    print(f"✅ Lote procesado - {aceptadas} guardadas, {len(resultados) - aceptadas} rechazadas")
+    return jsonify({
+        'success': aceptadas == len(resultados),
+        'aceptadas': aceptadas,
+        'rechazadas': len(resultados) - aceptadas,
+        'resultados': resultados,
+    })
+
 # Endpoint para debugging
 @app.route('/api/debug')
 def debug():
@@ -565,10 +362,113 @@ def debug():
         cur.close()
         conn.close()
         
+        # Estadísticas del pool para dimensionarlo
+        debug_info['pool'] = db_pool.estadisticas()
+        # Llamadas y tiempos por sentencia del repositorio
+        debug_info['sentencias'] = repositorio.estadisticas()
+        debug_info['cache_dashboard'] = cache_dashboard.estadisticas()
+        debug_info['cache_series'] = cache_series.estadisticas()
+        debug_info['difusion'] = difusor.estadisticas()
+        debug_info['cache_paginas'] = cache_paginas.estadisticas()
+        debug_info['assets'] = assets.estadisticas()
+        debug_info['compresion'] = compresor.estadisticas()
+        if cola_ingesta is not None:
+            debug_info['ingesta'] = cola_ingesta.estadisticas()
+        if consultas_lentas_registro is not None:
+            debug_info['consultas_lentas'] = consultas_lentas_registro.estadisticas()
+        
         return jsonify(debug_info)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/metrics')
+def metrics():
+    """Métricas del proceso en formato de texto de Prometheus (sin consultas a la base)"""
+    return Response(metricas.exponer(db_pool, repositorio), content_type=metricas.TIPO_CONTENIDO)
+
+# Endpoints administrativos: deshabilitados si no se define ADMIN_TOKEN
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+def requiere_admin(vista):
+    @wraps(vista)
+    def envoltura(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            return jsonify({'success': False, 'error': 'Endpoint deshabilitado'}), 404
+        token = request.headers.get('Authorization', '')
+        if token.startswith('Bearer '):
+            token = token[7:]
+        else:
+            token = request.headers.get('X-Admin-Token', '')
+        if not hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+            return jsonify({'success': False, 'error': 'No autorizado'}), 403
+        return vista(*args, **kwargs)
+    return envoltura
+
+@app.route('/api/export')
+@requiere_admin
+def exportar_encuestas():
+    """Descarga en streaming: ?formato=csv|ndjson&desde=&hasta=&clasificacion=&gzip=1"""
+    formato = request.args.get('formato', 'csv')
+    if formato not in ('csv', 'ndjson'):
+        return jsonify({'success': False, 'error': 'Formato no soportado'}), 400
+    try:
+        filtros = exportar.leer_filtros(request.args.get('desde'), request.args.get('hasta'),
+                                        request.args.get('clasificacion'))
+    except exportar.FiltroInvalido as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    comprimir = request.args.get('gzip') == '1'
+    pregunta_ids = [q['id'] for q in catalogo.obtener().preguntas]
+
+    def cuerpo():
+        # La conexión se toma al empezar a transmitir y se devuelve al terminar
+        # (o si el cliente corta la descarga)
+        conn = get_db_connection()
+        try:
+            yield from exportar.generar(conn, USE_SQLITE, filtros, formato, pregunta_ids, comprimir)
+        finally:
+            conn.close()
+
+    nombre = f"encuestas.{formato}" + ('.gz' if comprimir else '')
+    mimetype = 'application/gzip' if comprimir else ('text/csv' if formato == 'csv' else 'application/x-ndjson')
+    return Response(cuerpo(), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{nombre}"',
+                             'Cache-Control': 'no-store'})
+
+@app.route('/api/import', methods=['POST'])
+@requiere_admin
+def importar_encuestas():
+    """CSV de encuestas en papel (cuerpo text/csv o archivo 'archivo'); rechazos por fila"""
+    archivo = request.files.get('archivo')
+    lineas = io.TextIOWrapper(archivo.stream if archivo else request.stream, encoding='utf-8-sig', newline='')
+    try:
+        resultado = importar.importar(lineas, catalogo.obtener(), repositorio,
+                                      progreso=lambda r: print(f"📥 Importación: {r['importadas']} encuestas"))
+    except importar.ArchivoInvalido as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except importar.ImportacionInterrumpida as e:
+        print(f"❌ {e}")
+        if e.resultado['importadas']:
+            invalidar_caches()
+        return jsonify(dict(e.resultado, success=False, error='Database error')), 500
+    except UnicodeDecodeError:
+        return jsonify({'success': False, 'error': 'El archivo debe estar en UTF-8'}), 400
+
+    if resultado['importadas']:
+        invalidar_caches()
+    print(f"✅ Importación: {resultado['importadas']} encuestas guardadas, "
+          f"{resultado['rechazadas']} rechazadas en {resultado['segundos']}s")
+    return jsonify(dict(resultado, success=resultado['rechazadas'] == 0))
+
+@app.route('/api/consultas-lentas')
+@requiere_admin
+def ver_consultas_lentas():
+    """Últimas consultas lentas del worker, más recientes primero (?limite=N)"""
+    if consultas_lentas_registro is None:
+        return jsonify({'success': False, 'error': 'Registro desactivado (CONSULTAS_LENTAS_MS=0)'}), 404
+    limite = request.args.get('limite', type=int)
+    return jsonify(dict(consultas_lentas_registro.estadisticas(),
+                        consultas=consultas_lentas_registro.entradas(limite)))
+
 if __name__ == '__main__':
     port = int(os.environ.get("PORT", 5000))
     init_db()
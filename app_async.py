@@ -0,0 +1,381 @@
+"""
+Modo asyncio: las mismas rutas públicas de app.py sobre Quart + asyncpg/aiosqlite
+Un cliente lento o una consulta lenta ya no ocupa un hilo: cada worker atiende
+miles de conexiones con un solo event loop. El modo sincrónico (gunicorn app:app)
+sigue siendo el de producción; este se ejecuta con:
+
+    uvicorn app_async:app --host 0.0.0.0 --port $PORT --workers $WEB_CONCURRENCY
+
+Usa la base migrada por migraciones.py (o app.py): no crea tablas ni reconstruye
+contadores, solo verifica la versión del esquema al iniciar. Rutas: /, /mision, /survey, /dashboard, /api/submit-survey, /api/stats,
+/api/series, /api/debug y /assets. /api/stats/stream responde 204 y el dashboard
+consulta /api/stats con ETag.
+"""
+import asyncio
+import os
+import time
+from datetime import date
+from urllib.parse import urlparse
+
+from quart import Quart, Response, jsonify, render_template, request
+
+import compresion
+import estadisticas
+import escritura
+import estaticos
+import migraciones
+from cache_paginas import CachePaginas
+from catalogo import (CONSULTA_OPCIONES, CONSULTA_PREGUNTAS, CONSULTA_VERSION, Catalogo,
+                      RespuestaInvalida, preparar_envio)
+from db_async import crear_pool_async
+from pool_db import PoolAgotado
+
+app = Quart(__name__)
+
+# Misma configuración que app.py
+DATABASE_URL = os.environ.get('DATABASE_URL')
+if not DATABASE_URL:
+    DATABASE_URL = 'sqlite:///survey_local.db'
+    USE_SQLITE = True
+else:
+    USE_SQLITE = False
+    if DATABASE_URL.startswith('postgres://'):
+        DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
+
+db = crear_pool_async(DATABASE_URL, USE_SQLITE)
+
+assets = estaticos.Estaticos(vigilar=lambda: app.debug)
+app.jinja_env.globals['asset_url'] = assets.url
+
+cache_paginas = CachePaginas(max_age=int(os.environ.get('PAGINAS_MAX_AGE', 60)))
+compresor = compresion.Compresion(min_bytes=int(os.environ.get('COMPRESION_MIN_BYTES', 1024)),
+                                  nivel=int(os.environ.get('COMPRESION_NIVEL', 6)),
+                                  max_entradas=int(os.environ.get('COMPRESION_CACHE', 256)))
+
+
+class CatalogoAsync:
+    """Como catalogo.CacheCatalogo: revalida el sello de versión como máximo cada `ttl` segundos"""
+
+    def __init__(self, ttl=None):
+        self.ttl = float(os.environ.get('CATALOGO_TTL', 30)) if ttl is None else ttl
+        self._catalogo = None
+        self._verificado = 0.0
+        self._lock = asyncio.Lock()
+
+    async def _revalidar(self):
+        async with db.conexion() as conn:
+            fila = await conn.fila(CONSULTA_VERSION)
+            version = fila[0] if fila else None
+            actual = self._catalogo
+            if actual is None or version != actual.version:
+                self._catalogo = Catalogo.desde_filas(version, await conn.filas(CONSULTA_PREGUNTAS),
+                                                      await conn.filas(CONSULTA_OPCIONES))
+                print(f"📋 Catálogo cargado (versión {version})")
+        self._verificado = time.monotonic()
+
+    async def obtener(self):
+        if self._catalogo is not None and time.monotonic() - self._verificado < self.ttl:
+            return self._catalogo
+        async with self._lock:
+            if self._catalogo is None or time.monotonic() - self._verificado >= self.ttl:
+                await self._revalidar()
+            return self._catalogo
+
+    async def preparar(self, data):
+        """preparar_envio contra el catálogo; ante una respuesta inválida se revalida una vez"""
+        try:
+            return preparar_envio(await self.obtener(), data)
+        except RespuestaInvalida:
+            # Limitar recargas forzadas para que ids inventados no golpeen la DB
+            if time.monotonic() - self._verificado < min(self.ttl, 5.0):
+                raise
+            self._verificado = 0.0
+            return preparar_envio(await self.obtener(), data)
+
+
+catalogo = CatalogoAsync()
+
+
+class CachePorVersion:
+    """Resultados por clave, válidos mientras no cambie la versión de datos (un cálculo a la vez)"""
+
+    def __init__(self, calcular, max_entradas=128):
+        self._calcular = calcular
+        self.max_entradas = max_entradas
+        self._entradas = {}
+        self._lock = asyncio.Lock()
+        self._stats = {'hits': 0, 'misses': 0}
+
+    async def obtener(self, version, clave, *args):
+        entrada = self._entradas.get(clave)
+        if entrada is not None and entrada[0] == version:
+            self._stats['hits'] += 1
+            return entrada[1]
+        async with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None or entrada[0] != version:
+                self._stats['misses'] += 1
+                if len(self._entradas) >= self.max_entradas:
+                    self._entradas.clear()
+                entrada = self._entradas[clave] = (version, await self._calcular(*args))
+            return entrada[1]
+
+    def estadisticas(self):
+        return dict(self._stats, entradas=len(self._entradas))
+
+
+@app.before_serving
+async def iniciar():
+    await db.abrir()
+    # Este modo no migra: solo verifica la versión (python migraciones.py en el release)
+    try:
+        async with db.conexion() as conn:
+            version = (await conn.fila("SELECT COALESCE(MAX(version), 0) FROM schema_version"))[0]
+    except Exception as e:
+        raise RuntimeError(f"Base sin inicializar (ejecuta primero python migraciones.py): {e}")
+    if version < migraciones.VERSION_ESQUEMA:
+        raise RuntimeError(f"Esquema en versión {version}, se requiere {migraciones.VERSION_ESQUEMA}: "
+                           "ejecuta python migraciones.py")
+    await catalogo.obtener()
+    print(f"✅ Modo asyncio listo ({'aiosqlite' if USE_SQLITE else 'asyncpg'})")
+
+
+@app.after_serving
+async def detener():
+    await db.cerrar()
+
+
+@app.after_request
+async def encabezados(response):
+    # CORS abierto como flask_cors en app.py
+    if 'Origin' in request.headers:
+        response.headers['Access-Control-Allow-Origin'] = '*'
+        response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
+    if not compresor.aplica(request, response):
+        return response
+    response.vary.add('Accept-Encoding')
+    codificacion = compresor.codificacion(request.accept_encodings)
+    if codificacion is None:
+        return response
+    return compresor.comprimir_cuerpo(response, request.path, await response.get_data(), codificacion)
+
+
+@app.errorhandler(PoolAgotado)
+async def pool_agotado(e):
+    print(f"❌ Pool de conexiones agotado: {e}")
+    response = jsonify({'success': False, 'error': 'Servidor ocupado, intenta nuevamente'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+
+async def servir_pagina(nombre, version, plantilla, **contexto):
+    """Como CachePaginas.servir: se renderiza una vez por versión, luego bytes con ETag"""
+    pagina = cache_paginas.vigente(nombre, version)
+    if pagina is None:
+        pagina = cache_paginas.guardar(nombre, version, await render_template(plantilla, **contexto))
+    response = Response(pagina.cuerpo, mimetype='text/html')
+    cache_paginas.preparar(response, pagina)
+    return cache_paginas.contar(await response.make_conditional(request))
+
+
+@app.route('/assets/<path:nombre_huella>')
+async def assets_huella(nombre_huella):
+    archivo, codificacion = assets.variante(nombre_huella, request.accept_encodings)
+    if archivo is None:
+        return Response('Not Found', status=404)
+    response = Response(archivo.variantes[codificacion], mimetype=archivo.mimetype)
+    assets.preparar(response, archivo, codificacion)
+    return assets.contar(await response.make_conditional(request), codificacion)
+
+
+@app.route('/')
+async def index():
+    return await servir_pagina('index', None, 'index.html')
+
+
+@app.route('/mision')
+async def mision():
+    return await servir_pagina('mision', None, 'mision.html')
+
+
+@app.route('/survey')
+async def survey():
+    try:
+        actual = await catalogo.obtener()
+    except PoolAgotado:
+        raise
+    except Exception as e:
+        print(f"❌ Error en survey: {e}")
+        return await render_template('survey.html', questions=[])
+    return await servir_pagina('survey', actual.version, 'survey.html', questions=actual.preguntas)
+
+
+@app.route('/dashboard')
+async def dashboard():
+    # Solo el armazón HTML: las cifras llegan desde /api/stats
+    return await servir_pagina('dashboard', None, 'dashboard.html')
+
+
+async def guardar_encuesta(envio):
+    """Usuario, respuestas y contadores en una transacción; devuelve el id de usuario"""
+    async with db.conexion() as conn:
+        if not USE_SQLITE:
+            # Una sola sentencia: un viaje y atómica sin BEGIN/COMMIT, así la conexión
+            # vuelve al pool después de un solo turno del event loop
+            fila = await conn.fila(escritura.INSERTAR_ENCUESTA_CON_CONTADORES_POSTGRES,
+                                   escritura.parametros_encuesta_con_contadores_postgres(envio))
+            return fila[0]
+        async with conn.transaccion():
+            user_id = await conn.ejecutar(escritura.INSERTAR_USUARIO_SQLITE, escritura.parametros_usuario(envio))
+            await conn.ejecutar_muchos(escritura.INSERTAR_RESPUESTAS_SQLITE,
+                                       escritura.filas_respuestas(user_id, envio))
+            for tabla, sql, parametros in estadisticas.sentencias_registro([envio], USE_SQLITE):
+                await conn.ejecutar_muchos(sql, parametros)
+    return user_id
+
+
+@app.route('/api/submit-survey', methods=['POST'])
+async def submit_survey():
+    try:
+        try:
+            envio = await catalogo.preparar(await request.get_json(silent=True))
+        except RespuestaInvalida as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+
+        try:
+            user_id = await guardar_encuesta(envio)
+        except PoolAgotado:
+            raise
+        except Exception as e:
+            print(f"❌ Error en submit_survey: {e}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+        print(f"✅ Encuesta guardada - Usuario: {user_id}, Puntaje: {envio.puntaje_total}, "
+              f"Clasificación: {envio.clasificacion}")
+        return jsonify({
+            'success': True,
+            'puntaje': envio.puntaje_total,
+            'clasificacion': envio.clasificacion
+        })
+    except PoolAgotado:
+        raise
+    except Exception as e:
+        print(f"❌ Error general en submit_survey: {e}")
+        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+
+
+def leer_rango():
+    """Fechas ?from=&to= (YYYY-MM-DD, inclusivas); las inválidas se ignoran"""
+    rango = []
+    for parametro in ('from', 'to'):
+        try:
+            rango.append(date.fromisoformat(request.args.get(parametro, '')))
+        except ValueError:
+            rango.append(None)
+    desde, hasta = rango
+    if desde and hasta and desde > hasta:
+        desde, hasta = hasta, desde
+    return desde, hasta
+
+
+async def version_datos():
+    async with db.conexion() as conn:
+        fila = await conn.fila(estadisticas.CONSULTA_VERSION)
+    return fila[0] if fila else 0
+
+
+async def calcular_dashboard(desde, hasta):
+    async with db.conexion() as conn:
+        filas = await conn.filas(*estadisticas.consulta_dashboard(desde, hasta, USE_SQLITE))
+    return estadisticas.contexto_dashboard(filas)
+
+
+async def calcular_series(desde, hasta, granularidad):
+    sql, parametros, serie = estadisticas.consulta_series(desde, hasta, granularidad, USE_SQLITE)
+    async with db.conexion() as conn:
+        filas = await conn.filas(sql, parametros)
+    return estadisticas.armar_series(serie, filas)
+
+
+cache_dashboard = CachePorVersion(calcular_dashboard)
+cache_series = CachePorVersion(calcular_series)
+
+
+@app.route('/api/stats/stream')
+async def api_stats_stream():
+    # Sin difusión en este modo: el dashboard pasa a consultar /api/stats
+    return Response(status=204)
+
+
+@app.route('/api/stats')
+async def api_stats():
+    """Cifras del dashboard en JSON (?from=&to=) con ETag según la versión de datos"""
+    desde, hasta = leer_rango()
+    sufijo = f"-{desde or ''}-{hasta or ''}" if desde or hasta else ''
+    try:
+        version = await version_datos()
+        if request.if_none_match.contains(f"v{version}{sufijo}"):
+            response = Response(status=304)
+            response.set_etag(f"v{version}{sufijo}")
+            response.cache_control.no_cache = True
+            return response
+        contexto = await cache_dashboard.obtener(version, (desde, hasta), desde, hasta)
+    except PoolAgotado:
+        raise
+    except Exception as e:
+        print(f"❌ Error en stats: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+    response = jsonify(estadisticas.a_json(contexto, desde, hasta))
+    response.set_etag(f"v{contexto['data_version']}{sufijo}")
+    response.cache_control.no_cache = True
+    return await response.make_conditional(request)
+
+
+@app.route('/api/series')
+async def series():
+    """Envíos y mezcla de riesgo por hora o por día (por defecto, los últimos 30 días)"""
+    try:
+        desde, hasta = estadisticas.rango_series(*leer_rango())
+    except estadisticas.RangoInvalido as e:
+        return jsonify({'error': str(e)}), 400
+    granularidad = estadisticas.granularidad_series(request.args.get('granularidad'))
+    try:
+        version = await version_datos()
+        return jsonify(await cache_series.obtener(version, (desde, hasta, granularidad),
+                                                  desde, hasta, granularidad))
+    except PoolAgotado:
+        raise
+    except Exception as e:
+        print(f"❌ Error en series: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+
+@app.route('/api/debug')
+async def debug():
+    try:
+        debug_info = {
+            'modo': 'asyncio',
+            'database_type': 'SQLite' if USE_SQLITE else 'PostgreSQL',
+            # Sin credenciales: solo servidor y base
+            'database_url': 'Local SQLite' if USE_SQLITE else
+                            f"{urlparse(DATABASE_URL).hostname}{urlparse(DATABASE_URL).path}",
+        }
+        async with db.conexion() as conn:
+            for tabla in ('questions', 'options', 'users', 'responses'):
+                debug_info[f'{tabla}_count'] = (await conn.fila(f"SELECT COUNT(*) FROM {tabla}"))[0]
+
+        debug_info['pool'] = db.estadisticas()
+        debug_info['tareas'] = len(asyncio.all_tasks())
+        debug_info['cache_dashboard'] = cache_dashboard.estadisticas()
+        debug_info['cache_series'] = cache_series.estadisticas()
+        debug_info['cache_paginas'] = cache_paginas.estadisticas()
+        debug_info['assets'] = assets.estadisticas()
+        debug_info['compresion'] = compresor.estadisticas()
+        return jsonify(debug_info)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
@@ -0,0 +1,90 @@
+"""
+Comparación del modo sincrónico (gunicorn app:app) y el modo asyncio
+(uvicorn app_async:app) en la misma máquina y la misma base
+
+Levanta cada servidor, abre N conexiones keep-alive simultáneas que repiten una
+mezcla de peticiones (70% GET /survey, 20% POST /api/submit-survey, 10% GET
+/api/stats) y mide req/s, p50/p99 y errores por nivel de concurrencia. La
+capacidad es el mayor N con menos de 1% de errores y p99 bajo --p99-max.
+
+Uso:
+    python bench_modos.py [--conexiones 50,200,500,1000] [--duracion 10]
+                          [--p99-max 1000] [--modos sync,async]
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+
+from benchmark import esperar_puerto, medir, peticion_get, peticion_post
+
+PUERTOS = {'sync': 5081, 'async': 5082}
+
+
+def comando(modo, puerto):
+    workers = os.environ.get('WEB_CONCURRENCY', '1')
+    if modo == 'sync':
+        # gunicorn.conf.py: gthread con WEB_THREADS hilos por worker
+        return [sys.executable, '-m', 'gunicorn', 'app:app', '--bind', f'127.0.0.1:{puerto}',
+                '--workers', workers]
+    return [sys.executable, '-m', 'uvicorn', 'app_async:app', '--host', '127.0.0.1', '--port', str(puerto),
+            '--workers', workers, '--no-access-log', '--log-level', 'warning']
+
+
+def _peticiones(puerto, encuesta):
+    survey = peticion_get(puerto, '/survey')
+    stats = peticion_get(puerto, '/api/stats')
+    envio = peticion_post(puerto, '/api/submit-survey', encuesta)
+    return [survey] * 7 + [envio] * 2 + [stats]
+
+
+def encuesta_de_prueba():
+    """Respuestas válidas leídas del catálogo actual (modo sincrónico)"""
+    from app import catalogo
+    preguntas = catalogo.obtener().preguntas
+    return {'is_anonymous': True,
+            'responses': {str(q['id']): q['opciones'][0]['id'] for q in preguntas if q['opciones']}}
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Capacidad y p99: modo sincrónico vs asyncio')
+    parser.add_argument('--conexiones', default='50,200,500,1000')
+    parser.add_argument('--duracion', type=float, default=10)
+    parser.add_argument('--p99-max', type=float, default=1000, help='ms')
+    parser.add_argument('--pausa', type=float, default=0, help='segundos entre peticiones de cada conexión')
+    parser.add_argument('--modos', default='sync,async')
+    args = parser.parse_args(argv)
+    niveles = [int(n) for n in args.conexiones.split(',')]
+
+    # Inicializa la base con el modo sincrónico (tablas, catálogo, contadores)
+    encuesta = encuesta_de_prueba()
+    resultados = {}
+    for modo in args.modos.split(','):
+        puerto = PUERTOS[modo]
+        proceso = subprocess.Popen(comando(modo, puerto), stdout=subprocess.DEVNULL,
+                                   env=dict(os.environ, PORT=str(puerto)))
+        try:
+            esperar_puerto(puerto, proceso)
+            mezcla = _peticiones(puerto, encuesta)
+            # Calentamiento: catálogo, páginas y conexiones del pool
+            asyncio.run(medir(puerto, 10, 1, mezcla))
+            resultados[modo] = []
+            for conexiones in niveles:
+                fila = asyncio.run(medir(puerto, conexiones, args.duracion, mezcla, args.pausa))
+                resultados[modo].append(fila)
+                print(f"⏱️ {modo:5} {conexiones:5} conexiones: {fila['req_s']:8.1f} req/s  "
+                      f"p50 {fila['p50_ms']:7.1f} ms  p95 {fila['p95_ms']:7.1f} ms  p99 {fila['p99_ms']:8.1f} ms  errores {fila['errores']}")
+        finally:
+            proceso.terminate()
+            proceso.wait(timeout=30)
+
+    print("\n📊 Capacidad (errores < 1% y p99 < {:.0f} ms):".format(args.p99_max))
+    for modo, filas in resultados.items():
+        aptas = [f['conexiones'] for f in filas if f['tasa_error'] < 0.01 and f['p99_ms'] < args.p99_max]
+        print(f"   {modo}: {max(aptas) if aptas else 0} conexiones simultáneas")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
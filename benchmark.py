@@ -0,0 +1,654 @@
+"""
+Suite de benchmarks reproducible: datos sintéticos + carga HTTP sobre gunicorn
+
+1. Siembra una base dedicada (SQLite: un survey_local.db propio en --directorio;
+   PostgreSQL: el esquema `benchmark` de DATABASE_URL, sin tocar `public`) con
+   N encuestados sintéticos. Todo sale de un hash de (id, semilla), así que la
+   misma semilla genera exactamente los mismos datos en ambos motores:
+   - 35% anónimos; sexo 52% femenino, 40% masculino, 5% otro, 3% sin decir
+   - 15% de perfiles de riesgo: las opciones de más puntaje pesan más
+     (pesos 1:2:4:8 por puntaje; al resto, 8:4:2:1)
+   - envíos repartidos en los 90 días desde FECHA_BASE
+   - puntaje, clasificación y contadores del dashboard recalculados al final
+   Si la base ya tiene esa siembra solo se borran los envíos de corridas previas.
+2. Levanta gunicorn (app:app, 1 worker gthread) apuntando a esa base
+3. Por endpoint: --conexiones conexiones keep-alive durante --duracion segundos
+   con peticiones variadas (cuerpos y rangos de fechas de un Random sembrado).
+   Mide req/s, p50/p95/p99 y errores; las consultas por petición salen de la
+   diferencia de /api/debug (llamadas del repositorio y checkouts del pool)
+4. Informe JSON (stdout o --salida); con --base compara contra un informe
+   guardado y termina con código 1 si hay regresiones
+
+Uso:
+    python benchmark.py [--usuarios 10000] [--conexiones 20] [--duracion 10]
+                        [--endpoints survey,submit,dashboard,stats,series]
+                        [--semilla 1] [--salida informe.json]
+                        [--base baseline.json] [--tolerancia 0.2]
+Con DATABASE_URL usa PostgreSQL; sin ella, SQLite.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import date, datetime, timedelta
+
+import estadisticas
+import indices
+import migraciones
+from catalogo import CONSULTA_OPCIONES, CONSULTA_PREGUNTAS, CONSULTA_VERSION, Catalogo, clasificar
+
+DIRECTORIO_REPO = os.path.dirname(os.path.abspath(__file__))
+ESQUEMA_POSTGRES = 'benchmark'
+FECHA_BASE = date(2025, 1, 1)
+DIAS = 90
+LOTE_SIEMBRA = 50000
+PUERTO = 5090
+
+# Endpoint -> clave en el informe
+ENDPOINTS = {
+    'survey': 'GET /survey',
+    'submit': 'POST /api/submit-survey',
+    'dashboard': 'GET /dashboard',
+    'stats': 'GET /api/stats',
+    'series': 'GET /api/series',
+}
+
+
+def _log(mensaje):
+    # El informe JSON puede ir por stdout: el progreso va por stderr
+    print(mensaje, file=sys.stderr, flush=True)
+
+
+# --- Cliente HTTP de carga (compartido con bench_modos.py y concurrencia_sqlite.py) ---
+
+def esperar_puerto(puerto, proceso, timeout=30):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError(f"El servidor terminó con código {proceso.returncode}")
+        try:
+            socket.create_connection(('127.0.0.1', puerto), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"El servidor no abrió el puerto {puerto}")
+
+
+async def _leer_respuesta(lector):
+    """Status de una respuesta HTTP/1.1 (Content-Length o chunked); consume el cuerpo"""
+    linea = await lector.readline()
+    if not linea:
+        raise ConnectionError('conexión cerrada')
+    status = int(linea.split()[1])
+    largo = 0
+    chunked = False
+    cerrar = False
+    while True:
+        linea = await lector.readline()
+        if linea in (b'\r\n', b''):
+            break
+        nombre, _, valor = linea.decode('latin-1').partition(':')
+        nombre = nombre.strip().lower()
+        if nombre == 'content-length':
+            largo = int(valor)
+        elif nombre == 'transfer-encoding' and 'chunked' in valor.lower():
+            chunked = True
+        elif nombre == 'connection' and 'close' in valor.lower():
+            cerrar = True
+    if chunked:
+        while True:
+            tam = int((await lector.readline()).split(b';')[0], 16)
+            await lector.readexactly(tam + 2)
+            if tam == 0:
+                break
+    elif largo:
+        await lector.readexactly(largo)
+    return status, cerrar
+
+
+async def _cliente(puerto, peticiones, fin, latencias, errores, pausa, aleatorio):
+    try:
+        lector, escritor = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', puerto), 10)
+    except (OSError, asyncio.TimeoutError):
+        errores['conexion'] += 1
+        return
+    try:
+        while time.monotonic() < fin:
+            peticion = aleatorio.choice(peticiones)
+            inicio = time.perf_counter()
+            try:
+                escritor.write(peticion)
+                await escritor.drain()
+                status, cerrar = await asyncio.wait_for(_leer_respuesta(lector), 30)
+            except (OSError, ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+                errores['red'] += 1
+                return
+            latencias.append(time.perf_counter() - inicio)
+            if status >= 400:
+                errores[f'http_{status}'] = errores.get(f'http_{status}', 0) + 1
+            if cerrar:
+                return
+            if pausa:
+                await asyncio.sleep(pausa)
+    finally:
+        escritor.close()
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p / 100))]
+
+
+async def medir(puerto, conexiones, duracion, peticiones, pausa=0.0, semilla=None):
+    """
+    `conexiones` clientes keep-alive que repiten peticiones HTTP crudas (bytes)
+    elegidas al azar de `peticiones` durante `duracion` segundos
+    """
+    latencias = []
+    errores = {'conexion': 0, 'red': 0}
+    inicio = time.monotonic()
+    fin = inicio + duracion
+    await asyncio.gather(*[
+        _cliente(puerto, peticiones, fin, latencias, errores, pausa,
+                 random.Random(None if semilla is None else semilla * 100003 + n))
+        for n in range(conexiones)
+    ])
+    transcurrido = time.monotonic() - inicio
+    total = len(latencias) + errores['red'] + errores['conexion']
+    fallidas = sum(errores.values())
+    return {
+        'conexiones': conexiones,
+        'peticiones': len(latencias),
+        'req_s': round(len(latencias) / transcurrido, 1),
+        'p50_ms': round(percentil(latencias, 50) * 1000, 1),
+        'p95_ms': round(percentil(latencias, 95) * 1000, 1),
+        'p99_ms': round(percentil(latencias, 99) * 1000, 1),
+        'errores': {k: v for k, v in errores.items() if v},
+        'tasa_error': round(fallidas / total, 4) if total else 1.0,
+    }
+
+
+async def _cliente_a_tasa(puerto, peticiones, horarios, latencias, estados, errores):
+    """Enviar cada petición en su horario (monotonic); reconecta si el servidor cierra"""
+    conexion = None
+    try:
+        for n, programada in enumerate(horarios):
+            espera = programada - time.monotonic()
+            if espera > 0:
+                await asyncio.sleep(espera)
+            try:
+                if conexion is None:
+                    conexion = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', puerto), 10)
+                lector, escritor = conexion
+                inicio = time.perf_counter()
+                escritor.write(peticiones[n % len(peticiones)])
+                await escritor.drain()
+                status, cerrar = await asyncio.wait_for(_leer_respuesta(lector), 30)
+            except (OSError, ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+                errores['red'] += 1
+                if conexion is not None:
+                    conexion[1].close()
+                conexion = None
+                continue
+            latencias.append(time.perf_counter() - inicio)
+            estados[status] = estados.get(status, 0) + 1
+            if cerrar:
+                escritor.close()
+                conexion = None
+    finally:
+        if conexion is not None:
+            conexion[1].close()
+
+
+async def medir_a_tasa(puerto, tasa, duracion, peticiones, conexiones=8):
+    """
+    Carga abierta: `tasa` peticiones por segundo a ritmo fijo durante `duracion`
+    segundos, repartidas en `conexiones` keep-alive (cada una envía la siguiente
+    al terminar la anterior, así que si el servidor se atrasa la tasa lograda baja)
+    """
+    inicio = time.monotonic() + 0.1
+    total = int(tasa * duracion)
+    horarios = [inicio + n / tasa for n in range(total)]
+    latencias = []
+    estados = {}
+    errores = {'red': 0}
+    await asyncio.gather(*[
+        _cliente_a_tasa(puerto, peticiones[c::conexiones] or peticiones, horarios[c::conexiones],
+                        latencias, estados, errores)
+        for c in range(conexiones)
+    ])
+    transcurrido = time.monotonic() - inicio
+    return {
+        'tasa_objetivo': tasa,
+        'tasa_lograda': round(len(latencias) / transcurrido, 1),
+        'enviadas': total,
+        'respondidas': len(latencias),
+        'p50_ms': round(percentil(latencias, 50) * 1000, 1),
+        'p95_ms': round(percentil(latencias, 95) * 1000, 1),
+        'p99_ms': round(percentil(latencias, 99) * 1000, 1),
+        'estados': {str(k): v for k, v in sorted(estados.items())},
+        'errores': {k: v for k, v in errores.items() if v},
+    }
+
+
+def peticion_get(puerto, ruta):
+    return (f'GET {ruta} HTTP/1.1\r\nHost: 127.0.0.1:{puerto}\r\n'
+            f'Accept-Encoding: gzip\r\n\r\n').encode()
+
+
+def peticion_post(puerto, ruta, datos):
+    cuerpo = json.dumps(datos).encode()
+    return (f'POST {ruta} HTTP/1.1\r\nHost: 127.0.0.1:{puerto}\r\nContent-Type: application/json\r\n'
+            f'Content-Length: {len(cuerpo)}\r\n\r\n').encode() + cuerpo
+
+
+# --- Generador de datos sintéticos ---
+
+def _hash(id_sql, clave_sql, semilla):
+    """Entero pseudoaleatorio en [0, 2^31-1) a partir de (id, clave, semilla); solo aritmética entera"""
+    return (f"(((({id_sql}) * 2654435761 + ({clave_sql}) * 40503 + {int(semilla) * 7919}) "
+            f"% 2147483647) * 48271 % 2147483647)")
+
+
+def pesos_opciones(n, riesgo):
+    """Peso de cada opción de una pregunta ordenada por puntaje (geométrico, invertido si hay riesgo)"""
+    pesos = [2 ** (n - 1 - posicion) for posicion in range(n)]
+    return pesos[::-1] if riesgo else pesos
+
+
+def _tabla_pesos(cur):
+    """VALUES (id, pregunta_id, puntaje, riesgo, desde, hasta, total): rango del hash que elige cada opción"""
+    cur.execute("SELECT id, pregunta_id, puntaje FROM options ORDER BY pregunta_id, puntaje, id")
+    por_pregunta = {}
+    for option_id, pregunta_id, puntaje in cur.fetchall():
+        por_pregunta.setdefault(pregunta_id, []).append((option_id, puntaje))
+    filas = []
+    for pregunta_id, opciones in por_pregunta.items():
+        for riesgo in (0, 1):
+            pesos = pesos_opciones(len(opciones), riesgo)
+            acumulado = 0
+            for (option_id, puntaje), peso in zip(opciones, pesos):
+                filas.append(f"({option_id}, {pregunta_id}, {puntaje}, {riesgo}, "
+                             f"{acumulado}, {acumulado + peso}, {sum(pesos)})")
+                acumulado += peso
+    return ', '.join(filas)
+
+
+def _caso_clasificacion(columna, maximo):
+    """CASE equivalente a catalogo.clasificar para puntajes 0..maximo"""
+    limites = {}
+    for puntaje in range(maximo + 1):
+        limites[clasificar(puntaje)] = puntaje
+    ramas = ' '.join(f"WHEN {columna} <= {limite} THEN '{nombre}'"
+                     for nombre, limite in sorted(limites.items(), key=lambda item: item[1]))
+    return f"CASE {ramas} END"
+
+
+def _sembrar_lote(cur, use_sqlite, desde, hasta, semilla, pesos, caso):
+    if use_sqlite:
+        serie = f"WITH RECURSIVE s(i) AS (SELECT {desde} UNION ALL SELECT i + 1 FROM s WHERE i < {hasta})"
+        fecha = f"datetime('{FECHA_BASE}', '+' || segundo || ' seconds')"
+    else:
+        serie = f"WITH s(i) AS (SELECT generate_series({desde}::bigint, {hasta}))"
+        fecha = f"timestamp '{FECHA_BASE}' + segundo * interval '1 second'"
+    cur.execute(f"""
+        INSERT INTO users (id, nombre, email, edad, sexo, puntaje_total, clasificacion, timestamp)
+        {serie}
+        SELECT i,
+               CASE WHEN anonimo < 35 THEN 'Anónimo' ELSE 'Persona ' || i END,
+               CASE WHEN anonimo < 35 THEN 'anonimo@encuesta.com' ELSE 'persona' || i || '@ejemplo.cl' END,
+               CASE WHEN anonimo < 35 THEN 0 ELSE 14 + edad % 50 END,
+               CASE WHEN anonimo < 35 THEN 'Prefiero no decirlo'
+                    WHEN sexo < 52 THEN 'Femenino' WHEN sexo < 92 THEN 'Masculino'
+                    WHEN sexo < 97 THEN 'Otro' ELSE 'Prefiero no decirlo' END,
+               0, 'Leve', {fecha}
+        FROM (SELECT i,
+                     {_hash('i', 1, semilla)} % 100 AS anonimo,
+                     {_hash('i', 2, semilla)} AS edad,
+                     {_hash('i', 3, semilla)} % 100 AS sexo,
+                     {_hash('i', 4, semilla)} % {DIAS * 86400} AS segundo
+              FROM s) AS u
+    """)
+    # Una opción por pregunta según el perfil del encuestado (15% de riesgo)
+    cur.execute(f"""
+        INSERT INTO responses (user_id, pregunta_id, respuesta, puntaje, timestamp)
+        WITH pesos (id, pregunta_id, puntaje, riesgo, desde, hasta, total) AS (VALUES {pesos})
+        SELECT u.id, o.pregunta_id, o.id, o.puntaje, u.timestamp
+        FROM users u
+        JOIN pesos o
+          ON o.riesgo = CASE WHEN {_hash('u.id', 5, semilla)} % 100 < 15 THEN 1 ELSE 0 END
+         AND {_hash('u.id', '100 + o.pregunta_id', semilla)} % o.total >= o.desde
+         AND {_hash('u.id', '100 + o.pregunta_id', semilla)} % o.total < o.hasta
+        WHERE u.id BETWEEN {desde} AND {hasta}
+    """)
+    cur.execute(f"""
+        UPDATE users SET puntaje_total = t.total, clasificacion = {caso}
+        FROM (SELECT user_id, SUM(puntaje) AS total FROM responses
+              WHERE user_id BETWEEN {desde} AND {hasta} GROUP BY user_id) AS t
+        WHERE users.id = t.user_id
+    """)
+
+
+def _siembra_registrada(cur, use_sqlite):
+    if use_sqlite:
+        cur.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'benchmark_siembra'")
+        if not cur.fetchone():
+            return None
+    else:
+        cur.execute("SELECT to_regclass('benchmark_siembra')")
+        if cur.fetchone()[0] is None:
+            return None
+    cur.execute("SELECT usuarios, semilla FROM benchmark_siembra")
+    return cur.fetchone()
+
+
+def _sin_disparadores(conn, cur, activar):
+    """session_replication_role = replica omite los disparadores de FK (solo superusuario)"""
+    try:
+        cur.execute(f"SET session_replication_role = {'replica' if activar else 'DEFAULT'}")
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        _log(f"ℹ️ Siembra con revisión de claves foráneas ({e.__class__.__name__})")
+
+
+def sembrar(conn, use_sqlite, usuarios, semilla):
+    """
+    Dejar la base con exactamente `usuarios` encuestados sintéticos de `semilla`.
+    Devuelve False si ya estaban (solo se borran los envíos de corridas anteriores).
+    """
+    migraciones.migrar(conn, use_sqlite)
+    cur = conn.cursor()
+    try:
+        if _siembra_registrada(cur, use_sqlite) == (usuarios, semilla):
+            cur.execute(f"DELETE FROM responses WHERE user_id > {int(usuarios)}")
+            cur.execute(f"DELETE FROM users WHERE id > {int(usuarios)}")
+            eliminados = cur.rowcount
+            if eliminados:
+                estadisticas.reconstruir(cur)
+                _log(f"🧹 {eliminados} envíos de corridas anteriores eliminados")
+            conn.commit()
+            return False
+
+        inicio = time.perf_counter()
+        cur.execute("DROP TABLE IF EXISTS benchmark_siembra")
+        if use_sqlite:
+            cur.execute("DELETE FROM responses")
+            cur.execute("DELETE FROM users")
+        else:
+            cur.execute("TRUNCATE responses, users")
+        # Carga masiva: índices secundarios recreados al final y, si el rol lo
+        # permite, sin revisar claves foráneas (los datos generados son consistentes)
+        for nombre, tabla, columnas in indices.INDICES:
+            cur.execute(f"DROP INDEX IF EXISTS {nombre}")
+        conn.commit()
+        if not use_sqlite:
+            _sin_disparadores(conn, cur, True)
+        pesos = _tabla_pesos(cur)
+        cur.execute("SELECT pregunta_id, MAX(puntaje) FROM options GROUP BY pregunta_id")
+        caso = _caso_clasificacion('t.total', sum(maximo for _, maximo in cur.fetchall()))
+        conn.commit()
+        for desde in range(1, usuarios + 1, LOTE_SIEMBRA):
+            hasta = min(usuarios, desde + LOTE_SIEMBRA - 1)
+            _sembrar_lote(cur, use_sqlite, desde, hasta, semilla, pesos, caso)
+            conn.commit()
+            _log(f"🌱 {hasta}/{usuarios} encuestados")
+        if not use_sqlite:
+            _sin_disparadores(conn, cur, False)
+        indices.crear_indices(cur)
+        estadisticas.reconstruir(cur)
+        if not use_sqlite:
+            # Los envíos del benchmark siguen después de los ids sembrados
+            cur.execute("SELECT setval(pg_get_serial_sequence('users', 'id'), %s)", (max(usuarios, 1),))
+        cur.execute("CREATE TABLE benchmark_siembra (usuarios INTEGER, semilla INTEGER)")
+        cur.execute(f"INSERT INTO benchmark_siembra VALUES ({int(usuarios)}, {int(semilla)})")
+        cur.execute("ANALYZE")
+        conn.commit()
+        _log(f"🌱 {usuarios} encuestados sembrados en {time.perf_counter() - inicio:.1f}s")
+        return True
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def url_postgres(database_url):
+    """DATABASE_URL con search_path fijado al esquema del benchmark"""
+    if database_url.startswith('postgres://'):
+        database_url = database_url.replace('postgres://', 'postgresql://', 1)
+    separador = '&' if '?' in database_url else '?'
+    return f"{database_url}{separador}options=-csearch_path%3D{ESQUEMA_POSTGRES}"
+
+
+def preparar_base(args):
+    """Sembrar la base dedicada; devuelve (entorno del servidor, directorio de trabajo, motor, catálogo)"""
+    database_url = os.environ.get('DATABASE_URL')
+    entorno = dict(os.environ, PORT=str(args.puerto), WEB_CONCURRENCY='1')
+    if database_url:
+        import psycopg2
+        conn = psycopg2.connect(database_url)
+        conn.autocommit = True
+        conn.cursor().execute(f"CREATE SCHEMA IF NOT EXISTS {ESQUEMA_POSTGRES}")
+        conn.close()
+        url = url_postgres(database_url)
+        conn = psycopg2.connect(url)
+        entorno['DATABASE_URL'] = url
+        directorio, use_sqlite = DIRECTORIO_REPO, False
+    else:
+        os.makedirs(args.directorio, exist_ok=True)
+        conn = sqlite3.connect(os.path.join(args.directorio, 'survey_local.db'))
+        entorno.pop('DATABASE_URL', None)
+        directorio, use_sqlite = args.directorio, True
+    try:
+        sembrar(conn, use_sqlite, args.usuarios, args.semilla)
+        cur = conn.cursor()
+        cur.execute(CONSULTA_VERSION)
+        version = cur.fetchone()[0]
+        cur.execute(CONSULTA_PREGUNTAS)
+        preguntas = cur.fetchall()
+        cur.execute(CONSULTA_OPCIONES)
+        catalogo = Catalogo.desde_filas(version, preguntas, cur.fetchall())
+        cur.close()
+    finally:
+        conn.close()
+    return entorno, directorio, 'sqlite' if use_sqlite else 'postgresql', catalogo
+
+
+# --- Peticiones por endpoint ---
+
+def _rangos(aleatorio, cantidad):
+    """Rangos de fechas dentro del periodo sembrado (de 1 a 30 días)"""
+    rangos = []
+    for _ in range(cantidad):
+        largo = aleatorio.randint(1, 30)
+        desde = FECHA_BASE + timedelta(days=aleatorio.randint(0, DIAS - largo))
+        rangos.append((desde, desde + timedelta(days=largo - 1)))
+    return rangos
+
+
+def _envios(catalogo, aleatorio, cantidad):
+    """Cuerpos de /api/submit-survey con la misma mezcla de perfiles que la siembra"""
+    opciones = {}
+    for option_id, (pregunta_id, puntaje) in catalogo.opciones.items():
+        opciones.setdefault(pregunta_id, []).append((puntaje, option_id))
+    envios = []
+    for _ in range(cantidad):
+        riesgo = aleatorio.random() < 0.15
+        respuestas = {}
+        for pregunta_id, candidatas in opciones.items():
+            candidatas = sorted(candidatas)
+            elegida = aleatorio.choices(candidatas, weights=pesos_opciones(len(candidatas), riesgo))[0]
+            respuestas[str(pregunta_id)] = elegida[1]
+        if aleatorio.random() < 0.35:
+            envios.append({'is_anonymous': True, 'responses': respuestas})
+        else:
+            envios.append({'is_anonymous': False, 'responses': respuestas,
+                           'nombre': f'Carga {aleatorio.randint(1, 10 ** 6)}',
+                           'email': f'carga{aleatorio.randint(1, 10 ** 6)}@ejemplo.cl',
+                           'edad': aleatorio.randint(14, 63),
+                           'sexo': aleatorio.choice(['Femenino', 'Masculino', 'Otro'])})
+    return envios
+
+
+def peticiones_endpoint(endpoint, puerto, catalogo, semilla):
+    aleatorio = random.Random(f"{semilla}-{endpoint}")
+    if endpoint == 'survey':
+        return [peticion_get(puerto, '/survey')]
+    if endpoint == 'dashboard':
+        return [peticion_get(puerto, '/dashboard')]
+    if endpoint == 'submit':
+        return [peticion_post(puerto, '/api/submit-survey', datos) for datos in _envios(catalogo, aleatorio, 200)]
+    if endpoint == 'stats':
+        # Mitad sin rango (contadores) y mitad con rango (rollups diarios)
+        rangos = [peticion_get(puerto, f'/api/stats?from={desde}&to={hasta}')
+                  for desde, hasta in _rangos(aleatorio, 50)]
+        return [peticion_get(puerto, '/api/stats')] * len(rangos) + rangos
+    if endpoint == 'series':
+        return [peticion_get(puerto, f'/api/series?from={desde}&to={hasta}')
+                for desde, hasta in _rangos(aleatorio, 50)]
+    raise ValueError(f"Endpoint desconocido: {endpoint}")
+
+
+def _debug(puerto):
+    with urllib.request.urlopen(f'http://127.0.0.1:{puerto}/api/debug', timeout=60) as respuesta:
+        return json.loads(respuesta.read())
+
+
+def _consultas(antes, despues, peticiones):
+    """Consultas del repositorio y checkouts del pool por petición entre dos lecturas de /api/debug"""
+    llamadas = {}
+    for nombre, datos in despues.get('sentencias', {}).items():
+        if nombre.startswith('_'):
+            continue
+        delta = datos['llamadas'] - antes.get('sentencias', {}).get(nombre, {}).get('llamadas', 0)
+        if delta:
+            llamadas[nombre] = delta
+    # La segunda lectura de /api/debug toma una conexión del pool
+    checkouts = despues['pool']['checkouts'] - antes['pool']['checkouts'] - 1
+    return {
+        'consultas_por_peticion': round(sum(llamadas.values()) / peticiones, 3) if peticiones else 0.0,
+        'checkouts_por_peticion': round(checkouts / peticiones, 3) if peticiones else 0.0,
+        'consultas': llamadas,
+    }
+
+
+def correr(args):
+    entorno, directorio, motor, catalogo = preparar_base(args)
+    comando = [sys.executable, '-m', 'gunicorn', 'app:app', '-c', os.path.join(DIRECTORIO_REPO, 'gunicorn.conf.py'),
+               '--pythonpath', DIRECTORIO_REPO, '--bind', f'127.0.0.1:{args.puerto}', '--workers', '1']
+    proceso = subprocess.Popen(comando, cwd=directorio, env=entorno, stdout=subprocess.DEVNULL)
+    informe = {
+        'motor': motor,
+        'usuarios': args.usuarios,
+        'semilla': args.semilla,
+        'conexiones': args.conexiones,
+        'duracion_s': args.duracion,
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'endpoints': {},
+    }
+    try:
+        esperar_puerto(args.puerto, proceso)
+        for endpoint in args.endpoints.split(','):
+            peticiones = peticiones_endpoint(endpoint, args.puerto, catalogo, args.semilla)
+            # Calentamiento: catálogo, plantillas, sentencias preparadas y conexiones del pool
+            asyncio.run(medir(args.puerto, min(args.conexiones, 4), 1, peticiones, semilla=args.semilla))
+            antes = _debug(args.puerto)
+            fila = asyncio.run(medir(args.puerto, args.conexiones, args.duracion, peticiones, semilla=args.semilla))
+            fila.update(_consultas(antes, _debug(args.puerto), fila['peticiones']))
+            informe['endpoints'][ENDPOINTS[endpoint]] = fila
+            _log(f"⏱️ {ENDPOINTS[endpoint]:24} {fila['req_s']:8.1f} req/s  p50 {fila['p50_ms']:6.1f}  "
+                 f"p95 {fila['p95_ms']:6.1f}  p99 {fila['p99_ms']:7.1f} ms  "
+                 f"{fila['consultas_por_peticion']:.2f} consultas/pet  errores {fila['errores']}")
+    finally:
+        proceso.terminate()
+        proceso.wait(timeout=30)
+    return informe
+
+
+# --- Comparación con una línea base ---
+
+def comparar(informe, base, tolerancia, holgura_ms=1.0):
+    """
+    Regresiones de `informe` respecto de `base`: menos req/s o más p99 que la
+    tolerancia relativa (p99 con holgura absoluta para latencias de pocos ms),
+    más consultas por petición o más de 1% de errores
+    """
+    regresiones = []
+    if (informe['motor'], informe['usuarios']) != (base.get('motor'), base.get('usuarios')):
+        _log(f"⚠️ La línea base es de {base.get('motor')} con {base.get('usuarios')} usuarios")
+    for nombre, actual in informe['endpoints'].items():
+        previo = base.get('endpoints', {}).get(nombre)
+        if previo is None:
+            continue
+        if actual['req_s'] < previo['req_s'] * (1 - tolerancia):
+            regresiones.append(f"{nombre}: {actual['req_s']} req/s (base {previo['req_s']})")
+        if actual['p99_ms'] > previo['p99_ms'] * (1 + tolerancia) + holgura_ms:
+            regresiones.append(f"{nombre}: p99 {actual['p99_ms']} ms (base {previo['p99_ms']})")
+        if actual['consultas_por_peticion'] > previo['consultas_por_peticion'] + 0.05:
+            regresiones.append(f"{nombre}: {actual['consultas_por_peticion']} consultas/petición "
+                               f"(base {previo['consultas_por_peticion']})")
+        if actual['tasa_error'] > 0.01:
+            regresiones.append(f"{nombre}: {actual['tasa_error']:.1%} de errores")
+    return regresiones
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Benchmark reproducible de los endpoints con datos sintéticos')
+    parser.add_argument('--usuarios', type=int, default=10000)
+    parser.add_argument('--semilla', type=int, default=1)
+    parser.add_argument('--conexiones', type=int, default=20)
+    parser.add_argument('--duracion', type=float, default=10)
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS))
+    parser.add_argument('--puerto', type=int, default=PUERTO)
+    parser.add_argument('--directorio', default=os.path.join(tempfile.gettempdir(), 'encuesta-benchmark'),
+                        help='directorio de la base SQLite del benchmark')
+    parser.add_argument('--salida', help='archivo JSON del informe (por defecto, stdout)')
+    parser.add_argument('--base', help='informe JSON guardado con el que comparar')
+    parser.add_argument('--tolerancia', type=float, default=0.2, help='regresión relativa admitida')
+    parser.add_argument('--limpiar', action='store_true', help='borrar la base SQLite del benchmark y salir')
+    args = parser.parse_args(argv)
+
+    if args.limpiar:
+        shutil.rmtree(args.directorio, ignore_errors=True)
+        return 0
+
+    informe = correr(args)
+    if args.base:
+        with open(args.base, encoding='utf-8') as archivo:
+            base = json.load(archivo)
+        informe['regresiones'] = comparar(informe, base, args.tolerancia)
+
+    texto = json.dumps(informe, ensure_ascii=False, indent=2)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as archivo:
+            archivo.write(texto + '\n')
+        _log(f"📄 Informe en {args.salida}")
+    else:
+        print(texto)
+
+    if informe.get('regresiones'):
+        for regresion in informe['regresiones']:
+            _log(f"❌ {regresion}")
+        return 1
+    if args.base:
+        _log("✅ Sin regresiones respecto de la línea base")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,73 @@
+"""
+Páginas pre-renderizadas en memoria (/, /mision, /survey)
+Cada página se renderiza una vez por versión (sello del catálogo para /survey)
+y se sirve como bytes con ETag fuerte, Cache-Control y respuestas 304
+"""
+import hashlib
+import threading
+
+from flask import Response, request
+
+
+class _Pagina:
+    __slots__ = ('version', 'cuerpo', 'etag')
+
+    def __init__(self, version, cuerpo):
+        self.version = version
+        self.cuerpo = cuerpo
+        self.etag = hashlib.sha256(cuerpo).hexdigest()[:32]
+
+
+class CachePaginas:
+    def __init__(self, max_age=60):
+        self.max_age = max_age
+        self._paginas = {}
+        self._lock = threading.Lock()
+        self._stats = {'renders': 0, 'hits': 0, 'no_modificadas': 0}
+
+    def vigente(self, nombre, version):
+        """La página cacheada si corresponde a `version`, o None"""
+        pagina = self._paginas.get(nombre)
+        if pagina is None or pagina.version != version:
+            return None
+        self._stats['hits'] += 1
+        return pagina
+
+    def guardar(self, nombre, version, html):
+        pagina = _Pagina(version, html.encode('utf-8'))
+        with self._lock:
+            self._paginas[nombre] = pagina
+            self._stats['renders'] += 1
+        return pagina
+
+    def pagina(self, nombre, version, renderizar):
+        """Bytes y ETag de la página; se renderiza solo si cambió la versión"""
+        return self.vigente(nombre, version) or self.guardar(nombre, version, renderizar())
+
+    def preparar(self, response, pagina):
+        """ETag y Cache-Control de una página (sirve para respuestas Flask y Quart)"""
+        response.set_etag(pagina.etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+
+    def contar(self, response):
+        if response.status_code == 304:
+            self._stats['no_modificadas'] += 1
+        return response
+
+    def servir(self, nombre, version, renderizar):
+        """Respuesta HTML cacheada; 304 si el cliente ya tiene esta versión"""
+        pagina = self.pagina(nombre, version, renderizar)
+        response = Response(pagina.cuerpo, mimetype='text/html')
+        self.preparar(response, pagina)
+        return self.contar(response.make_conditional(request))
+
+    def invalidar(self):
+        with self._lock:
+            self._paginas.clear()
+
+    def estadisticas(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['paginas'] = len(self._paginas)
+        return stats
@@ -0,0 +1,134 @@
+"""
+Caché en memoria de resultados calculados (contexto del dashboard)
+- TTL configurable
+- single-flight: un solo hilo recalcula; los demás esperan o reciben el valor anterior
+- stale-while-revalidate: mientras se recalcula se sirve el valor vencido si existe
+- máximo de entradas (claves como rangos de fechas): se descartan las que vencen antes
+"""
+import threading
+import time
+
+
+class _Entrada:
+    __slots__ = ('valor', 'expira', 'calculando', 'listo', 'generacion')
+
+    def __init__(self):
+        self.valor = None
+        self.expira = 0.0
+        self.calculando = False
+        self.listo = threading.Event()
+        self.generacion = 0
+
+
+class CacheResultados:
+    def __init__(self, calcular, ttl=5.0, espera_max=10.0, max_entradas=128):
+        self._calcular = calcular
+        self.ttl = ttl
+        self.espera_max = espera_max
+        self.max_entradas = max_entradas
+        self._entradas = {}
+        self._generacion = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'stale': 0,
+            'esperas': 0,
+            'recalculos': 0,
+            'errores': 0,
+            'recalculo_total_ms': 0.0,
+            'recalculo_max_ms': 0.0,
+            'recalculo_ultimo_ms': 0.0,
+            'invalidaciones': 0,
+            'descartadas': 0,
+        }
+
+    def obtener(self, clave=None, *args):
+        """Valor para `clave`; `args` se pasan a la función de cálculo"""
+        entrada = self._entradas.get(clave)
+        if entrada is not None and entrada.valor is not None and time.monotonic() < entrada.expira:
+            self._stats['hits'] += 1
+            return entrada.valor
+
+        while True:
+            with self._lock:
+                entrada = self._entradas.get(clave)
+                if entrada is None:
+                    if len(self._entradas) >= self.max_entradas:
+                        self._descartar()
+                    entrada = self._entradas[clave] = _Entrada()
+                if entrada.valor is not None and time.monotonic() < entrada.expira:
+                    self._stats['hits'] += 1
+                    return entrada.valor
+                if entrada.calculando:
+                    if entrada.valor is not None:
+                        # Otro hilo ya recalcula: servir el valor vencido
+                        self._stats['stale'] += 1
+                        return entrada.valor
+                    self._stats['esperas'] += 1
+                    evento = entrada.listo
+                else:
+                    self._stats['misses'] += 1
+                    entrada.calculando = True
+                    entrada.listo = threading.Event()
+                    generacion = self._generacion
+                    evento = None
+
+            if evento is not None:
+                # Primer cálculo en curso y sin valor previo: esperar y reintentar
+                evento.wait(self.espera_max)
+                continue
+
+            return self._recalcular(entrada, generacion, args)
+
+    def _recalcular(self, entrada, generacion, args):
+        inicio = time.perf_counter()
+        try:
+            valor = self._calcular(*args)
+        except Exception:
+            with self._lock:
+                self._stats['errores'] += 1
+                entrada.calculando = False
+                entrada.listo.set()
+            raise
+
+        ms = (time.perf_counter() - inicio) * 1000
+        with self._lock:
+            entrada.valor = valor
+            # Si se invalidó durante el cálculo, el valor nace vencido
+            entrada.expira = time.monotonic() + self.ttl if generacion == self._generacion else 0.0
+            entrada.calculando = False
+            entrada.listo.set()
+            self._stats['recalculos'] += 1
+            self._stats['recalculo_total_ms'] += ms
+            self._stats['recalculo_ultimo_ms'] = ms
+            self._stats['recalculo_max_ms'] = max(self._stats['recalculo_max_ms'], ms)
+        return valor
+
+    def _descartar(self):
+        # Con el lock tomado: quitar la mitad de las entradas que vencen antes
+        # (las que se están calculando se conservan para sus hilos en espera)
+        candidatas = sorted((c for c, e in self._entradas.items() if not e.calculando),
+                            key=lambda c: self._entradas[c].expira)
+        for clave in candidatas[:max(1, self.max_entradas // 2)]:
+            del self._entradas[clave]
+            self._stats['descartadas'] += 1
+
+    def invalidar(self):
+        """Vencer todas las entradas (se conservan para servirlas mientras se recalculan)"""
+        with self._lock:
+            self._generacion += 1
+            self._stats['invalidaciones'] += 1
+            for entrada in self._entradas.values():
+                entrada.expira = 0.0
+
+    def estadisticas(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entradas'] = len(self._entradas)
+        stats['ttl'] = self.ttl
+        stats['recalculo_promedio_ms'] = round(
+            stats['recalculo_total_ms'] / stats['recalculos'], 3) if stats['recalculos'] else 0.0
+        for clave in ('recalculo_total_ms', 'recalculo_max_ms', 'recalculo_ultimo_ms'):
+            stats[clave] = round(stats[clave], 3)
+        return stats
@@ -0,0 +1,228 @@
+"""
+Catálogo en memoria de preguntas y opciones (uno por worker)
+Se carga una vez y se invalida con el sello de versión de la tabla catalog_version,
+que las migraciones (migraciones.py) actualizan al cambiar el cuestionario
+"""
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+
+class RespuestaInvalida(ValueError):
+    """Las respuestas enviadas no corresponden al cuestionario vigente"""
+
+
+def clasificar(puntaje_total):
+    """Determinar clasificación según el puntaje total"""
+    if puntaje_total <= 5:
+        return 'Leve'
+    elif puntaje_total <= 11:
+        return 'Moderado'
+    else:
+        return 'Grave'
+
+
+# Encuesta validada y puntuada, lista para escribirse
+# usuario: (nombre, email, edad, sexo); respuestas: [(pregunta_id, option_id, puntaje)]
+Envio = namedtuple('Envio', 'usuario respuestas puntaje_total clasificacion timestamp')
+
+USUARIO_ANONIMO = ("Anónimo", "anonimo@encuesta.com", 0, "Prefiero no decirlo")
+
+
+def crear_tabla_version(cur):
+    """Tabla con el sello de versión del cuestionario (misma DDL en SQLite y PostgreSQL)"""
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS catalog_version (
+            id INTEGER PRIMARY KEY,
+            version BIGINT NOT NULL
+        )
+    ''')
+
+
+CONSULTA_VERSION = "SELECT version FROM catalog_version WHERE id = 1"
+CONSULTA_PREGUNTAS = "SELECT id, texto FROM questions ORDER BY id"
+CONSULTA_OPCIONES = "SELECT id, pregunta_id, texto, puntaje FROM options ORDER BY id"
+
+
+def leer_version(cur):
+    cur.execute(CONSULTA_VERSION)
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def marcar_version(cur, placeholder='?'):
+    """Registrar un nuevo sello de versión (milisegundos, único aunque se recree la DB)"""
+    version = int(time.time() * 1000)
+    cur.execute("DELETE FROM catalog_version")
+    cur.execute(f"INSERT INTO catalog_version (id, version) VALUES (1, {placeholder})", (version,))
+    return version
+
+
+class Catalogo:
+    """Foto inmutable del cuestionario"""
+
+    def __init__(self, version, preguntas, opciones):
+        self.version = version
+        # [{'id', 'pregunta', 'opciones': [{'id', 'texto'}]}] en el orden de la encuesta
+        self.preguntas = preguntas
+        # option_id -> (pregunta_id, puntaje)
+        self.opciones = opciones
+
+    @classmethod
+    def desde_filas(cls, version, filas_preguntas, filas_opciones):
+        """Catálogo a partir de las filas de CONSULTA_PREGUNTAS y CONSULTA_OPCIONES"""
+        preguntas = [{'id': row[0], 'pregunta': row[1], 'opciones': []} for row in filas_preguntas]
+        por_id = {q['id']: q for q in preguntas}
+
+        opciones = {}
+        for option_id, pregunta_id, texto, puntaje in filas_opciones:
+            opciones[option_id] = (pregunta_id, puntaje)
+            if pregunta_id in por_id:
+                por_id[pregunta_id]['opciones'].append({'id': option_id, 'texto': texto})
+        return cls(version, preguntas, opciones)
+
+    def puntuar(self, respuestas):
+        """
+        Validar y puntuar un dict {pregunta_id: option_id}
+        Devuelve ([(pregunta_id, option_id, puntaje)], puntaje_total)
+        """
+        if not isinstance(respuestas, dict) or not respuestas:
+            raise RespuestaInvalida('No responses provided')
+
+        filas = []
+        puntaje_total = 0
+        for question_id, option_id in respuestas.items():
+            try:
+                question_id = int(question_id)
+                option_id = int(option_id)
+            except (TypeError, ValueError):
+                raise RespuestaInvalida(f'Respuesta inválida: {question_id}={option_id}')
+
+            opcion = self.opciones.get(option_id)
+            if opcion is None:
+                raise RespuestaInvalida(f'Opción desconocida: {option_id}')
+            if opcion[0] != question_id:
+                raise RespuestaInvalida(f'La opción {option_id} no pertenece a la pregunta {question_id}')
+
+            filas.append((question_id, option_id, opcion[1]))
+            puntaje_total += opcion[1]
+        return filas, puntaje_total
+
+
+class CacheCatalogo:
+    """Catálogo por worker: revalida el sello de versión como máximo cada `ttl` segundos"""
+
+    def __init__(self, repositorio, ttl=None):
+        self._repositorio = repositorio
+        self.ttl = float(os.environ.get('CATALOGO_TTL', 30)) if ttl is None else ttl
+        self._catalogo = None
+        self._verificado = 0.0
+        self._lock = threading.Lock()
+
+    def _revalidar(self):
+        actual = self._catalogo
+        self._catalogo = self._repositorio.catalogo_vigente(actual)
+        if self._catalogo is not actual:
+            print(f"📋 Catálogo cargado (versión {self._catalogo.version})")
+        self._verificado = time.monotonic()
+
+    def obtener(self):
+        catalogo = self._catalogo
+        if catalogo is not None and time.monotonic() - self._verificado < self.ttl:
+            return catalogo
+        with self._lock:
+            if self._catalogo is None or time.monotonic() - self._verificado >= self.ttl:
+                self._revalidar()
+            return self._catalogo
+
+    def invalidar(self):
+        self._verificado = 0.0
+
+    def puntuar(self, respuestas):
+        """Puntuar contra el catálogo; ante una opción desconocida se revalida una vez"""
+        catalogo = self.obtener()
+        try:
+            return catalogo.puntuar(respuestas)
+        except RespuestaInvalida:
+            # Limitar recargas forzadas para que ids inventados no golpeen la DB
+            if time.monotonic() - self._verificado < min(self.ttl, 5.0):
+                raise
+            self.invalidar()
+            return self.obtener().puntuar(respuestas)
+
+
+def _fecha_completada(valor):
+    """'completed_at' ISO 8601 de una encuesta respondida sin conexión (hora local del servidor)"""
+    try:
+        fecha = datetime.fromisoformat(str(valor).replace('Z', '+00:00'))
+    except ValueError:
+        raise RespuestaInvalida(f'Invalid completed_at: {valor}')
+    if fecha.tzinfo is not None:
+        fecha = fecha.astimezone().replace(tzinfo=None)
+    if fecha > datetime.now() + timedelta(minutes=5):
+        raise RespuestaInvalida('completed_at is in the future')
+    return fecha
+
+
+# Límites de los datos personales (columnas VARCHAR de PostgreSQL y códigos de la instantánea)
+MAX_TEXTO = 255
+MAX_SEXO = 50
+MAX_EDAD = 120
+
+
+def _texto(data, campo, maximo):
+    valor = data.get(campo)
+    if valor is None:
+        return ''
+    if not isinstance(valor, str):
+        raise RespuestaInvalida(f'{campo} debe ser texto')
+    if len(valor) > maximo:
+        raise RespuestaInvalida(f'{campo} supera los {maximo} caracteres')
+    return valor
+
+
+def _edad(valor):
+    """Entero entre 0 (no informada) y MAX_EDAD; acepta el número como texto"""
+    if valor is None or valor == '':
+        return 0
+    if isinstance(valor, str) and valor.strip().isdigit():
+        valor = int(valor)
+    if isinstance(valor, bool) or not isinstance(valor, int) or not 0 <= valor <= MAX_EDAD:
+        raise RespuestaInvalida(f'Edad inválida: {str(valor)[:20]}')
+    return valor
+
+
+def _usuario(data):
+    """(nombre, email, edad, sexo) validados: tipos y largos que la base acepta"""
+    return (
+        _texto(data, 'nombre', MAX_TEXTO),
+        _texto(data, 'email', MAX_TEXTO),
+        _edad(data.get('edad')),
+        _texto(data, 'sexo', MAX_SEXO),
+    )
+
+
+def preparar_envio(catalogo, data, permitir_fecha=False):
+    """
+    Validar y puntuar el JSON de una encuesta; lanza RespuestaInvalida.
+    Con permitir_fecha se respeta 'completed_at' (envíos diferidos desde tablets).
+    """
+    if not isinstance(data, dict) or not data:
+        raise RespuestaInvalida('No data received')
+
+    respuestas, puntaje_total = catalogo.puntuar(data.get('responses'))
+
+    # CREAR USUARIO SIEMPRE (anónimo o no)
+    if data.get('is_anonymous'):
+        # Para encuestas anónimas, usar datos genéricos
+        usuario = USUARIO_ANONIMO
+    else:
+        # Para encuestas con datos personales (validados antes de encolar o escribir)
+        usuario = _usuario(data)
+    if permitir_fecha and data.get('completed_at'):
+        timestamp = _fecha_completada(data['completed_at'])
+    else:
+        timestamp = datetime.now()
+    return Envio(usuario, respuestas, puntaje_total, clasificar(puntaje_total), timestamp)
@@ -0,0 +1,195 @@
+"""
+Compresión de respuestas HTML, JSON y CSV (brotli, de requirements.txt, o gzip)
+Se aplica en after_request según Accept-Encoding. Las respuestas con ETag
+(páginas cacheadas, /api/stats) se comprimen una sola vez: los bytes
+comprimidos quedan en memoria por (ruta, ETag, codificación). Las respuestas en
+streaming (/api/export) se comprimen bloque a bloque sin juntarlas en memoria.
+Se omiten cuerpos pequeños, los que ya traen Content-Encoding y los eventos SSE.
+"""
+import gzip
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRIMIBLES = {
+    'text/html', 'text/css', 'text/javascript', 'text/plain', 'text/csv',
+    'application/json', 'application/javascript', 'application/x-ndjson', 'image/svg+xml',
+}
+
+
+class _Compresor:
+    """Compresión incremental con la misma interfaz para gzip y brotli"""
+
+    def __init__(self, codificacion, nivel):
+        if codificacion == 'br':
+            self._br = brotli.Compressor(quality=min(nivel, 11))
+        else:
+            self._br = None
+            self._zlib = zlib.compressobj(nivel, zlib.DEFLATED, 31)
+
+    def bloque(self, datos):
+        # Cada bloque se vacía al cliente para que la descarga no se quede esperando
+        if self._br is not None:
+            return self._br.process(datos) + self._br.flush()
+        return self._zlib.compress(datos) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def fin(self):
+        if self._br is not None:
+            return self._br.finish()
+        return self._zlib.flush()
+
+
+def _comprimir(datos, codificacion, nivel):
+    if codificacion == 'br':
+        return brotli.compress(datos, quality=min(nivel, 11))
+    return gzip.compress(datos, nivel, mtime=0)
+
+
+class Compresion:
+    def __init__(self, min_bytes=1024, nivel=6, max_entradas=256):
+        self.min_bytes = min_bytes
+        self.nivel = nivel
+        self.max_entradas = max_entradas
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'comprimidas': 0,
+            'streaming': 0,
+            'cache_hits': 0,
+            'cache_misses': 0,
+            'omitidas_pequenas': 0,
+            'bytes_originales': 0,
+            'bytes_enviados': 0,
+            'cpu_ms': 0.0,
+        }
+
+    def codificacion(self, aceptadas):
+        """Codificación a usar según Accept-Encoding (brotli antes que gzip), o None"""
+        if brotli is not None and aceptadas['br'] > 0:
+            return 'br'
+        if aceptadas['gzip'] > 0:
+            return 'gzip'
+        return None
+
+    def aplica(self, request, response):
+        return (request.method != 'HEAD'
+                and response.status_code == 200
+                and response.mimetype in COMPRIMIBLES
+                and 'Content-Encoding' not in response.headers
+                and not response.cache_control.no_transform)
+
+    def procesar(self, request, response):
+        """Hook de after_request: devuelve la respuesta comprimida si corresponde"""
+        if not self.aplica(request, response):
+            return response
+        response.vary.add('Accept-Encoding')
+        codificacion = self.codificacion(request.accept_encodings)
+        if codificacion is None:
+            return response
+
+        if response.is_streamed:
+            response.response = self._streaming(response.response, codificacion)
+            response.headers.pop('Content-Length', None)
+            response.headers['Content-Encoding'] = codificacion
+            with self._lock:
+                self._stats['comprimidas'] += 1
+                self._stats['streaming'] += 1
+            return response
+        return self.comprimir_cuerpo(response, request.path, response.get_data(), codificacion)
+
+    def comprimir_cuerpo(self, response, ruta, datos, codificacion):
+        """Reemplazar el cuerpo (ya leído) por su versión comprimida; sirve para Flask y Quart"""
+        if len(datos) < self.min_bytes:
+            with self._lock:
+                self._stats['omitidas_pequenas'] += 1
+            return response
+        etag, debil = response.get_etag()
+        clave = (ruta, etag, codificacion) if etag else None
+        comprimidos = self._cache_obtener(clave)
+        if comprimidos is None:
+            inicio = time.thread_time()
+            comprimidos = _comprimir(datos, codificacion, self.nivel)
+            self._contar(len(datos), len(comprimidos), time.thread_time() - inicio)
+            self._cache_guardar(clave, comprimidos)
+        else:
+            self._contar(len(datos), len(comprimidos), 0)
+        response.set_data(comprimidos)
+        if etag and not debil:
+            # Otra representación del mismo recurso: ETag débil, como hace nginx.
+            # If-None-Match usa comparación débil, así que los 304 siguen funcionando
+            response.set_etag(etag, weak=True)
+        response.headers['Content-Encoding'] = codificacion
+        return response
+
+    def _streaming(self, iterable, codificacion):
+        compresor = _Compresor(codificacion, self.nivel)
+        try:
+            for datos in iterable:
+                if isinstance(datos, str):
+                    datos = datos.encode('utf-8')
+                inicio = time.thread_time()
+                comprimidos = compresor.bloque(datos)
+                self._contar(len(datos), len(comprimidos), time.thread_time() - inicio, respuesta=False)
+                if comprimidos:
+                    yield comprimidos
+            yield compresor.fin()
+        finally:
+            # Cierra el generador original (devuelve la conexión si el cliente cortó)
+            if hasattr(iterable, 'close'):
+                iterable.close()
+
+    def _contar(self, originales, enviados, cpu, respuesta=True):
+        with self._lock:
+            # Los bloques de una respuesta en streaming solo suman bytes y CPU
+            self._stats['comprimidas'] += respuesta
+            self._stats['bytes_originales'] += originales
+            self._stats['bytes_enviados'] += enviados
+            self._stats['cpu_ms'] += cpu * 1000
+
+    def _cache_obtener(self, clave):
+        if clave is None:
+            return None
+        with self._lock:
+            comprimidos = self._cache.get(clave)
+            if comprimidos is None:
+                self._stats['cache_misses'] += 1
+                return None
+            self._cache.move_to_end(clave)
+            self._stats['cache_hits'] += 1
+            return comprimidos
+
+    def _cache_guardar(self, clave, comprimidos):
+        if clave is None:
+            return
+        with self._lock:
+            self._cache[clave] = comprimidos
+            while len(self._cache) > self.max_entradas:
+                self._cache.popitem(last=False)
+
+    def estadisticas(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entradas_cache'] = len(self._cache)
+        stats['bytes_ahorrados'] = stats['bytes_originales'] - stats['bytes_enviados']
+        stats['cpu_ms'] = round(stats['cpu_ms'], 1)
+        stats['brotli'] = brotli is not None
+        return stats
+
+
+def registrar(app, min_bytes=1024, nivel=6, max_entradas=256):
+    """Comprimir las respuestas de la app en after_request"""
+    compresion = Compresion(min_bytes, nivel, max_entradas)
+
+    @app.after_request
+    def comprimir_respuesta(response):
+        return compresion.procesar(request, response)
+
+    return compresion
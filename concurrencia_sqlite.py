@@ -0,0 +1,168 @@
+"""
+Prueba de concurrencia del modo SQLite con varios workers de gunicorn
+
+1. Crea una base nueva en --directorio (python migraciones.py)
+2. Levanta gunicorn con --workers procesos y SQLITE_MODO=--modo
+3. Durante --duracion segundos envía encuestas a ritmo fijo (--tasa por segundo)
+   mientras --lectores conexiones consultan /api/stats y /api/series sin pausa
+   (sin caché del dashboard, así cada lectura va a la base)
+4. Al terminar compara con la base: cada envío respondido con 200 debe estar
+   guardado, ninguno puede haber fallado y los contadores del dashboard deben
+   cuadrar con las tablas (estadisticas.verificar)
+Termina con código 1 si se perdió o falló algún envío o si la tasa lograda
+quedó bajo el 95% de la pedida.
+
+Uso:
+    python concurrencia_sqlite.py [--tasa 100] [--duracion 20] [--workers 4]
+                                  [--lectores 8] [--modo produccion|desarrollo]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+
+import estadisticas
+from benchmark import (DIRECTORIO_REPO, _envios, _log, _rangos, esperar_puerto, medir, medir_a_tasa,
+                       peticion_get, peticion_post)
+from catalogo import CONSULTA_OPCIONES, CONSULTA_PREGUNTAS, CONSULTA_VERSION, Catalogo
+
+PUERTO = 5091
+
+
+def preparar_base(directorio):
+    """Base vacía y migrada en `directorio`; devuelve su catálogo"""
+    shutil.rmtree(directorio, ignore_errors=True)
+    os.makedirs(directorio)
+    entorno = dict(os.environ)
+    entorno.pop('DATABASE_URL', None)
+    subprocess.run([sys.executable, os.path.join(DIRECTORIO_REPO, 'migraciones.py')], cwd=directorio,
+                   env=entorno, check=True, stdout=subprocess.DEVNULL)
+    conn = sqlite3.connect(os.path.join(directorio, 'survey_local.db'))
+    try:
+        cur = conn.cursor()
+        cur.execute(CONSULTA_VERSION)
+        version = cur.fetchone()[0]
+        cur.execute(CONSULTA_PREGUNTAS)
+        preguntas = cur.fetchall()
+        cur.execute(CONSULTA_OPCIONES)
+        return Catalogo.desde_filas(version, preguntas, cur.fetchall())
+    finally:
+        conn.close()
+
+
+def revisar_base(directorio):
+    """(encuestas guardadas, diferencias de contadores, modo de journal, integridad)"""
+    conn = sqlite3.connect(os.path.join(directorio, 'survey_local.db'))
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*) FROM users")
+        guardadas = cur.fetchone()[0]
+        diferencias = estadisticas.verificar(cur)
+        cur.execute("PRAGMA journal_mode")
+        journal = cur.fetchone()[0]
+        cur.execute("PRAGMA integrity_check")
+        integridad = cur.fetchone()[0]
+        return guardadas, diferencias, journal, integridad
+    finally:
+        conn.close()
+
+
+async def _carga(args, envios, lecturas):
+    escritura, lectura = await asyncio.gather(
+        medir_a_tasa(args.puerto, args.tasa, args.duracion, envios, conexiones=args.conexiones),
+        medir(args.puerto, args.lectores, args.duracion, lecturas, semilla=args.semilla),
+    )
+    return escritura, lectura
+
+
+def correr(args):
+    catalogo = preparar_base(args.directorio)
+    aleatorio = random.Random(args.semilla)
+    envios = [peticion_post(args.puerto, '/api/submit-survey', datos)
+              for datos in _envios(catalogo, aleatorio, 500)]
+    lecturas = [peticion_get(args.puerto, '/api/stats')] + [
+        peticion_get(args.puerto, f'/api/series?from={desde}&to={hasta}')
+        for desde, hasta in _rangos(aleatorio, 20)]
+
+    entorno = dict(os.environ, SQLITE_MODO=args.modo, INGESTA_MODO='directo', DASHBOARD_CACHE_TTL='0',
+                   WEB_CONCURRENCY=str(args.workers))
+    entorno.pop('DATABASE_URL', None)
+    comando = [sys.executable, '-m', 'gunicorn', 'app:app', '-c', os.path.join(DIRECTORIO_REPO, 'gunicorn.conf.py'),
+               '--pythonpath', DIRECTORIO_REPO, '--bind', f'127.0.0.1:{args.puerto}',
+               '--workers', str(args.workers)]
+    proceso = subprocess.Popen(comando, cwd=args.directorio, env=entorno, stdout=subprocess.DEVNULL)
+    try:
+        esperar_puerto(args.puerto, proceso)
+        _log(f"✍️ {args.tasa} envíos/s durante {args.duracion}s con {args.workers} workers "
+             f"y {args.lectores} lectores (modo {args.modo})")
+        escritura, lectura = asyncio.run(_carga(args, envios, lecturas))
+    finally:
+        proceso.terminate()
+        proceso.wait(timeout=30)
+
+    guardadas, diferencias, journal, integridad = revisar_base(args.directorio)
+    aceptadas = escritura['estados'].get('200', 0)
+    fallidas = escritura['enviadas'] - aceptadas
+    informe = {
+        'modo': args.modo,
+        'journal_mode': journal,
+        'workers': args.workers,
+        'escritura': escritura,
+        'lectura': lectura,
+        'aceptadas': aceptadas,
+        'fallidas': fallidas,
+        'guardadas': guardadas,
+        'perdidas': aceptadas - guardadas,
+        'contadores_cuadran': not diferencias,
+        'integridad': integridad,
+    }
+    problemas = []
+    if fallidas:
+        problemas.append(f"{fallidas} envíos sin 200 (estados {escritura['estados']}, errores {escritura['errores']})")
+    if guardadas != aceptadas:
+        problemas.append(f"{aceptadas} envíos aceptados pero {guardadas} guardados")
+    if diferencias:
+        problemas.append(f"contadores descuadrados: {diferencias[:5]}")
+    if integridad != 'ok':
+        problemas.append(f"integrity_check: {integridad}")
+    if escritura['tasa_lograda'] < args.tasa * 0.95:
+        problemas.append(f"tasa lograda {escritura['tasa_lograda']}/s de {args.tasa}/s")
+    informe['problemas'] = problemas
+    return informe
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Prueba de concurrencia de SQLite con varios workers')
+    parser.add_argument('--tasa', type=float, default=100, help='envíos por segundo')
+    parser.add_argument('--duracion', type=float, default=20, help='segundos de carga')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--lectores', type=int, default=8, help='conexiones leyendo el dashboard a la vez')
+    parser.add_argument('--conexiones', type=int, default=16, help='conexiones para repartir los envíos')
+    parser.add_argument('--modo', choices=('produccion', 'desarrollo'), default='produccion')
+    parser.add_argument('--semilla', type=int, default=1)
+    parser.add_argument('--puerto', type=int, default=PUERTO)
+    parser.add_argument('--directorio', default=os.path.join(tempfile.gettempdir(), 'encuesta-concurrencia'))
+    args = parser.parse_args(argv)
+
+    informe = correr(args)
+    print(json.dumps(informe, indent=2, ensure_ascii=False))
+    escritura, lectura = informe['escritura'], informe['lectura']
+    _log(f"✍️ escrituras: {escritura['tasa_lograda']}/s  p50 {escritura['p50_ms']}  p99 {escritura['p99_ms']} ms  "
+         f"aceptadas {informe['aceptadas']}  guardadas {informe['guardadas']}  fallidas {informe['fallidas']}")
+    _log(f"📖 lecturas: {lectura['req_s']} req/s  p50 {lectura['p50_ms']}  p99 {lectura['p99_ms']} ms  "
+         f"errores {lectura['errores']}")
+    for problema in informe['problemas']:
+        _log(f"❌ {problema}")
+    if not informe['problemas']:
+        _log("✅ Sin envíos perdidos ni fallidos")
+    return 1 if informe['problemas'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
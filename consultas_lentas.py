@@ -0,0 +1,176 @@
+"""
+Registro de consultas lentas del repositorio
+- Cada sentencia que supera CONSULTAS_LENTAS_MS se anota con sus parámetros
+  (nombre y email redactados), duración, ruta e id de la petición
+- Las más lentas (CONSULTAS_LENTAS_EXPLAIN_MS) se acompañan con su plan:
+  EXPLAIN (ANALYZE, BUFFERS) en PostgreSQL para lecturas (las escrituras solo con
+  EXPLAIN, sin volver a ejecutarlas) y EXPLAIN QUERY PLAN en SQLite. A lo sumo un
+  plan por sentencia cada CONSULTAS_LENTAS_EXPLAIN_SEG, para no sumar carga
+  justo cuando la base ya está lenta
+- Las últimas CONSULTAS_LENTAS_BUFFER quedan en memoria para /api/consultas-lentas
+Por debajo del umbral el costo es una comparación por sentencia.
+"""
+import os
+import re
+import threading
+import time
+from collections import deque
+from datetime import date, datetime
+from functools import lru_cache
+
+import metricas
+
+# Columnas con datos personales: sus parámetros nunca se registran
+COLUMNAS_PII = ('nombre', 'email')
+REDACTADO = '[redactado]'
+
+MAX_SQL = 2000
+MAX_ELEMENTOS = 20
+
+
+@lru_cache(maxsize=256)
+def posiciones_pii(sql):
+    """
+    Índices de los parámetros que van a columnas PII. Los INSERT del repo listan
+    las columnas y los marcadores (VALUES o unnest) en el mismo orden.
+    """
+    posiciones = []
+    for m in re.finditer(r'INSERT\s+INTO\s+\w+\s*\(([^)]*)\)', sql, re.IGNORECASE):
+        previos = len(re.findall(r'%s|\?', sql[:m.end()]))
+        columnas = [c.strip().lower() for c in m.group(1).split(',')]
+        posiciones += [previos + i for i, columna in enumerate(columnas) if columna in COLUMNAS_PII]
+    return frozenset(posiciones)
+
+
+def _serializable(valor):
+    if isinstance(valor, (list, tuple)):
+        valores = [_serializable(v) for v in valor[:MAX_ELEMENTOS]]
+        if len(valor) > MAX_ELEMENTOS:
+            valores.append(f"... (+{len(valor) - MAX_ELEMENTOS})")
+        return valores
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if valor is None or isinstance(valor, (int, float, str, bool)):
+        return valor
+    return str(valor)
+
+
+def redactar(sql, parametros):
+    """Parámetros listos para JSON, con los de columnas PII reemplazados"""
+    pii = posiciones_pii(sql)
+    redactados = []
+    for i, valor in enumerate(parametros or ()):
+        if i in pii:
+            # unnest(%s::text[]): un arreglo con un valor por encuesta
+            valor = [REDACTADO] * len(valor) if isinstance(valor, (list, tuple)) else REDACTADO
+        redactados.append(_serializable(valor))
+    return redactados
+
+
+def _es_lectura(sql):
+    # nextval también escribe: EXPLAIN ANALYZE consumiría ids
+    return (re.match(r'\s*(SELECT|WITH)\b', sql, re.IGNORECASE) is not None
+            and re.search(r'\b(INSERT|UPDATE|DELETE|nextval|setval)\b', sql, re.IGNORECASE) is None)
+
+
+class RegistroConsultasLentas:
+    def __init__(self, umbral_ms=100.0, explain_ms=0.0, capacidad=200, intervalo_explain=60.0):
+        self.umbral_ms = umbral_ms
+        # 0 desactiva la captura de planes
+        self.explain_ms = explain_ms
+        self.intervalo_explain = intervalo_explain
+        self._entradas = deque(maxlen=capacidad)
+        self._lock = threading.Lock()
+        self._ultimo_plan = {}
+        self._registradas = 0
+        self._planes = 0
+
+    def observar(self, nombre, ms, conn=None, sql=None, parametros=None, filas=None, sqlite=False):
+        """
+        Anotar una sentencia que superó el umbral (quien llama ya comparó ms con
+        umbral_ms). Para executemany `parametros` es la primera fila y `filas` el
+        total; con `conn` se puede capturar el plan en la misma transacción.
+        """
+        ruta, request_id = metricas.peticion_actual()
+        entrada = {
+            'fecha': datetime.now().isoformat(timespec='milliseconds'),
+            'sentencia': nombre,
+            'duracion_ms': round(ms, 3),
+            'ruta': ruta,
+            'request_id': request_id,
+            'sql': re.sub(r'\s+', ' ', sql).strip()[:MAX_SQL] if sql else None,
+            'parametros': redactar(sql, parametros) if sql else [],
+        }
+        if filas is not None:
+            entrada['filas'] = filas
+        if conn is not None and sql and self._toca_plan(nombre, ms):
+            entrada['plan'] = self._explicar(conn, sql, parametros, sqlite)
+        with self._lock:
+            self._entradas.append(entrada)
+            self._registradas += 1
+        print(f"🐢 Consulta lenta {nombre}: {ms:.1f} ms (ruta {ruta or '-'}, petición {request_id or '-'})"
+              + (f" parámetros {entrada['parametros']}" if entrada['parametros'] else ''))
+
+    def _toca_plan(self, nombre, ms):
+        if not self.explain_ms or ms < self.explain_ms:
+            return False
+        ahora = time.monotonic()
+        with self._lock:
+            ultimo = self._ultimo_plan.get(nombre)
+            if ultimo is not None and ahora - ultimo < self.intervalo_explain:
+                return False
+            self._ultimo_plan[nombre] = ahora
+            self._planes += 1
+        return True
+
+    def _explicar(self, conn, sql, parametros, sqlite):
+        """Plan de la sentencia como lista de líneas (o el error, sin afectar la petición)"""
+        cur = conn.cursor()
+        try:
+            if sqlite:
+                cur.execute("EXPLAIN QUERY PLAN " + sql, parametros or ())
+                return [fila[-1] for fila in cur.fetchall()]
+            # Punto de guardado: si EXPLAIN falla, la transacción de la petición sigue viva
+            cur.execute("SAVEPOINT consulta_lenta")
+            try:
+                opciones = "(ANALYZE, BUFFERS) " if _es_lectura(sql) else ""
+                cur.execute("EXPLAIN " + opciones + sql, parametros)
+                plan = [fila[0] for fila in cur.fetchall()]
+                cur.execute("RELEASE SAVEPOINT consulta_lenta")
+                return plan
+            except Exception:
+                cur.execute("ROLLBACK TO SAVEPOINT consulta_lenta")
+                raise
+        except Exception as e:
+            return [f"EXPLAIN falló: {e}"]
+        finally:
+            cur.close()
+
+    def entradas(self, limite=None):
+        """Las más recientes primero"""
+        with self._lock:
+            entradas = list(self._entradas)
+        entradas.reverse()
+        return entradas[:limite] if limite else entradas
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'umbral_ms': self.umbral_ms,
+                'explain_ms': self.explain_ms,
+                'capacidad': self._entradas.maxlen,
+                'en_buffer': len(self._entradas),
+                'registradas': self._registradas,
+                'planes': self._planes,
+            }
+
+
+def crear_registro():
+    """Registro del proceso según el entorno (CONSULTAS_LENTAS_MS=0 lo desactiva)"""
+    umbral_ms = float(os.environ.get('CONSULTAS_LENTAS_MS', 200))
+    if umbral_ms <= 0:
+        return None
+    return RegistroConsultasLentas(umbral_ms=umbral_ms,
+                                   explain_ms=float(os.environ.get('CONSULTAS_LENTAS_EXPLAIN_MS', 0)),
+                                   capacidad=int(os.environ.get('CONSULTAS_LENTAS_BUFFER', 200)),
+                                   intervalo_explain=float(os.environ.get('CONSULTAS_LENTAS_EXPLAIN_SEG', 60)))
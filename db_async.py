@@ -0,0 +1,219 @@
+"""
+Acceso asíncrono a la base para app_async.py
+- PostgreSQL: pool de asyncpg (sentencias preparadas y cacheadas por conexión)
+- SQLite: una conexión aiosqlite con uso exclusivo por transacción
+Las consultas usan el mismo SQL que el modo sincrónico (marcadores %s o ?);
+en PostgreSQL se traducen una vez a $1, $2, ...
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+
+from pool_db import PoolAgotado, pragmas_sqlite
+from repositorio import marcadores_postgres
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+try:
+    import aiosqlite
+except ImportError:
+    aiosqlite = None
+
+
+class _ConexionPostgres:
+    def __init__(self, conn):
+        self._conn = conn
+
+    async def filas(self, sql, parametros=()):
+        return await self._conn.fetch(marcadores_postgres(sql), *parametros)
+
+    async def fila(self, sql, parametros=()):
+        return await self._conn.fetchrow(marcadores_postgres(sql), *parametros)
+
+    async def ejecutar(self, sql, parametros=()):
+        await self._conn.execute(marcadores_postgres(sql), *parametros)
+
+    async def ejecutar_muchos(self, sql, filas):
+        await self._conn.executemany(marcadores_postgres(sql), filas)
+
+    def transaccion(self):
+        return self._conn.transaction()
+
+
+class _ConexionSQLite:
+    def __init__(self, conn):
+        self._conn = conn
+
+    async def filas(self, sql, parametros=()):
+        async with self._conn.execute(sql, parametros) as cur:
+            return await cur.fetchall()
+
+    async def fila(self, sql, parametros=()):
+        async with self._conn.execute(sql, parametros) as cur:
+            return await cur.fetchone()
+
+    async def ejecutar(self, sql, parametros=()):
+        """Devuelve el id de la fila insertada (lastrowid)"""
+        async with self._conn.execute(sql, parametros) as cur:
+            return cur.lastrowid
+
+    async def ejecutar_muchos(self, sql, filas):
+        await self._conn.executemany(sql, filas)
+
+    @asynccontextmanager
+    async def transaccion(self):
+        try:
+            yield
+        except BaseException:
+            await self._conn.rollback()
+            raise
+        await self._conn.commit()
+
+
+async def _configurar_postgres(conn):
+    # Enteros en formato texto: igual que psycopg2, '25' sirve para una columna INTEGER
+    for tipo in ('int2', 'int4', 'int8'):
+        await conn.set_type_codec(tipo, schema='pg_catalog', encoder=str, decoder=int, format='text')
+
+
+class PoolPostgresAsync:
+    """Pool de asyncpg con las mismas variables de entorno que el pool sincrónico"""
+
+    sqlite = False
+
+    def __init__(self, dsn, minimo=1, maximo=10, timeout=5.0, max_usos=1000,
+                 chequeo_inactividad=30.0):
+        if asyncpg is None:
+            raise RuntimeError("Falta asyncpg: pip install -r requirements-async.txt")
+        self.dsn = dsn
+        self.minimo = minimo
+        self.maximo = max(maximo, minimo, 1)
+        self.timeout = timeout
+        self.max_usos = max_usos
+        self.chequeo_inactividad = chequeo_inactividad
+        self._pool = None
+        self._stats = {'checkouts': 0, 'timeouts': 0, 'espera_total_ms': 0.0, 'espera_max_ms': 0.0}
+
+    async def abrir(self):
+        self._pool = await asyncpg.create_pool(
+            self.dsn,
+            min_size=self.minimo,
+            max_size=self.maximo,
+            max_queries=self.max_usos,
+            max_inactive_connection_lifetime=max(self.chequeo_inactividad * 10, 60),
+            init=_configurar_postgres,
+        )
+
+    @asynccontextmanager
+    async def conexion(self):
+        inicio = time.perf_counter()
+        try:
+            conn = await self._pool.acquire(timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self._stats['timeouts'] += 1
+            raise PoolAgotado(f"Sin conexión libre tras {self.timeout}s ({self.maximo} en uso)")
+        espera = (time.perf_counter() - inicio) * 1000
+        self._stats['checkouts'] += 1
+        self._stats['espera_total_ms'] += espera
+        self._stats['espera_max_ms'] = max(self._stats['espera_max_ms'], espera)
+        try:
+            yield _ConexionPostgres(conn)
+        finally:
+            await self._pool.release(conn)
+
+    def estadisticas(self):
+        checkouts = self._stats['checkouts']
+        return {
+            'tipo': 'asyncpg',
+            'checkouts': checkouts,
+            'timeouts': self._stats['timeouts'],
+            'total': self._pool.get_size() if self._pool else 0,
+            'inactivas': self._pool.get_idle_size() if self._pool else 0,
+            'maximo': self.maximo,
+            'espera_promedio_ms': round(self._stats['espera_total_ms'] / checkouts, 3) if checkouts else 0.0,
+            'espera_max_ms': round(self._stats['espera_max_ms'], 3),
+        }
+
+    async def cerrar(self):
+        if self._pool is not None:
+            await self._pool.close()
+
+
+class PoolSQLiteAsync:
+    """
+    Una conexión aiosqlite (su propio hilo) para todo el proceso. SQLite admite un
+    solo escritor, así que cada uso toma la conexión en exclusiva hasta terminar
+    """
+
+    sqlite = True
+
+    def __init__(self, ruta, timeout=5.0, pragmas=(), busy_timeout=5.0):
+        if aiosqlite is None:
+            raise RuntimeError("Falta aiosqlite: pip install -r requirements-async.txt")
+        self.ruta = ruta
+        self.timeout = timeout
+        self.pragmas = tuple(pragmas)
+        self.busy_timeout = busy_timeout
+        self._conn = None
+        self._lock = asyncio.Lock()
+        self._stats = {'checkouts': 0, 'timeouts': 0, 'espera_total_ms': 0.0, 'espera_max_ms': 0.0}
+
+    async def abrir(self):
+        self._conn = await aiosqlite.connect(self.ruta, timeout=self.busy_timeout)
+        # Los mismos PRAGMAs que el pool sincrónico (SQLITE_MODO=produccion)
+        for pragma in self.pragmas:
+            await self._conn.execute(f"PRAGMA {pragma}")
+
+    @asynccontextmanager
+    async def conexion(self):
+        inicio = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._lock.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self._stats['timeouts'] += 1
+            raise PoolAgotado(f"La conexión SQLite sigue ocupada tras {self.timeout}s")
+        espera = (time.perf_counter() - inicio) * 1000
+        self._stats['checkouts'] += 1
+        self._stats['espera_total_ms'] += espera
+        self._stats['espera_max_ms'] = max(self._stats['espera_max_ms'], espera)
+        try:
+            yield _ConexionSQLite(self._conn)
+        finally:
+            if self._conn.in_transaction:
+                await self._conn.rollback()
+            self._lock.release()
+
+    def estadisticas(self):
+        checkouts = self._stats['checkouts']
+        return {
+            'tipo': 'aiosqlite',
+            'checkouts': checkouts,
+            'timeouts': self._stats['timeouts'],
+            'esperando': len(getattr(self._lock, '_waiters', None) or ()),
+            'espera_promedio_ms': round(self._stats['espera_total_ms'] / checkouts, 3) if checkouts else 0.0,
+            'espera_max_ms': round(self._stats['espera_max_ms'], 3),
+        }
+
+    async def cerrar(self):
+        if self._conn is not None:
+            await self._conn.close()
+
+
+def crear_pool_async(database_url, use_sqlite, ruta_sqlite='survey_local.db'):
+    """Pool asíncrono del proceso según la configuración del entorno"""
+    timeout = float(os.environ.get('DB_POOL_TIMEOUT', 5))
+    if use_sqlite:
+        return PoolSQLiteAsync(ruta_sqlite, timeout=timeout, pragmas=pragmas_sqlite(),
+                               busy_timeout=int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)) / 1000)
+    return PoolPostgresAsync(
+        database_url,
+        minimo=int(os.environ.get('DB_POOL_MIN', 1)),
+        maximo=int(os.environ.get('DB_POOL_MAX', 10)),
+        timeout=timeout,
+        max_usos=int(os.environ.get('DB_POOL_MAX_USOS', 1000)),
+        chequeo_inactividad=float(os.environ.get('DB_POOL_CHEQUEO_SEG', 30)),
+    )
@@ -0,0 +1,232 @@
+"""
+Difusión en vivo de estadísticas por Server-Sent Events (/api/stats/stream)
+Un solo hilo por worker consulta la versión de datos; cuando cambia, lee los
+contadores una vez, calcula el delta y lo reparte a todos los suscriptores.
+Cada suscriptor tiene un buffer acotado: si se llena se descarta y recibe un
+evento 'resync' para que vuelva a pedir /api/stats.
+"""
+import json
+import os
+import queue
+import threading
+import time
+
+
+class DifusorLleno(Exception):
+    """Se alcanzó el máximo de suscriptores del worker"""
+
+
+def _evento(nombre, datos, id_evento=None):
+    """Texto SSE listo para enviar (se serializa una sola vez por cambio)"""
+    lineas = []
+    if id_evento is not None:
+        lineas.append(f"id: {id_evento}")
+    lineas.append(f"event: {nombre}")
+    lineas.append(f"data: {json.dumps(datos, ensure_ascii=False, separators=(',', ':'))}")
+    return '\n'.join(lineas) + '\n\n'
+
+
+def calcular_delta(anterior, actual):
+    """Solo las claves cuyo contador cambió, con su valor absoluto nuevo"""
+    delta = {}
+    for grupo, valores in actual.items():
+        previos = anterior.get(grupo, {})
+        cambios = {clave: total for clave, total in valores.items() if previos.get(clave) != total}
+        # Claves que desaparecieron (reconstrucción): vuelven a cero
+        cambios.update({clave: 0 for clave in previos if clave not in valores})
+        if cambios:
+            delta[grupo] = cambios
+    return delta
+
+
+class _Suscripcion:
+    __slots__ = ('cola', 'descartes')
+
+    def __init__(self, buffer):
+        self.cola = queue.Queue(maxsize=buffer)
+        self.descartes = 0
+
+
+class Difusor:
+    def __init__(self, leer_version, leer_contadores, intervalo=1.0, latido=15.0, buffer=32,
+                 max_suscriptores=16, duracion_max=300.0):
+        self._leer_version = leer_version
+        self._leer_contadores = leer_contadores
+        self.intervalo = intervalo
+        self.latido = latido
+        self.buffer = buffer
+        self.max_suscriptores = max_suscriptores
+        self.duracion_max = duracion_max
+        self._suscriptores = set()
+        self._lock = threading.Lock()
+        self._hay_suscriptores = threading.Condition(self._lock)
+        self._despertar = threading.Event()
+        self._hilo = None
+        self._pid = None
+        self._version = None
+        self._contadores = None
+        self._stats = {
+            'conexiones': 0,
+            'rechazadas': 0,
+            'consultas_version': 0,
+            'lecturas_contadores': 0,
+            'eventos': 0,
+            'entregas': 0,
+            'resyncs': 0,
+            'errores': 0,
+        }
+
+    def _asegurar_hilo(self):
+        # El hilo se crea en el proceso que atiende (después del fork de gunicorn)
+        if self._pid == os.getpid() and self._hilo is not None:
+            return
+        with self._lock:
+            if self._pid != os.getpid() or self._hilo is None:
+                self._pid = os.getpid()
+                self._suscriptores = set()
+                self._version = None
+                self._contadores = None
+                self._hilo = threading.Thread(target=self._bucle, name='difusion', daemon=True)
+                self._hilo.start()
+
+    def suscribir(self):
+        self._asegurar_hilo()
+        with self._lock:
+            if len(self._suscriptores) >= self.max_suscriptores:
+                self._stats['rechazadas'] += 1
+                raise DifusorLleno()
+            suscripcion = _Suscripcion(self.buffer)
+            self._suscriptores.add(suscripcion)
+            self._stats['conexiones'] += 1
+            self._hay_suscriptores.notify()
+        return suscripcion
+
+    def cancelar(self, suscripcion):
+        with self._lock:
+            self._suscriptores.discard(suscripcion)
+
+    def notificar(self):
+        """Un envío se confirmó en este worker: revisar la versión sin esperar el intervalo"""
+        self._despertar.set()
+
+    def _bucle(self):
+        while True:
+            with self._lock:
+                while not self._suscriptores:
+                    # Sin suscriptores no se consulta la base; al volver, se parte de cero
+                    self._version = None
+                    self._contadores = None
+                    self._hay_suscriptores.wait()
+            self._despertar.wait(self.intervalo)
+            self._despertar.clear()
+            try:
+                self._revisar()
+            except Exception as e:
+                self._stats['errores'] += 1
+                print(f"❌ Error en difusión de estadísticas: {e}")
+                time.sleep(self.intervalo)
+
+    def _revisar(self):
+        version = self._leer_version()
+        self._stats['consultas_version'] += 1
+        if version == self._version:
+            return
+        contadores = self._leer_contadores()
+        self._stats['lecturas_contadores'] += 1
+        anterior = self._contadores
+        self._version = version
+        self._contadores = contadores
+        if anterior is None:
+            # Primera lectura: sin base para un delta, se anuncia la versión y los
+            # clientes que estén atrás recargan /api/stats
+            self._publicar(_evento('version', {'data_version': version}, version))
+            return
+        delta = calcular_delta(anterior, contadores)
+        if delta:
+            delta['data_version'] = version
+            self._publicar(_evento('delta', delta, version))
+
+    def _publicar(self, texto):
+        with self._lock:
+            suscriptores = list(self._suscriptores)
+            self._stats['eventos'] += 1
+        for suscripcion in suscriptores:
+            try:
+                suscripcion.cola.put_nowait(texto)
+                self._stats['entregas'] += 1
+            except queue.Full:
+                # Cliente lento: se descarta su buffer y se le pide recargar todo
+                self._vaciar(suscripcion)
+                suscripcion.descartes += 1
+                self._stats['resyncs'] += 1
+                try:
+                    suscripcion.cola.put_nowait(_evento('resync', {'data_version': self._version}))
+                except queue.Full:
+                    pass
+
+    @staticmethod
+    def _vaciar(suscripcion):
+        while True:
+            try:
+                suscripcion.cola.get_nowait()
+            except queue.Empty:
+                return
+
+    def transmitir(self, suscripcion, version_cliente=None):
+        """Generador del cuerpo SSE de un suscriptor (latidos, deltas y cierre por duración)"""
+        fin = time.monotonic() + self.duracion_max
+        try:
+            yield "retry: 3000\n\n"
+            # Versión actual al conectar: el cliente recarga /api/stats si se quedó atrás
+            version = self._version if self._version is not None else self._leer_version()
+            if str(version) != str(version_cliente):
+                yield _evento('version', {'data_version': version}, version)
+            while True:
+                restante = fin - time.monotonic()
+                if restante <= 0:
+                    # El navegador reconecta solo (retry) y la conexión se reparte de nuevo
+                    return
+                try:
+                    yield suscripcion.cola.get(timeout=min(self.latido, restante))
+                except queue.Empty:
+                    yield ": latido\n\n"
+        finally:
+            self.cancelar(suscripcion)
+
+    def estadisticas(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['suscriptores'] = len(self._suscriptores)
+            stats['max_suscriptores'] = self.max_suscriptores
+        stats['data_version'] = self._version
+        return stats
+
+
+def _max_clientes():
+    """
+    Dashboards en vivo por worker. Cada uno ocupa un hilo de gunicorn mientras está
+    conectado: por defecto un cuarto de WEB_THREADS y nunca más de la mitad, así las
+    demás rutas conservan sus hilos. Los dashboards que no entran consultan /api/stats
+    cada 30 s (caché del dashboard y ETag), que cuesta casi lo mismo que uno en vivo
+    """
+    hilos = int(os.environ.get('WEB_THREADS', 64))
+    tope = max(1, hilos // 2)
+    pedido = int(os.environ.get('SSE_MAX_CLIENTES', max(1, hilos // 4)))
+    if pedido > tope:
+        print(f"⚠️ SSE_MAX_CLIENTES={pedido} dejaría sin hilos al resto de las rutas "
+              f"(WEB_THREADS={hilos}); se usan {tope}")
+        return tope
+    return pedido
+
+
+def crear_difusor(leer_version, leer_contadores):
+    """Difusor configurado por variables de entorno"""
+    return Difusor(
+        leer_version,
+        leer_contadores,
+        intervalo=float(os.environ.get('SSE_INTERVALO', 1)),
+        latido=float(os.environ.get('SSE_LATIDO', 15)),
+        buffer=int(os.environ.get('SSE_BUFFER', 32)),
+        max_suscriptores=_max_clientes(),
+        duracion_max=float(os.environ.get('SSE_DURACION_MAX', 300)),
+    )
@@ -0,0 +1,122 @@
+"""
+Sentencias para escribir encuestas (usuario + respuestas)
+Compartidas por app.py (psycopg2/sqlite3) y app_async.py (asyncpg/aiosqlite):
+el SQL usa los marcadores DB-API de cada dialecto (%s y ?).
+"""
+import io
+
+import estadisticas
+
+# SQLite: un INSERT por usuario (lastrowid) y las respuestas en un executemany
+INSERTAR_USUARIO_SQLITE = """
+    INSERT INTO users (nombre, email, edad, sexo, puntaje_total, clasificacion, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+INSERTAR_RESPUESTAS_SQLITE = """
+    INSERT INTO responses (user_id, pregunta_id, respuesta, puntaje, timestamp)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+# PostgreSQL, un envío: el INSERT del usuario alimenta vía CTE el INSERT
+# multi-fila de las respuestas (un solo viaje, devuelve el id)
+INSERTAR_ENCUESTA_POSTGRES = """
+    WITH nuevo AS (
+        INSERT INTO users (nombre, email, edad, sexo, puntaje_total, clasificacion, timestamp)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        RETURNING id
+    ), insertadas AS (
+        INSERT INTO responses (user_id, pregunta_id, respuesta, puntaje, timestamp)
+        SELECT nuevo.id, r.pregunta_id, r.respuesta, r.puntaje, %s
+        FROM nuevo, unnest(%s::int[], %s::int[], %s::int[]) AS r (pregunta_id, respuesta, puntaje)
+    )
+    SELECT id FROM nuevo
+"""
+
+# PostgreSQL, un envío con sus contadores: un solo viaje y atómico sin BEGIN/COMMIT
+INSERTAR_ENCUESTA_CON_CONTADORES_POSTGRES = (
+    INSERTAR_ENCUESTA_POSTGRES.replace("SELECT id FROM nuevo", "").rstrip() + ","
+    + estadisticas.CTES_REGISTRO_POSTGRES + "    SELECT id FROM nuevo\n"
+)
+
+# PostgreSQL, lote: ids reservados de la secuencia y todo en una sola sentencia,
+# columnas como arreglos (unnest) en vez de formatear fila por fila
+RESERVAR_IDS_POSTGRES = "SELECT nextval(pg_get_serial_sequence('users', 'id')) FROM generate_series(1, %s)"
+
+INSERTAR_LOTE_POSTGRES = """
+    WITH nuevos AS (
+        INSERT INTO users (id, nombre, email, edad, sexo, puntaje_total, clasificacion, timestamp)
+        SELECT * FROM unnest(%s::int[], %s::text[], %s::text[], %s::int[], %s::text[],
+                             %s::int[], %s::text[], %s::timestamp[])
+    )
+    INSERT INTO responses (user_id, pregunta_id, respuesta, puntaje, timestamp)
+    SELECT * FROM unnest(%s::int[], %s::int[], %s::int[], %s::int[], %s::timestamp[])
+"""
+
+# Importación masiva: ids explícitos (reservados con el bloqueo de escritura en
+# SQLite, de la secuencia en PostgreSQL) y COPY en formato texto
+INSERTAR_USUARIO_CON_ID_SQLITE = """
+    INSERT INTO users (id, nombre, email, edad, sexo, puntaje_total, clasificacion, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+COPIAR_USUARIOS_POSTGRES = (
+    "COPY users (id, nombre, email, edad, sexo, puntaje_total, clasificacion, timestamp) FROM STDIN"
+)
+
+COPIAR_RESPUESTAS_POSTGRES = "COPY responses (user_id, pregunta_id, respuesta, puntaje, timestamp) FROM STDIN"
+
+
+def parametros_usuario(envio):
+    return envio.usuario + (envio.puntaje_total, envio.clasificacion, envio.timestamp)
+
+
+def filas_respuestas(user_id, envio):
+    return [(user_id, question_id, option_id, puntaje, envio.timestamp)
+            for question_id, option_id, puntaje in envio.respuestas]
+
+
+def parametros_encuesta_postgres(envio):
+    return parametros_usuario(envio) + (envio.timestamp,
+                                        [r[0] for r in envio.respuestas],
+                                        [r[1] for r in envio.respuestas],
+                                        [r[2] for r in envio.respuestas])
+
+
+def parametros_encuesta_con_contadores_postgres(envio):
+    return parametros_encuesta_postgres(envio) + estadisticas.parametros_registro_postgres([envio])
+
+
+def parametros_lote_postgres(user_ids, envios):
+    respuestas = [fila for user_id, envio in zip(user_ids, envios) for fila in filas_respuestas(user_id, envio)]
+    return ([user_ids] +
+            [[envio.usuario[i] for envio in envios] for i in range(4)] +
+            [[envio.puntaje_total for envio in envios],
+             [envio.clasificacion for envio in envios],
+             [envio.timestamp for envio in envios]] +
+            [[fila[i] for fila in respuestas] for i in range(5)])
+
+
+def filas_usuarios(user_ids, envios):
+    return [(user_id,) + parametros_usuario(envio) for user_id, envio in zip(user_ids, envios)]
+
+
+_ESCAPES_COPY = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def _campo_copy(valor):
+    if valor is None:
+        return '\\N'
+    if isinstance(valor, str):
+        return valor.translate(_ESCAPES_COPY)
+    return str(valor)
+
+
+def texto_copy(filas):
+    """Filas en el formato de texto de COPY (tabuladores, \\N para NULL) listas para copy_expert"""
+    buffer = io.StringIO()
+    for fila in filas:
+        buffer.write('\t'.join(_campo_copy(valor) for valor in fila))
+        buffer.write('\n')
+    buffer.seek(0)
+    return buffer
@@ -0,0 +1,516 @@
+"""
+Tablas de contadores para el dashboard
+Se actualizan en la misma transacción que cada envío, así el dashboard lee
+O(opciones) filas sin importar cuántas encuestas existan.
+Los rollups por hora y por día (stats_hora, stats_dia) permiten filtrar por
+rango de fechas leyendo solo O(días x claves) filas.
+
+Uso por línea de comandos:
+    python estadisticas.py              # reconstruir desde users/responses
+    python estadisticas.py --verificar  # solo comparar contadores con los datos crudos
+"""
+import sys
+from collections import Counter
+from datetime import date, timedelta
+
+NOMBRE_ANONIMO = "Anónimo"
+
+# Clave de stats_totales que sube en cada transacción de envíos (ETag de /api/stats)
+CLAVE_VERSION = 'data_version'
+
+TABLAS = ('stats_opciones', 'stats_clasificacion', 'stats_sexo', 'stats_totales', 'stats_hora', 'stats_dia')
+
+# Rollups: (tabla, largo del prefijo del timestamp ISO que define el bucket)
+# 'YYYY-MM-DD HH' por hora, 'YYYY-MM-DD' por día
+PERIODOS = (('stats_hora', 13), ('stats_dia', 10))
+
+
+def crear_tablas(cur):
+    """Tablas de contadores (misma DDL en SQLite y PostgreSQL)"""
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS stats_opciones (
+            option_id INTEGER PRIMARY KEY,
+            total BIGINT NOT NULL DEFAULT 0
+        )
+    ''')
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS stats_clasificacion (
+            clasificacion TEXT PRIMARY KEY,
+            total BIGINT NOT NULL DEFAULT 0
+        )
+    ''')
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS stats_sexo (
+            sexo TEXT PRIMARY KEY,
+            total BIGINT NOT NULL DEFAULT 0
+        )
+    ''')
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS stats_totales (
+            clave TEXT PRIMARY KEY,
+            total BIGINT NOT NULL DEFAULT 0
+        )
+    ''')
+    # tipo: 't' totales, 's' sexo, 'c' clasificación, 'o' opción (clave = id como texto)
+    for tabla, largo in PERIODOS:
+        cur.execute(f'''
+            CREATE TABLE IF NOT EXISTS {tabla} (
+                bucket TEXT NOT NULL,
+                tipo TEXT NOT NULL,
+                clave TEXT NOT NULL,
+                total BIGINT NOT NULL DEFAULT 0,
+                PRIMARY KEY (bucket, tipo, clave)
+            )
+        ''')
+
+
+def tablas_vacias(cur):
+    """True si hay que reconstruir: sin contadores, o con encuestas pero sin rollups"""
+    cur.execute("SELECT COUNT(*) FROM stats_totales")
+    if cur.fetchone()[0] == 0:
+        return True
+    cur.execute("SELECT total FROM stats_totales WHERE clave = 'encuestas'")
+    fila = cur.fetchone()
+    cur.execute("SELECT COUNT(*) FROM stats_dia")
+    return bool(fila and fila[0]) and cur.fetchone()[0] == 0
+
+
+def _agregar(envios):
+    opciones = Counter()
+    clasificaciones = Counter()
+    sexos = Counter()
+    for envio in envios:
+        for question_id, option_id, puntaje in envio.respuestas:
+            opciones[option_id] += 1
+        clasificaciones[envio.clasificacion] += 1
+        sexos[envio.usuario[3]] += 1
+    totales = {
+        'encuestas': len(envios),
+        'anonimas': sum(1 for envio in envios if envio.usuario[0] == NOMBRE_ANONIMO),
+        CLAVE_VERSION: 1,
+    }
+    # Orden estable de claves para que transacciones concurrentes no se bloqueen mutuamente
+    return (sorted(opciones.items()), sorted(clasificaciones.items()),
+            sorted(sexos.items()), sorted(totales.items()))
+
+
+def _agregar_periodos(envios):
+    """{tabla: [((bucket, tipo, clave), total)]} con las mismas cifras por hora y por día"""
+    # Una pasada por el periodo más fino; los más gruesos se suman desde ese conteo
+    (fino, largo_fino), *gruesos = sorted(PERIODOS, key=lambda periodo: -periodo[1])
+    claves = []
+    for envio in envios:
+        bucket = envio.timestamp.isoformat(sep=' ')[:largo_fino]
+        claves.append((bucket, 't', 'encuestas'))
+        if envio.usuario[0] == NOMBRE_ANONIMO:
+            claves.append((bucket, 't', 'anonimas'))
+        claves.append((bucket, 's', envio.usuario[3]))
+        claves.append((bucket, 'c', envio.clasificacion))
+        claves.extend([(bucket, 'o', str(option_id)) for question_id, option_id, puntaje in envio.respuestas])
+    conteo = Counter(claves)
+    periodos = {fino: sorted(conteo.items())}
+    for tabla, largo in gruesos:
+        grueso = Counter()
+        for (bucket, tipo, clave), total in conteo.items():
+            grueso[(bucket[:largo], tipo, clave)] += total
+        periodos[tabla] = sorted(grueso.items())
+    return periodos
+
+
+# PostgreSQL: los upserts de contadores y rollups como CTEs, para ejecutarlos en una
+# sola sentencia (solos o junto con el INSERT de la encuesta, ver escritura.py)
+CTES_REGISTRO_POSTGRES = """
+    o AS (
+        INSERT INTO stats_opciones (option_id, total)
+        SELECT * FROM unnest(%s::int[], %s::bigint[])
+        ON CONFLICT (option_id) DO UPDATE SET total = stats_opciones.total + excluded.total
+    ), c AS (
+        INSERT INTO stats_clasificacion (clasificacion, total)
+        SELECT * FROM unnest(%s::text[], %s::bigint[])
+        ON CONFLICT (clasificacion) DO UPDATE SET total = stats_clasificacion.total + excluded.total
+    ), s AS (
+        INSERT INTO stats_sexo (sexo, total)
+        SELECT * FROM unnest(%s::text[], %s::bigint[])
+        ON CONFLICT (sexo) DO UPDATE SET total = stats_sexo.total + excluded.total
+    ), h AS (
+        INSERT INTO stats_hora (bucket, tipo, clave, total)
+        SELECT * FROM unnest(%s::text[], %s::text[], %s::text[], %s::bigint[])
+        ON CONFLICT (bucket, tipo, clave) DO UPDATE SET total = stats_hora.total + excluded.total
+    ), d AS (
+        INSERT INTO stats_dia (bucket, tipo, clave, total)
+        SELECT * FROM unnest(%s::text[], %s::text[], %s::text[], %s::bigint[])
+        ON CONFLICT (bucket, tipo, clave) DO UPDATE SET total = stats_dia.total + excluded.total
+    ), t AS (
+        INSERT INTO stats_totales (clave, total)
+        SELECT * FROM unnest(%s::text[], %s::bigint[])
+        ON CONFLICT (clave) DO UPDATE SET total = stats_totales.total + excluded.total
+    )
+"""
+
+REGISTRO_POSTGRES = "WITH" + CTES_REGISTRO_POSTGRES + "SELECT 1"
+
+
+def parametros_registro_postgres(envios):
+    """Parámetros de CTES_REGISTRO_POSTGRES (arreglos para unnest)"""
+    opciones, clasificaciones, sexos, totales = _agregar(envios)
+    periodos = _agregar_periodos(envios)
+    hora = periodos['stats_hora']
+    dia = periodos['stats_dia']
+    return (
+        [k for k, v in opciones], [v for k, v in opciones],
+        [k for k, v in clasificaciones], [v for k, v in clasificaciones],
+        [k for k, v in sexos], [v for k, v in sexos],
+        [k[0] for k, v in hora], [k[1] for k, v in hora], [k[2] for k, v in hora], [v for k, v in hora],
+        [k[0] for k, v in dia], [k[1] for k, v in dia], [k[2] for k, v in dia], [v for k, v in dia],
+        [k for k, v in totales], [v for k, v in totales],
+    )
+
+
+# SQLite: un upsert por tabla con texto constante (la caché de sentencias lo reutiliza)
+UPSERTS_SQLITE = {
+    tabla: f"""
+        INSERT INTO {tabla} ({columna}, total) VALUES (?, ?)
+        ON CONFLICT ({columna}) DO UPDATE SET total = {tabla}.total + excluded.total
+    """
+    for tabla, columna in (('stats_opciones', 'option_id'), ('stats_clasificacion', 'clasificacion'),
+                           ('stats_sexo', 'sexo'), ('stats_totales', 'clave'))
+}
+UPSERTS_SQLITE.update({
+    tabla: f"""
+        INSERT INTO {tabla} (bucket, tipo, clave, total) VALUES (?, ?, ?, ?)
+        ON CONFLICT (bucket, tipo, clave) DO UPDATE SET total = {tabla}.total + excluded.total
+    """
+    for tabla, largo in PERIODOS
+})
+
+
+def sentencias_registro(envios, use_sqlite):
+    """
+    Upserts que suman los envíos a los contadores: [(tabla, sql, [parámetros, ...])],
+    cada sentencia se ejecuta una vez por juego de parámetros (executemany)
+    """
+    if not use_sqlite:
+        return [('stats', REGISTRO_POSTGRES, [parametros_registro_postgres(envios)])]
+
+    opciones, clasificaciones, sexos, totales = _agregar(envios)
+    sentencias = [(tabla, UPSERTS_SQLITE[tabla], filas)
+                  for tabla, filas in (('stats_opciones', opciones),
+                                       ('stats_clasificacion', clasificaciones),
+                                       ('stats_sexo', sexos),
+                                       ('stats_totales', totales))]
+    for tabla, filas in _agregar_periodos(envios).items():
+        sentencias.append((tabla, UPSERTS_SQLITE[tabla], [clave + (total,) for clave, total in filas]))
+    return sentencias
+
+
+# Todas las cifras del dashboard en una sola sentencia: una foto consistente y un
+# solo viaje a la base. tipo: 't' totales, 's' sexo, 'c' clasificación, 'o' opción.
+# grupo = suma del bloque (por pregunta en las opciones) para los porcentajes
+CONSULTA_DASHBOARD = """
+    SELECT tipo, clave, pregunta_id, pregunta, orden, total,
+           CAST(SUM(total) OVER (PARTITION BY tipo, pregunta_id) AS BIGINT) AS grupo
+    FROM (
+        SELECT 't' AS tipo, clave, CAST(NULL AS INTEGER) AS pregunta_id,
+               CAST(NULL AS TEXT) AS pregunta, CAST(NULL AS INTEGER) AS orden, total
+        FROM stats_totales
+        UNION ALL
+        SELECT 's', sexo, NULL, NULL, NULL, total FROM stats_sexo WHERE total > 0
+        UNION ALL
+        SELECT 'c', clasificacion, NULL, NULL, NULL, total FROM stats_clasificacion WHERE total > 0
+        UNION ALL
+        SELECT 'o', o.texto, q.id, q.texto, o.id, COALESCE(s.total, 0)
+        FROM questions q
+        LEFT JOIN options o ON q.id = o.pregunta_id
+        LEFT JOIN stats_opciones s ON o.id = s.option_id
+    ) cifras
+    ORDER BY tipo, pregunta_id, orden, clave
+"""
+
+
+# Mismas columnas que CONSULTA_DASHBOARD pero sumando los buckets diarios del rango
+CONSULTA_DASHBOARD_PERIODO = """
+    SELECT tipo, clave, pregunta_id, pregunta, orden, total,
+           CAST(SUM(total) OVER (PARTITION BY tipo, pregunta_id) AS BIGINT) AS grupo
+    FROM (
+        SELECT tipo, clave, CAST(NULL AS INTEGER) AS pregunta_id,
+               CAST(NULL AS TEXT) AS pregunta, CAST(NULL AS INTEGER) AS orden,
+               CAST(SUM(total) AS BIGINT) AS total
+        FROM stats_dia
+        WHERE bucket >= {p} AND bucket <= {p} AND tipo IN ('t', 's', 'c')
+        GROUP BY tipo, clave
+        UNION ALL
+        SELECT 'o', o.texto, q.id, q.texto, o.id, COALESCE(s.total, 0)
+        FROM questions q
+        LEFT JOIN options o ON q.id = o.pregunta_id
+        LEFT JOIN (SELECT clave, CAST(SUM(total) AS BIGINT) AS total
+                   FROM stats_dia
+                   WHERE bucket >= {p} AND bucket <= {p} AND tipo = 'o'
+                   GROUP BY clave) s ON s.clave = CAST(o.id AS TEXT)
+        UNION ALL
+        SELECT 't', clave, NULL, NULL, NULL, total FROM stats_totales WHERE clave = '""" + CLAVE_VERSION + """'
+    ) cifras
+    ORDER BY tipo, pregunta_id, orden, clave
+"""
+
+
+def _porcentaje(count, total):
+    return round((count / total * 100), 1) if total > 0 else 0
+
+
+def consulta_dashboard(desde=None, hasta=None, use_sqlite=True):
+    """(sql, parámetros) de las cifras del dashboard; con rango, desde los rollups diarios"""
+    if desde is None and hasta is None:
+        return CONSULTA_DASHBOARD, ()
+    desde = (desde or date.min).isoformat()
+    hasta = (hasta or date.max).isoformat()
+    return (CONSULTA_DASHBOARD_PERIODO.format(p='?' if use_sqlite else '%s'),
+            (desde, hasta, desde, hasta))
+
+
+def contexto_dashboard(filas):
+    """Armar el contexto del dashboard con las filas de consulta_dashboard()"""
+    totales = {}
+    gender_stats = []
+    classification_stats = []
+    questions_data = {}
+    for tipo, clave, q_id, pregunta, option_id, count, grupo in filas:
+        if tipo == 'o':
+            q_data = questions_data.get(q_id)
+            if q_data is None:
+                q_data = questions_data[q_id] = {
+                    'pregunta': pregunta,
+                    'opciones': [],
+                    'total_responses': grupo
+                }
+            if clave is not None:
+                q_data['opciones'].append({
+                    'id': option_id,
+                    'opcion': clave,
+                    'count': count,
+                    'percentage': _porcentaje(count, grupo)
+                })
+        elif tipo == 's':
+            # Estadísticas por género CON PORCENTAJES
+            gender_stats.append({'sexo': clave, 'count': count, 'percentage': _porcentaje(count, grupo)})
+        elif tipo == 'c':
+            # Estadísticas de CLASIFICACIÓN
+            classification_stats.append({'clasificacion': clave, 'count': count,
+                                         'percentage': _porcentaje(count, grupo)})
+        else:
+            totales[clave] = count
+
+    total_surveys = totales.get('encuestas', 0)
+    return {
+        'data_version': totales.get(CLAVE_VERSION, 0),
+        'total_surveys': total_surveys,
+        'gender_stats': gender_stats,
+        'anonymous_count': totales.get('anonimas', 0),
+        'anonymous_percentage': _porcentaje(totales.get('anonimas', 0), total_surveys),
+        'classification_stats': classification_stats,
+        'questions_data': questions_data,
+    }
+
+
+def a_json(contexto, desde=None, hasta=None):
+    """Las cifras del dashboard como JSON compacto (preguntas en lista, en orden)"""
+    return {
+        'data_version': contexto.get('data_version', 0),
+        'desde': desde.isoformat() if desde else None,
+        'hasta': hasta.isoformat() if hasta else None,
+        'total_surveys': contexto['total_surveys'],
+        'anonymous_count': contexto.get('anonymous_count', 0),
+        'anonymous_percentage': contexto['anonymous_percentage'],
+        'gender_stats': contexto['gender_stats'],
+        'classification_stats': contexto['classification_stats'],
+        'questions': [dict(q_data, id=q_id) for q_id, q_data in contexto['questions_data'].items()],
+    }
+
+
+# Rangos más largos que esto se grafican por día aunque se pida por hora
+MAX_DIAS_POR_HORA = 31
+# Tope de una serie: un punto por día, así que acota el JSON y lo que guarda la caché
+MAX_DIAS_SERIE = 400
+
+
+class RangoInvalido(ValueError):
+    """El rango pedido para una serie supera MAX_DIAS_SERIE días"""
+
+
+def rango_series(desde, hasta):
+    """
+    (desde, hasta) de una serie: por defecto los últimos 30 días, en orden y de a
+    lo sumo MAX_DIAS_SERIE días (más lanza RangoInvalido)
+    """
+    hasta = hasta or date.today()
+    desde = desde or hasta - timedelta(days=29)
+    if desde > hasta:
+        desde, hasta = hasta, desde
+    if (hasta - desde).days + 1 > MAX_DIAS_SERIE:
+        raise RangoInvalido(f"El rango no puede superar {MAX_DIAS_SERIE} días")
+    return desde, hasta
+
+
+def granularidad_series(granularidad):
+    """'hora', 'dia' o None (automática): cualquier otro valor cuenta como None"""
+    return granularidad if granularidad in ('hora', 'dia') else None
+
+
+def consulta_series(desde, hasta, granularidad=None, use_sqlite=True):
+    """
+    (sql, parámetros, serie vacía) del volumen de envíos y la mezcla de riesgo por bucket
+    entre dos fechas (inclusivas); armar_series() completa la serie con las filas
+    """
+    dias = (hasta - desde).days + 1
+    if not 0 < dias <= MAX_DIAS_SERIE:
+        raise RangoInvalido(f"El rango no puede superar {MAX_DIAS_SERIE} días")
+    if granularidad not in ('hora', 'dia'):
+        granularidad = 'hora' if dias <= 2 else 'dia'
+    if granularidad == 'hora' and dias > MAX_DIAS_POR_HORA:
+        granularidad = 'dia'
+
+    if granularidad == 'hora':
+        tabla, inicio, fin = 'stats_hora', f"{desde.isoformat()} 00", f"{hasta.isoformat()} 23"
+        buckets = [f"{(desde + timedelta(hours=h // 24)).isoformat()} {h % 24:02d}" for h in range(dias * 24)]
+    else:
+        tabla, inicio, fin = 'stats_dia', desde.isoformat(), hasta.isoformat()
+        buckets = [(desde + timedelta(days=d)).isoformat() for d in range(dias)]
+
+    p = '?' if use_sqlite else '%s'
+    sql = f"""
+        SELECT bucket, tipo, clave, total FROM {tabla}
+        WHERE bucket >= {p} AND bucket <= {p} AND (tipo = 'c' OR (tipo = 't' AND clave = 'encuestas'))
+        ORDER BY bucket
+    """
+    serie = {
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'granularidad': granularidad,
+        'puntos': [{'bucket': bucket, 'encuestas': 0, 'clasificacion': {}} for bucket in buckets],
+    }
+    return sql, (inicio, fin), serie
+
+
+def armar_series(serie, filas):
+    """Completar los puntos de la serie (los buckets sin envíos quedan en cero)"""
+    puntos = {punto['bucket']: punto for punto in serie['puntos']}
+    for bucket, tipo, clave, total in filas:
+        punto = puntos.get(bucket)
+        if punto is None:
+            continue
+        if tipo == 't':
+            punto['encuestas'] = total
+        else:
+            punto['clasificacion'][clave] = total
+    return serie
+
+
+# Agregados calculados desde los datos crudos: (tabla, columna clave, consulta)
+CONSULTAS_CRUDAS = (
+    ('stats_opciones', 'option_id',
+     "SELECT respuesta, COUNT(*) FROM responses WHERE respuesta IS NOT NULL GROUP BY respuesta"),
+    ('stats_clasificacion', 'clasificacion',
+     "SELECT clasificacion, COUNT(*) FROM users GROUP BY clasificacion"),
+    ('stats_sexo', 'sexo',
+     "SELECT sexo, COUNT(*) FROM users GROUP BY sexo"),
+    ('stats_totales', 'clave',
+     f"SELECT 'encuestas', COUNT(*) FROM users "
+     f"UNION ALL SELECT 'anonimas', COUNT(*) FROM users WHERE nombre = '{NOMBRE_ANONIMO}'"),
+)
+
+
+def _consulta_periodo(largo):
+    # CAST(timestamp AS TEXT) da 'YYYY-MM-DD HH:MM:SS...' en ambos dialectos
+    bucket = f"substr(CAST(timestamp AS TEXT), 1, {largo})"
+    return (
+        f"SELECT {bucket}, 't', 'encuestas', COUNT(*) FROM users GROUP BY {bucket} "
+        f"UNION ALL SELECT {bucket}, 't', 'anonimas', COUNT(*) FROM users "
+        f"WHERE nombre = '{NOMBRE_ANONIMO}' GROUP BY {bucket} "
+        f"UNION ALL SELECT {bucket}, 's', sexo, COUNT(*) FROM users GROUP BY {bucket}, sexo "
+        f"UNION ALL SELECT {bucket}, 'c', clasificacion, COUNT(*) FROM users GROUP BY {bucket}, clasificacion "
+        f"UNION ALL SELECT {bucket}, 'o', CAST(respuesta AS TEXT), COUNT(*) FROM responses "
+        f"WHERE respuesta IS NOT NULL GROUP BY {bucket}, respuesta"
+    )
+
+
+# Rollups desde los datos crudos (recorren las tablas completas: solo para reconstruir/verificar)
+CONSULTAS_PERIODOS = tuple(
+    (tabla, 'bucket, tipo, clave', _consulta_periodo(largo)) for tabla, largo in PERIODOS
+)
+
+
+# Contadores crudos en una sentencia, para calcular deltas (armar_contadores)
+CONSULTA_CONTADORES = f"""
+    SELECT 't', clave, total FROM stats_totales WHERE clave <> '{CLAVE_VERSION}'
+    UNION ALL SELECT 'o', CAST(option_id AS TEXT), total FROM stats_opciones
+    UNION ALL SELECT 'c', clasificacion, total FROM stats_clasificacion
+    UNION ALL SELECT 's', sexo, total FROM stats_sexo
+"""
+
+
+def armar_contadores(filas):
+    """{'totales': {clave: n}, 'opciones': {option_id: n}, 'clasificacion': {...}, 'sexo': {...}}"""
+    contadores = {'totales': {}, 'opciones': {}, 'clasificacion': {}, 'sexo': {}}
+    grupos = {'t': 'totales', 'o': 'opciones', 'c': 'clasificacion', 's': 'sexo'}
+    for tipo, clave, total in filas:
+        contadores[grupos[tipo]][clave] = total
+    return contadores
+
+
+# Versión actual de los datos (una búsqueda por clave primaria)
+CONSULTA_VERSION = f"SELECT total FROM stats_totales WHERE clave = '{CLAVE_VERSION}'"
+
+
+def reconstruir(cur):
+    """Recalcular todos los contadores desde users/responses (dentro de la transacción del llamador)"""
+    for tabla, columnas, consulta in CONSULTAS_CRUDAS + CONSULTAS_PERIODOS:
+        # La versión de datos nunca retrocede: se conserva y se incrementa
+        condicion = f" WHERE clave <> '{CLAVE_VERSION}'" if tabla == 'stats_totales' else ''
+        cur.execute(f"DELETE FROM {tabla}{condicion}")
+        cur.execute(f"INSERT INTO {tabla} ({columnas}, total) {consulta}")
+    cur.execute(f"""
+        INSERT INTO stats_totales (clave, total) VALUES ('{CLAVE_VERSION}', 1)
+        ON CONFLICT (clave) DO UPDATE SET total = stats_totales.total + 1
+    """)
+
+
+def verificar(cur):
+    """Comparar contadores con los datos crudos; devuelve la lista de diferencias"""
+    diferencias = []
+    for tabla, columnas, consulta in CONSULTAS_CRUDAS + CONSULTAS_PERIODOS:
+        cur.execute(consulta)
+        esperado = {tuple(row[:-1]): row[-1] for row in cur.fetchall() if row[-1]}
+        cur.execute(f"SELECT {columnas}, total FROM {tabla}")
+        actual = {tuple(row[:-1]): row[-1] for row in cur.fetchall()
+                  if row[-1] and row[0] != CLAVE_VERSION}
+        for clave in sorted(set(esperado) | set(actual), key=str):
+            if esperado.get(clave, 0) != actual.get(clave, 0):
+                diferencias.append((tabla, '/'.join(map(str, clave)), esperado.get(clave, 0), actual.get(clave, 0)))
+    return diferencias
+
+
+def main(argv):
+    from app import get_db_connection
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        if '--verificar' not in argv:
+            print("🔄 Reconstruyendo contadores desde los datos crudos...")
+            reconstruir(cur)
+            conn.commit()
+
+        diferencias = verificar(cur)
+        conn.rollback()
+        if diferencias:
+            for tabla, clave, esperado, actual in diferencias:
+                print(f"❌ {tabla}[{clave}]: esperado {esperado}, contador {actual}")
+            return 1
+        print("✅ Contadores consistentes con users/responses")
+        return 0
+    finally:
+        cur.close()
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,162 @@
+"""
+Archivos estáticos con huella de contenido y precomprimidos (/assets/...)
+Al iniciar se lee cada archivo de static/, se calcula su hash y se comprime una
+sola vez (gzip y brotli; brotli está en requirements.txt y sin él queda solo gzip).
+Las plantillas usan asset_url() para obtener la URL con huella
+(style.3f2a9c1b7d4e.css), que se sirve con Cache-Control inmutable: un cambio de
+contenido genera otra URL.
+
+Uso por línea de comandos:
+    python estaticos.py   # lista URLs, tamaños y compresión de cada archivo
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import sys
+import threading
+
+from flask import Response, abort, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DIRECTORIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+PREFIJO = '/assets'
+UN_ANIO = 365 * 24 * 3600
+
+# Por debajo de este tamaño la compresión no compensa los encabezados
+TAM_MINIMO = 512
+
+
+class _Archivo:
+    __slots__ = ('ruta', 'mtime', 'huella', 'nombre_huella', 'mimetype', 'variantes')
+
+    def __init__(self, directorio, nombre):
+        self.ruta = os.path.join(directorio, nombre)
+        self.mtime = os.path.getmtime(self.ruta)
+        with open(self.ruta, 'rb') as f:
+            contenido = f.read()
+        self.huella = hashlib.sha256(contenido).hexdigest()[:12]
+        base, extension = os.path.splitext(nombre)
+        self.nombre_huella = f"{base}.{self.huella}{extension}"
+        self.mimetype = mimetypes.guess_type(nombre)[0] or 'application/octet-stream'
+        # Codificación -> bytes; solo se guardan las variantes que realmente achican
+        self.variantes = {None: contenido}
+        if len(contenido) >= TAM_MINIMO:
+            comprimidas = {'gzip': gzip.compress(contenido, 9, mtime=0)}
+            if brotli is not None:
+                comprimidas['br'] = brotli.compress(contenido, quality=11)
+            for codificacion, datos in comprimidas.items():
+                if len(datos) < len(contenido):
+                    self.variantes[codificacion] = datos
+
+
+class Estaticos:
+    def __init__(self, directorio=DIRECTORIO, vigilar=None):
+        self.directorio = directorio
+        # Función que indica si hay que revisar cambios (modo debug de la app)
+        self.vigilar = vigilar
+        self._lock = threading.Lock()
+        self._archivos = {}
+        self._por_huella = {}
+        self._stats = {'servidos': 0, 'br': 0, 'gzip': 0, 'sin_comprimir': 0, 'no_modificados': 0}
+        self.cargar()
+
+    def cargar(self):
+        """Leer, hashear y comprimir todos los archivos de static/"""
+        archivos = {}
+        for raiz, _, nombres in os.walk(self.directorio):
+            for nombre in nombres:
+                relativo = os.path.relpath(os.path.join(raiz, nombre), self.directorio).replace(os.sep, '/')
+                archivos[relativo] = _Archivo(self.directorio, relativo)
+        with self._lock:
+            self._archivos = archivos
+            self._por_huella = {a.nombre_huella: a for a in archivos.values()}
+        return archivos
+
+    def _archivo(self, nombre):
+        archivo = self._archivos.get(nombre)
+        # En modo debug se revisa la fecha de modificación para no servir una huella vieja
+        if (archivo is not None and self.vigilar is not None and self.vigilar()
+                and os.path.getmtime(archivo.ruta) != archivo.mtime):
+            self.cargar()
+            archivo = self._archivos.get(nombre)
+        return archivo
+
+    def url(self, nombre):
+        """URL con huella; si el archivo no estaba al iniciar, la URL normal de /static"""
+        archivo = self._archivo(nombre)
+        if archivo is None:
+            return f"/static/{nombre}"
+        return f"{PREFIJO}/{archivo.nombre_huella}"
+
+    def variante(self, nombre_huella, aceptadas):
+        """(archivo, codificación) a servir, o (None, None) si la huella no existe"""
+        archivo = self._por_huella.get(nombre_huella)
+        if archivo is None:
+            return None, None
+        # La mejor variante precomprimida que el cliente acepta (brotli antes que gzip)
+        for codificacion in ('br', 'gzip'):
+            if codificacion in archivo.variantes and aceptadas[codificacion] > 0:
+                return archivo, codificacion
+        return archivo, None
+
+    def preparar(self, response, archivo, codificacion):
+        """Encabezados de una variante (sirve para respuestas Flask y Quart)"""
+        if codificacion is not None:
+            response.headers['Content-Encoding'] = codificacion
+        response.vary.add('Accept-Encoding')
+        response.set_etag(f"{archivo.huella}-{codificacion or 'identity'}")
+        response.cache_control.public = True
+        response.cache_control.max_age = UN_ANIO
+        response.cache_control.immutable = True
+
+    def contar(self, response, codificacion):
+        with self._lock:
+            self._stats['servidos'] += 1
+            if response.status_code == 304:
+                self._stats['no_modificados'] += 1
+            else:
+                self._stats[codificacion or 'sin_comprimir'] += 1
+        return response
+
+    def servir(self, nombre_huella):
+        archivo, codificacion = self.variante(nombre_huella, request.accept_encodings)
+        if archivo is None:
+            abort(404)
+        response = Response(archivo.variantes[codificacion], mimetype=archivo.mimetype)
+        self.preparar(response, archivo, codificacion)
+        return self.contar(response.make_conditional(request), codificacion)
+
+    def estadisticas(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['archivos'] = {nombre: {'url': f"{PREFIJO}/{a.nombre_huella}",
+                                      'bytes': {c or 'identity': len(d) for c, d in a.variantes.items()}}
+                             for nombre, a in self._archivos.items()}
+        stats['brotli'] = brotli is not None
+        return stats
+
+
+def registrar(app, directorio=DIRECTORIO):
+    """Ruta /assets/<archivo con huella> y asset_url() en las plantillas"""
+    estaticos = Estaticos(directorio, vigilar=lambda: app.debug)
+    app.add_url_rule(f"{PREFIJO}/<path:nombre_huella>", 'assets', estaticos.servir)
+    app.jinja_env.globals['asset_url'] = estaticos.url
+    return estaticos
+
+
+def main():
+    estaticos = Estaticos()
+    print(f"📦 {len(estaticos._archivos)} archivos (brotli {'disponible' if brotli else 'no instalado'})")
+    for nombre, info in sorted(estaticos.estadisticas()['archivos'].items()):
+        tamanos = ', '.join(f"{c} {b} B" for c, b in info['bytes'].items())
+        print(f"   {nombre} -> {info['url']} ({tamanos})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
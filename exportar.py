@@ -0,0 +1,206 @@
+"""
+Exportación en streaming de encuestas (usuarios + respuestas) en CSV o NDJSON
+con memoria constante: cursor con nombre en PostgreSQL, páginas por id en SQLite
+
+Uso por línea de comandos:
+    python exportar.py [--formato csv|ndjson] [--desde 2025-01-01] [--hasta 2025-02-01]
+                       [--clasificacion Grave] [--gzip] > encuestas.csv
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import sys
+import zlib
+from datetime import datetime
+
+COLUMNAS = ('id', 'nombre', 'email', 'edad', 'sexo', 'puntaje_total', 'clasificacion', 'timestamp')
+
+TAM_PAGINA = 1000
+TAM_BLOQUE = 64 * 1024
+
+
+class FiltroInvalido(ValueError):
+    """Parámetros de exportación con formato incorrecto"""
+
+
+def leer_filtros(desde=None, hasta=None, clasificacion=None):
+    """Validar filtros; las fechas aceptan formato ISO (2025-01-31 o 2025-01-31T12:00)"""
+    filtros = {}
+    for nombre, valor in (('desde', desde), ('hasta', hasta)):
+        if valor:
+            try:
+                filtros[nombre] = datetime.fromisoformat(valor)
+            except ValueError:
+                raise FiltroInvalido(f"Fecha inválida en '{nombre}': {valor}")
+    if clasificacion:
+        filtros['clasificacion'] = clasificacion
+    return filtros
+
+
+def _condiciones(filtros, placeholder, use_sqlite):
+    condiciones = []
+    params = []
+    for nombre, operador in (('desde', '>='), ('hasta', '<')):
+        if nombre in filtros:
+            condiciones.append(f"timestamp {operador} {placeholder}")
+            valor = filtros[nombre]
+            # SQLite guarda los timestamps como texto ISO: comparar como texto
+            params.append(valor.strftime('%Y-%m-%d %H:%M:%S') if use_sqlite else valor)
+    if 'clasificacion' in filtros:
+        condiciones.append(f"clasificacion = {placeholder}")
+        params.append(filtros['clasificacion'])
+    return condiciones, params
+
+
+def _filas_postgres(conn, filtros, itersize, desde_id):
+    condiciones, params = _condiciones(filtros, '%s', False)
+    if desde_id:
+        condiciones.append("id > %s")
+        params.append(desde_id)
+    where = ('WHERE ' + ' AND '.join(condiciones)) if condiciones else ''
+    # Cursor del lado del servidor: trae `itersize` filas por viaje
+    cur = conn.cursor(name='exportacion')
+    cur.itersize = itersize
+    try:
+        cur.execute(f"""
+            SELECT u.id, u.nombre, u.email, u.edad, u.sexo, u.puntaje_total, u.clasificacion,
+                   u.timestamp, r.pregunta_id, r.respuesta
+            FROM (SELECT * FROM users {where}) u
+            LEFT JOIN responses r ON r.user_id = u.id
+            ORDER BY u.id, r.pregunta_id
+        """, params)
+        for row in cur:
+            yield row
+    finally:
+        cur.close()
+        conn.rollback()
+
+
+def _filas_sqlite(conn, filtros, tam_pagina, desde_id):
+    condiciones, params = _condiciones(filtros, '?', True)
+    condiciones.append("id > ?")
+    # Páginas cortas por id: no se mantiene una transacción de lectura abierta
+    # durante toda la descarga, así los envíos no esperan al export
+    ultimo_id = desde_id
+    while True:
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT u.id, u.nombre, u.email, u.edad, u.sexo, u.puntaje_total, u.clasificacion,
+                   u.timestamp, r.pregunta_id, r.respuesta
+            FROM (SELECT * FROM users WHERE {' AND '.join(condiciones)} ORDER BY id LIMIT ?) u
+            LEFT JOIN responses r ON r.user_id = u.id
+            ORDER BY u.id, r.pregunta_id
+        """, params + [ultimo_id, tam_pagina])
+        filas = cur.fetchall()
+        cur.close()
+        conn.rollback()
+        if not filas:
+            return
+        for row in filas:
+            yield tuple(row)
+        ultimo_id = filas[-1][0]
+
+
+def iterar_encuestas(conn, use_sqlite, filtros, itersize=TAM_PAGINA, desde_id=0):
+    """Un dict por usuario (id > desde_id) con sus respuestas {pregunta_id: option_id}, en orden de id"""
+    if use_sqlite:
+        filas = _filas_sqlite(conn, filtros, itersize, desde_id)
+    else:
+        filas = _filas_postgres(conn, filtros, itersize, desde_id)
+    actual = None
+    for row in filas:
+        if actual is None or actual['id'] != row[0]:
+            if actual is not None:
+                yield actual
+            timestamp = row[7]
+            actual = dict(zip(COLUMNAS, row[:7]))
+            actual['timestamp'] = timestamp.isoformat(sep=' ') if isinstance(timestamp, datetime) else timestamp
+            actual['respuestas'] = {}
+        if row[8] is not None:
+            actual['respuestas'][row[8]] = row[9]
+    if actual is not None:
+        yield actual
+
+
+def _lineas_csv(encuestas, pregunta_ids):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(list(COLUMNAS) + [f'p{q_id}' for q_id in pregunta_ids])
+    yield buffer.getvalue()
+    for encuesta in encuestas:
+        buffer.seek(0)
+        buffer.truncate()
+        escritor.writerow([encuesta[c] for c in COLUMNAS] +
+                          [encuesta['respuestas'].get(q_id, '') for q_id in pregunta_ids])
+        yield buffer.getvalue()
+
+
+def _lineas_ndjson(encuestas):
+    for encuesta in encuestas:
+        yield json.dumps(encuesta, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+def generar(conn, use_sqlite, filtros, formato='csv', pregunta_ids=(), comprimir=False):
+    """Bloques de bytes (~64 KB) listos para una respuesta en streaming o un archivo"""
+    encuestas = iterar_encuestas(conn, use_sqlite, filtros)
+    lineas = _lineas_csv(encuestas, pregunta_ids) if formato == 'csv' else _lineas_ndjson(encuestas)
+    compresor = zlib.compressobj(6, zlib.DEFLATED, 31) if comprimir else None
+
+    bloque = []
+    tam = 0
+    for linea in lineas:
+        bloque.append(linea)
+        tam += len(linea)
+        if tam >= TAM_BLOQUE:
+            datos = ''.join(bloque).encode('utf-8')
+            bloque, tam = [], 0
+            if compresor is not None:
+                datos = compresor.compress(datos)
+            if datos:
+                yield datos
+    datos = ''.join(bloque).encode('utf-8')
+    if compresor is not None:
+        datos = compresor.compress(datos) + compresor.flush()
+    if datos:
+        yield datos
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Exportar encuestas en CSV o NDJSON')
+    parser.add_argument('--formato', choices=('csv', 'ndjson'), default='csv')
+    parser.add_argument('--desde')
+    parser.add_argument('--hasta')
+    parser.add_argument('--clasificacion')
+    parser.add_argument('--gzip', action='store_true')
+    args = parser.parse_args(argv)
+
+    # stdout lleva solo los bytes exportados: los avisos del resto del repo
+    # (migraciones, catálogo, consultas lentas) son print() y van a stderr
+    salida = sys.stdout.buffer
+    with contextlib.redirect_stdout(sys.stderr):
+        return _exportar(args, salida)
+
+
+def _exportar(args, salida):
+    from app import get_db_connection, USE_SQLITE, catalogo
+
+    try:
+        filtros = leer_filtros(args.desde, args.hasta, args.clasificacion)
+    except FiltroInvalido as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+
+    pregunta_ids = [q['id'] for q in catalogo.obtener().preguntas]
+    conn = get_db_connection()
+    try:
+        for datos in generar(conn, USE_SQLITE, filtros, args.formato, pregunta_ids, args.gzip):
+            salida.write(datos)
+    finally:
+        conn.close()
+    salida.flush()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,17 @@
+"""
+Configuración de gunicorn (se lee automáticamente al ejecutar `gunicorn app:app`,
+como hacen el Procfile y render.yaml)
+
+Modelo de despliegue: WEB_CONCURRENCY procesos (1 por defecto) con WEB_THREADS
+hilos cada uno (gthread, 64 por defecto). Antes el Procfile lanzaba un único worker
+síncrono; cada dashboard en vivo (/api/stats/stream) mantiene un hilo ocupado
+mientras está conectado y lo habría bloqueado. Los hilos de un worker se reparten
+entre las conexiones en vivo y el resto de las rutas, y comparten el pool de
+DB_POOL_MAX conexiones (ver "🚀 Deploy" en el README).
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_THREADS', 64))
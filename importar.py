@@ -0,0 +1,186 @@
+"""
+Importación masiva de encuestas en papel desde CSV
+
+Cada fila se valida y puntúa contra el catálogo en memoria (las mismas reglas
+que /api/submit-survey/batch) y las válidas se cargan por lotes: COPY FROM STDIN
+en PostgreSQL, executemany en una transacción en SQLite. Las filas inválidas se
+informan con su número de línea y no detienen la importación.
+
+Formato: encabezado y una fila por encuestado
+    nombre, email, edad, sexo   opcionales; sin nombre ni email (o con anonimo=1),
+                                la encuesta es anónima
+    timestamp o completed_at    opcional; por defecto, el momento de la importación
+    p<pregunta_id>              option_id elegido (vacío: pregunta sin responder)
+id, puntaje_total y clasificacion se ignoran (se recalculan), así que un CSV
+de exportar.py se importa tal cual.
+
+Uso por línea de comandos:
+    python importar.py encuestas.csv [--lote 5000] [--rechazos rechazos.csv] [--sin-revision-fk]
+"""
+import argparse
+import csv
+import re
+import sys
+import time
+
+from catalogo import RespuestaInvalida, preparar_envio
+
+TAM_LOTE = 5000
+# Rechazos que se devuelven con detalle (el conteo siempre es completo)
+MAX_RECHAZOS = 1000
+
+VALORES_SI = ('1', 'si', 'sí', 'true', 'x')
+
+
+class ArchivoInvalido(ValueError):
+    """El CSV no tiene el formato esperado (encabezado o columnas de preguntas)"""
+
+
+class ImportacionInterrumpida(Exception):
+    """Falló la escritura de un lote; `resultado` cuenta lo ya confirmado"""
+
+    def __init__(self, resultado, causa):
+        super().__init__(f"Importación interrumpida en la fila {resultado['filas']}: {causa}")
+        self.resultado = resultado
+
+
+def columnas_preguntas(encabezado, catalogo):
+    """[(columna, pregunta_id)] de las columnas p<id>; falla si alguna no está en el catálogo"""
+    if not encabezado:
+        raise ArchivoInvalido('El archivo está vacío o no tiene encabezado')
+    vigentes = {q['id'] for q in catalogo.preguntas}
+    columnas = []
+    for columna in encabezado:
+        m = re.fullmatch(r'p(\d+)', (columna or '').strip())
+        if m is None:
+            continue
+        if int(m.group(1)) not in vigentes:
+            raise ArchivoInvalido(f"La columna {columna} no corresponde a una pregunta vigente")
+        columnas.append((columna, int(m.group(1))))
+    if not columnas:
+        raise ArchivoInvalido('No hay columnas de respuestas (p<pregunta_id>)')
+    return columnas
+
+
+def _campo(fila, nombre):
+    return (fila.get(nombre) or '').strip()
+
+
+def encuesta_desde_fila(fila, columnas):
+    """Fila del CSV -> JSON de encuesta en el formato de /api/submit-survey/batch"""
+    if None in fila:
+        raise RespuestaInvalida('La fila tiene más columnas que el encabezado')
+    nombre, email = _campo(fila, 'nombre'), _campo(fila, 'email')
+    edad = _campo(fila, 'edad')
+    try:
+        edad = int(edad) if edad else 0
+    except ValueError:
+        raise RespuestaInvalida(f'Edad inválida: {edad}')
+    return {
+        'is_anonymous': _campo(fila, 'anonimo').lower() in VALORES_SI or not (nombre or email),
+        'nombre': nombre,
+        'email': email,
+        'edad': edad,
+        'sexo': _campo(fila, 'sexo'),
+        'completed_at': _campo(fila, 'completed_at') or _campo(fila, 'timestamp') or None,
+        'responses': {pregunta_id: valor for columna, pregunta_id in columnas
+                      if (valor := (fila[columna] or '').strip())},
+    }
+
+
+def importar(lineas, catalogo, repositorio, tam_lote=TAM_LOTE, progreso=None, max_rechazos=MAX_RECHAZOS,
+             revisar_fk=True):
+    """
+    Importar un CSV (iterable de líneas de texto). Devuelve
+    {'filas', 'importadas', 'rechazadas', 'rechazos': [{'fila', 'error'}], 'segundos'}
+    `progreso(resultado)` se llama después de cada lote confirmado; con
+    max_rechazos=None se guarda el detalle de todos los rechazos.
+    """
+    inicio = time.perf_counter()
+    resultado = {'filas': 0, 'importadas': 0, 'rechazadas': 0, 'rechazos': [], 'segundos': 0.0}
+    lector = csv.DictReader(lineas)
+    try:
+        columnas = columnas_preguntas(lector.fieldnames, catalogo)
+    except csv.Error as e:
+        raise ArchivoInvalido(f"CSV inválido: {e}")
+
+    def guardar(lote):
+        try:
+            repositorio.importar_encuestas(lote, revisar_fk)
+        except Exception as e:
+            resultado['segundos'] = round(time.perf_counter() - inicio, 3)
+            raise ImportacionInterrumpida(resultado, e) from e
+        resultado['importadas'] += len(lote)
+        resultado['segundos'] = round(time.perf_counter() - inicio, 3)
+        if progreso is not None:
+            progreso(resultado)
+
+    lote = []
+    try:
+        for fila in lector:
+            resultado['filas'] += 1
+            try:
+                lote.append(preparar_envio(catalogo, encuesta_desde_fila(fila, columnas), permitir_fecha=True))
+            except RespuestaInvalida as e:
+                resultado['rechazadas'] += 1
+                if max_rechazos is None or len(resultado['rechazos']) < max_rechazos:
+                    resultado['rechazos'].append({'fila': lector.line_num, 'error': str(e)})
+                continue
+            if len(lote) >= tam_lote:
+                guardar(lote)
+                lote = []
+    except csv.Error as e:
+        raise ArchivoInvalido(f"CSV inválido en la línea {lector.line_num}: {e}")
+    if lote:
+        guardar(lote)
+    resultado['segundos'] = round(time.perf_counter() - inicio, 3)
+    return resultado
+
+
+def _mostrar_progreso(resultado):
+    velocidad = resultado['importadas'] / resultado['segundos'] if resultado['segundos'] else 0
+    print(f"📥 {resultado['filas']} filas: {resultado['importadas']} importadas, "
+          f"{resultado['rechazadas']} rechazadas ({velocidad:.0f} encuestas/s)", flush=True)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Importar encuestas en papel desde un CSV')
+    parser.add_argument('archivo', help="CSV con encabezado ('-' para stdin)")
+    parser.add_argument('--lote', type=int, default=TAM_LOTE, help='encuestas por transacción')
+    parser.add_argument('--rechazos', help='CSV donde escribir las filas rechazadas (fila, error)')
+    parser.add_argument('--sin-revision-fk', action='store_true',
+                        help='PostgreSQL con superusuario: COPY sin disparadores de claves foráneas '
+                             '(no cambiar el catálogo mientras tanto)')
+    args = parser.parse_args(argv)
+
+    from app import catalogo, repositorio
+
+    entrada = sys.stdin if args.archivo == '-' else open(args.archivo, encoding='utf-8-sig', newline='')
+    try:
+        resultado = importar(entrada, catalogo.obtener(), repositorio, args.lote, _mostrar_progreso,
+                             max_rechazos=None, revisar_fk=not args.sin_revision_fk)
+    except ArchivoInvalido as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+    except ImportacionInterrumpida as e:
+        print(f"❌ {e} ({e.resultado['importadas']} encuestas ya importadas)", file=sys.stderr)
+        return 1
+    finally:
+        if entrada is not sys.stdin:
+            entrada.close()
+
+    if args.rechazos:
+        with open(args.rechazos, 'w', encoding='utf-8', newline='') as archivo:
+            escritor = csv.writer(archivo)
+            escritor.writerow(['fila', 'error'])
+            escritor.writerows((r['fila'], r['error']) for r in resultado['rechazos'])
+    for rechazo in resultado['rechazos'][:20]:
+        print(f"⚠️ Línea {rechazo['fila']}: {rechazo['error']}")
+    velocidad = resultado['importadas'] / resultado['segundos'] if resultado['segundos'] else 0
+    print(f"✅ {resultado['importadas']} encuestas importadas y {resultado['rechazadas']} rechazadas "
+          f"en {resultado['segundos']:.1f}s ({velocidad:.0f} encuestas/s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,254 @@
+"""
+Índices secundarios administrados y verificación de planes de las consultas calientes
+
+Uso por línea de comandos:
+    python indices.py                      # crear índices (CONCURRENTLY en PostgreSQL)
+    python indices.py --verificar-planes   # sembrar una copia temporal del esquema y
+                                           # fallar si alguna consulta caliente hace un
+                                           # recorrido secuencial de users/responses
+La misma verificación corre en tests/test_indices.py sobre una base SQLite nueva.
+"""
+import json
+import re
+import sqlite3
+import sys
+import time
+
+from estadisticas import CONSULTAS_CRUDAS
+
+# (nombre, tabla, columnas): misma sintaxis en SQLite y PostgreSQL
+INDICES = (
+    # Conteo por opción y JOIN options -> responses (id incluido para solo-índice)
+    ('idx_responses_respuesta', 'responses', '(respuesta, id)'),
+    # Respuestas de un usuario (exportación, ON DELETE CASCADE)
+    ('idx_responses_user_id', 'responses', '(user_id, pregunta_id, respuesta)'),
+    ('idx_users_clasificacion', 'users', '(clasificacion)'),
+    ('idx_users_sexo', 'users', '(sexo)'),
+    ('idx_users_timestamp', 'users', '(timestamp)'),
+    ('idx_users_nombre', 'users', '(nombre)'),
+)
+
+# Tablas que pueden crecer sin límite: nunca deben recorrerse secuencialmente
+TABLAS_GRANDES = ('users', 'responses')
+
+# Palabras que pueden seguir al nombre de una tabla sin ser su alias
+_NO_ALIAS = {'WHERE', 'GROUP', 'ORDER', 'LIMIT', 'UNION', 'LEFT', 'INNER', 'CROSS', 'JOIN', 'ON', 'USING'}
+
+# Consultas calientes: (nombre, SQL sin parámetros, válida en ambos dialectos)
+CONSULTAS_CALIENTES = [
+    (f'reconstruir_{tabla}', consulta) for tabla, columna, consulta in CONSULTAS_CRUDAS
+] + [
+    ('respuestas_de_usuario',
+     "SELECT pregunta_id, respuesta FROM responses WHERE user_id = 123"),
+    ('usuarios_por_fecha',
+     "SELECT id, clasificacion FROM users "
+     "WHERE timestamp >= '2025-01-10' AND timestamp < '2025-01-11'"),
+    # Exportación por páginas de id (SQLite) o de una vez (PostgreSQL) con filtros
+    ('exportacion',
+     "SELECT u.id, u.nombre, u.clasificacion, r.pregunta_id, r.respuesta "
+     "FROM (SELECT * FROM users WHERE clasificacion = 'Grave' AND id > 5000 "
+     "ORDER BY id LIMIT 1000) u "
+     "LEFT JOIN responses r ON r.user_id = u.id ORDER BY u.id, r.pregunta_id"),
+    ('exportacion_por_fecha',
+     "SELECT u.id, r.pregunta_id, r.respuesta "
+     "FROM (SELECT * FROM users WHERE timestamp >= '2025-01-10' AND timestamp < '2025-01-11') u "
+     "LEFT JOIN responses r ON r.user_id = u.id ORDER BY u.id, r.pregunta_id"),
+]
+
+# Agregan la tabla completa para reconstruir los contadores: recorrer entero un
+# índice que cubre la consulta es lo mínimo posible. Cualquier otra consulta
+# caliente debe buscar por índice; recorrer la tabla no se permite en ninguna
+RECORRIDO_DE_INDICE_PERMITIDO = frozenset(f'reconstruir_{tabla}' for tabla, _, _ in CONSULTAS_CRUDAS)
+
+
+def crear_indices(cur, concurrente=False):
+    """Crear los índices administrados si no existen (idempotente)"""
+    modo = 'CONCURRENTLY ' if concurrente else ''
+    if concurrente:
+        # Un CREATE INDEX CONCURRENTLY interrumpido deja el índice inválido y
+        # IF NOT EXISTS lo daría por creado: se borra para volver a crearlo
+        cur.execute("SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                    "WHERE NOT i.indisvalid AND c.relname = ANY(%s)", ([nombre for nombre, _, _ in INDICES],))
+        for (nombre,) in cur.fetchall():
+            cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {nombre}")
+    for nombre, tabla, columnas in INDICES:
+        cur.execute(f"CREATE INDEX {modo}IF NOT EXISTS {nombre} ON {tabla} {columnas}")
+
+
+def _sembrar(cur, use_sqlite, n_usuarios):
+    """Usuarios y respuestas sintéticos deterministas (ids explícitos)"""
+    if use_sqlite:
+        fecha = "datetime('2025-01-01', '+' || i || ' minutes')"
+    else:
+        fecha = "timestamp '2025-01-01' + i * interval '1 minute'"
+    cur.execute(f"""
+        INSERT INTO users (id, nombre, email, edad, sexo, puntaje_total, clasificacion, timestamp)
+        WITH RECURSIVE s(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM s WHERE i < {int(n_usuarios)})
+        SELECT i,
+               CASE WHEN i % 3 = 0 THEN 'Anónimo' ELSE 'Persona ' || i END,
+               'persona' || i || '@ejemplo.cl',
+               18 + i % 60,
+               CASE i % 4 WHEN 0 THEN 'Masculino' WHEN 1 THEN 'Femenino'
+                          WHEN 2 THEN 'Otro' ELSE 'Prefiero no decirlo' END,
+               (i * 37) % 19,
+               CASE WHEN (i * 37) % 19 <= 5 THEN 'Leve'
+                    WHEN (i * 37) % 19 <= 11 THEN 'Moderado' ELSE 'Grave' END,
+               {fecha}
+        FROM s
+    """)
+    cur.execute("""
+        INSERT INTO responses (id, user_id, pregunta_id, respuesta, puntaje, timestamp)
+        SELECT ROW_NUMBER() OVER (ORDER BY u.id, o.pregunta_id), u.id, o.pregunta_id, o.id, o.puntaje, u.timestamp
+        FROM users u
+        JOIN (SELECT id, pregunta_id, puntaje,
+                     ROW_NUMBER() OVER (PARTITION BY pregunta_id ORDER BY id) - 1 AS pos,
+                     COUNT(*) OVER (PARTITION BY pregunta_id) AS n
+              FROM options) o
+          ON o.pos = (u.id * (o.pregunta_id + 3) + u.id / 7) % o.n
+    """)
+
+
+def _alias(consulta):
+    """{nombre en el plan: tabla} de users/responses; EXPLAIN muestra el alias si lo hay"""
+    alias = {tabla: tabla for tabla in TABLAS_GRANDES}
+    patron = r'\b(?:FROM|JOIN)\s+(' + '|'.join(TABLAS_GRANDES) + r')\s+(?:AS\s+)?(\w+)'
+    for tabla, nombre in re.findall(patron, consulta, re.IGNORECASE):
+        if nombre.upper() not in _NO_ALIAS:
+            alias[nombre] = tabla
+    return alias
+
+
+def _recorridos_sqlite(cur, consulta, indice_permitido=False):
+    cur.execute("EXPLAIN QUERY PLAN " + consulta)
+    detalles = [row[3] for row in cur.fetchall()]
+    alias = _alias(consulta)
+    malos = []
+    for detalle in detalles:
+        # "SCAN r", "SCAN responses AS r" o "SCAN users USING COVERING INDEX ..."
+        m = re.match(r'SCAN (\w+)(?: AS (\w+))?', detalle)
+        if not m or alias.get(m.group(2) or m.group(1)) is None:
+            continue
+        if indice_permitido and 'USING COVERING INDEX' in detalle:
+            continue
+        malos.append(detalle)
+    return malos, detalles
+
+
+def _recorridos_postgres(cur, consulta, indice_permitido=False):
+    cur.execute("EXPLAIN (FORMAT JSON) " + consulta)
+    plan = cur.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    malos = []
+    pendientes = [plan[0]['Plan']]
+    while pendientes:
+        nodo = pendientes.pop()
+        tipo, tabla = nodo.get('Node Type'), nodo.get('Relation Name')
+        if tabla in TABLAS_GRANDES:
+            # Un Index Scan sin condición recorre el índice entero
+            completo = tipo in ('Index Scan', 'Index Only Scan') and 'Index Cond' not in nodo
+            if tipo == 'Seq Scan' or (completo and not (indice_permitido and tipo == 'Index Only Scan')):
+                malos.append(f"{tipo} on {tabla}")
+        pendientes.extend(nodo.get('Plans', []))
+    return malos, plan
+
+
+def verificar_planes(conn, use_sqlite, n_usuarios=20000, ruta_sqlite='survey_local.db',
+                     consultas=CONSULTAS_CALIENTES):
+    """
+    Sembrar una copia temporal del esquema (sin tocar los datos reales), crear los
+    índices administrados y revisar el plan de cada consulta caliente.
+    Devuelve [(consulta, [recorridos completos])] con las que fallan.
+    """
+    inicio = time.perf_counter()
+    fallas = []
+
+    if use_sqlite:
+        # Base temporal en memoria con el esquema copiado de la base local
+        temporal = sqlite3.connect(':memory:')
+        cur = temporal.cursor()
+        cur.execute("ATTACH DATABASE ? AS origen", (ruta_sqlite,))
+        cur.execute("SELECT sql FROM origen.sqlite_master "
+                    "WHERE type = 'table' AND name NOT LIKE 'sqlite_%' AND sql IS NOT NULL")
+        for (ddl,) in cur.fetchall():
+            cur.execute(ddl)
+        cur.execute("INSERT INTO questions SELECT * FROM origen.questions")
+        cur.execute("INSERT INTO options SELECT * FROM origen.options")
+        temporal.commit()
+        cur.execute("DETACH DATABASE origen")
+        crear_indices(cur)
+        _sembrar(cur, True, n_usuarios)
+        cur.execute("ANALYZE")
+        for nombre, consulta in consultas:
+            malos, detalles = _recorridos_sqlite(cur, consulta, nombre in RECORRIDO_DE_INDICE_PERMITIDO)
+            print(f"{'❌' if malos else '✅'} {nombre}: {' | '.join(detalles)}")
+            if malos:
+                fallas.append((nombre, malos))
+        temporal.close()
+    else:
+        # Esquema temporal dentro de una transacción que se revierte al final
+        cur = conn.cursor()
+        try:
+            cur.execute("CREATE SCHEMA verificacion_planes")
+            for tabla in ('questions', 'options', 'users', 'responses'):
+                cur.execute(f"CREATE TABLE verificacion_planes.{tabla} "
+                            f"(LIKE public.{tabla} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+                cur.execute(f"ALTER TABLE verificacion_planes.{tabla} ADD PRIMARY KEY (id)")
+            cur.execute("SET LOCAL search_path TO verificacion_planes")
+            cur.execute("INSERT INTO questions SELECT * FROM public.questions")
+            cur.execute("INSERT INTO options SELECT * FROM public.options")
+            crear_indices(cur)
+            _sembrar(cur, False, n_usuarios)
+            cur.execute("ANALYZE users")
+            cur.execute("ANALYZE responses")
+            # Con recorridos secuenciales penalizados, uno que aparezca significa
+            # que no existe un índice utilizable para la consulta
+            cur.execute("SET LOCAL enable_seqscan = off")
+            for nombre, consulta in consultas:
+                malos, plan = _recorridos_postgres(cur, consulta, nombre in RECORRIDO_DE_INDICE_PERMITIDO)
+                print(f"{'❌' if malos else '✅'} {nombre}: {plan[0]['Plan']['Node Type']}"
+                      + (f" ({', '.join(malos)})" if malos else ''))
+                if malos:
+                    fallas.append((nombre, malos))
+        finally:
+            conn.rollback()
+            cur.close()
+
+    print(f"⏱️ Verificación con {n_usuarios} usuarios en {time.perf_counter() - inicio:.1f}s")
+    return fallas
+
+
+def main(argv):
+    from app import get_db_connection, USE_SQLITE
+
+    conn = get_db_connection()
+    try:
+        if '--verificar-planes' in argv:
+            numeros = [a for a in argv if a.isdigit()]
+            fallas = verificar_planes(conn, USE_SQLITE, int(numeros[0]) if numeros else 20000)
+            if fallas:
+                print(f"❌ {len(fallas)} consultas calientes con recorridos secuenciales")
+                return 1
+            print("✅ Ninguna consulta caliente recorre secuencialmente users/responses")
+            return 0
+
+        cur = conn.cursor()
+        if USE_SQLITE:
+            crear_indices(cur)
+            conn.commit()
+        else:
+            # CONCURRENTLY no bloquea escrituras pero no admite transacciones
+            conn.autocommit = True
+            try:
+                crear_indices(cur, concurrente=True)
+            finally:
+                conn.autocommit = False
+        cur.close()
+        print(f"✅ {len(INDICES)} índices verificados/creados")
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
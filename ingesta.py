@@ -0,0 +1,193 @@
+"""
+Ingesta diferida (write-behind) para /api/submit-survey
+El endpoint valida y puntúa en memoria, encola el envío y responde de inmediato;
+un hilo por worker escribe los envíos en lotes de N o cada T milisegundos
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+
+class ColaLlena(Exception):
+    """La cola alcanzó su capacidad: el cliente debe reintentar más tarde"""
+
+    def __init__(self, retry_after):
+        super().__init__('Cola de ingesta llena')
+        self.retry_after = retry_after
+
+
+class ColaIngesta:
+    """Cola acotada + hilo escritor con commit agrupado"""
+
+    def __init__(self, escribir_lote, capacidad=1000, tam_lote=100, intervalo_ms=200,
+                 retry_after=2, es_transitorio=None):
+        self._escribir_lote = escribir_lote
+        # Solo los errores transitorios se reintentan con backoff; los demás son
+        # del envío. Sin criterio del pool, todos se reintentan
+        self.es_transitorio = es_transitorio or (lambda error: True)
+        self._descartes = deque(maxlen=20)
+        self.capacidad = capacidad
+        self.tam_lote = tam_lote
+        self.intervalo = intervalo_ms / 1000.0
+        self.retry_after = retry_after
+        self._cola = queue.Queue(maxsize=capacidad)
+        self._lock = threading.Lock()
+        self._hilo = None
+        self._pid = None
+        self._detener = threading.Event()
+        self._stats = {
+            'encolados': 0,
+            'escritos': 0,
+            'rechazados': 0,
+            'perdidos': 0,
+            'descartados': 0,
+            'lotes': 0,
+            'errores_escritura': 0,
+            'flush_total_ms': 0.0,
+            'flush_max_ms': 0.0,
+            'flush_ultimo_ms': 0.0,
+        }
+
+    def _asegurar_hilo(self):
+        # El hilo se crea en el proceso que atiende (después del fork de gunicorn)
+        if self._pid == os.getpid() and self._hilo is not None:
+            return
+        with self._lock:
+            if self._pid != os.getpid() or self._hilo is None:
+                self._pid = os.getpid()
+                self._detener.clear()
+                self._hilo = threading.Thread(target=self._bucle, name='ingesta', daemon=True)
+                self._hilo.start()
+                atexit.register(self.drenar)
+
+    def encolar(self, envio):
+        self._asegurar_hilo()
+        try:
+            self._cola.put_nowait(envio)
+        except queue.Full:
+            with self._lock:
+                self._stats['rechazados'] += 1
+            raise ColaLlena(self.retry_after)
+        with self._lock:
+            self._stats['encolados'] += 1
+
+    def _tomar_lote(self):
+        try:
+            primero = self._cola.get(timeout=0.5)
+        except queue.Empty:
+            return []
+        lote = [primero]
+        limite = time.monotonic() + self.intervalo
+        while len(lote) < self.tam_lote:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(self._cola.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    def _escribir(self, lote, reintentos=None):
+        espera = 0.1
+        intento = 0
+        while True:
+            inicio = time.perf_counter()
+            try:
+                self._escribir_lote(lote)
+            except Exception as e:
+                intento += 1
+                with self._lock:
+                    self._stats['errores_escritura'] += 1
+                print(f"❌ Error escribiendo lote de {len(lote)} encuestas (intento {intento}): {e}")
+                if not self.es_transitorio(e):
+                    # Un envío que la base no acepta no debe bloquear la cola:
+                    # se escriben de a uno y se descarta solo el que falla
+                    if len(lote) == 1:
+                        self._descartar(lote[0], e)
+                        return False
+                    escritos = [self._escribir([envio], reintentos) for envio in lote]
+                    return all(escritos)
+                if (reintentos is not None and intento > reintentos) or \
+                        (reintentos is None and self._detener.is_set()):
+                    with self._lock:
+                        self._stats['perdidos'] += len(lote)
+                    return False
+                time.sleep(espera)
+                espera = min(espera * 2, 5.0)
+                continue
+
+            ms = (time.perf_counter() - inicio) * 1000
+            with self._lock:
+                self._stats['escritos'] += len(lote)
+                self._stats['lotes'] += 1
+                self._stats['flush_total_ms'] += ms
+                self._stats['flush_ultimo_ms'] = ms
+                self._stats['flush_max_ms'] = max(self._stats['flush_max_ms'], ms)
+            return True
+
+    def _descartar(self, envio, error):
+        with self._lock:
+            self._stats['descartados'] += 1
+            self._descartes.append({'fecha': datetime.now().isoformat(timespec='seconds'),
+                                    'puntaje': envio.puntaje_total, 'error': str(error)[:200]})
+        print(f"🗑️ Encuesta descartada de la cola de ingesta: {error}")
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            lote = self._tomar_lote()
+            if lote:
+                # Reintenta con backoff mientras el worker siga vivo; la cola
+                # llena se traduce en 503 para los clientes mientras tanto
+                self._escribir(lote)
+
+    def drenar(self, timeout=10.0):
+        """Detener el hilo y escribir lo que quede en la cola (apagado del worker)"""
+        if self._hilo is None or self._pid != os.getpid():
+            return
+        self._detener.set()
+        self._hilo.join(timeout)
+        pendientes = []
+        while True:
+            try:
+                pendientes.append(self._cola.get_nowait())
+            except queue.Empty:
+                break
+        for i in range(0, len(pendientes), self.tam_lote):
+            self._escribir(pendientes[i:i + self.tam_lote], reintentos=2)
+        if pendientes:
+            print(f"📥 Cola de ingesta drenada: {len(pendientes)} encuestas")
+        self._hilo = None
+
+    def estadisticas(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['ultimos_descartes'] = list(self._descartes)
+        stats.update({
+            'profundidad': self._cola.qsize(),
+            'capacidad': self.capacidad,
+            'tam_lote': self.tam_lote,
+            'intervalo_ms': round(self.intervalo * 1000),
+            'flush_promedio_ms': round(stats['flush_total_ms'] / stats['lotes'], 3) if stats['lotes'] else 0.0,
+        })
+        for clave in ('flush_total_ms', 'flush_max_ms', 'flush_ultimo_ms'):
+            stats[clave] = round(stats[clave], 3)
+        return stats
+
+
+def crear_cola(escribir_lote, es_transitorio=None):
+    """Cola de ingesta si INGESTA_MODO=cola; None para escritura directa"""
+    if os.environ.get('INGESTA_MODO', 'directo') != 'cola':
+        return None
+    return ColaIngesta(
+        escribir_lote,
+        capacidad=int(os.environ.get('INGESTA_CAPACIDAD', 1000)),
+        tam_lote=int(os.environ.get('INGESTA_LOTE', 100)),
+        intervalo_ms=int(os.environ.get('INGESTA_INTERVALO_MS', 200)),
+        retry_after=int(os.environ.get('INGESTA_RETRY_AFTER', 2)),
+        es_transitorio=es_transitorio,
+    )
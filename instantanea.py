@@ -0,0 +1,344 @@
+"""
+Instantánea columnar de encuestas para análisis fuera de línea
+Cada columna es un archivo binario de ancho fijo (un valor por usuario) que se
+puede mapear en memoria sin parsear; manifiesto.json describe tipos, códigos y
+el último id exportado. Cada ejecución solo agrega los usuarios nuevos.
+
+Columnas:
+    user_id (int64), edad (int16), puntaje_total (int16),
+    sexo / clasificacion (int8, código en manifiesto['enums']),
+    timestamp (int64, microsegundos desde 1970-01-01),
+    p<pregunta_id> (int8, posición de la opción en manifiesto['opciones'], -1 sin respuesta)
+Nombre y email no se copian a la instantánea. Un valor que no cabe en su columna
+(edad no numérica o fuera de int16, más de 127 valores distintos de sexo) se guarda
+como -1 en vez de detener la actualización.
+
+Solo se exportan ids que ya no pueden quedar atrás de una transacción en curso
+(ver _limite_postgres); la fecha del envío no sirve de corte porque el envío por
+lotes y la importación guardan fechas antiguas con ids nuevos.
+
+Lectura: la ruta soportada es mmap + memoryview de la biblioteca estándar; si
+NumPy está instalado (no es dependencia del proyecto) las columnas se abren con
+numpy.memmap.
+
+Uso por línea de comandos:
+    python instantanea.py [directorio]             # crear o actualizar
+    python instantanea.py [directorio] --resumen   # conteos leídos de la instantánea
+"""
+import argparse
+import json
+import mmap
+import os
+import sys
+import time
+from array import array
+from collections import Counter
+from datetime import datetime, timedelta
+
+import exportar
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+DIRECTORIO = 'snapshot'
+MANIFIESTO = 'manifiesto.json'
+FORMATO = 1
+
+# Marcas de la secuencia pendientes de quedar firmes (una por ejecución)
+MAX_MARCAS = 100
+
+EPOCA = datetime(1970, 1, 1)
+
+# dtype (nombre NumPy) -> typecode de array/memoryview
+TIPOS = {'int8': 'b', 'int16': 'h', 'int64': 'q'}
+
+# Valor o código que no cabe en su columna (y "sin respuesta" en las preguntas)
+SIN_DATO = -1
+MAX_INT8 = 127
+MAX_INT16 = 32767
+
+COLUMNAS_FIJAS = (
+    ('user_id', 'int64'),
+    ('edad', 'int16'),
+    ('puntaje_total', 'int16'),
+    ('sexo', 'int8'),
+    ('clasificacion', 'int8'),
+    ('timestamp', 'int64'),
+)
+
+
+def _manifiesto_nuevo():
+    return {
+        'formato': FORMATO,
+        'orden_bytes': sys.byteorder,
+        'filas': 0,
+        'ultimo_user_id': 0,
+        'marcas': [],
+        'actualizado': None,
+        'columnas': {},
+        'enums': {'sexo': [], 'clasificacion': []},
+        'opciones': {},
+    }
+
+
+def leer_manifiesto(directorio):
+    ruta = os.path.join(directorio, MANIFIESTO)
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _guardar_manifiesto(directorio, manifiesto):
+    # Escritura atómica: los lectores nunca ven un manifiesto a medias
+    ruta = os.path.join(directorio, MANIFIESTO)
+    with open(ruta + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=2)
+    os.replace(ruta + '.tmp', ruta)
+
+
+def _preparar_columnas(directorio, manifiesto, opciones_db):
+    """Registrar columnas y opciones nuevas; recortar restos de una ejecución interrumpida"""
+    columnas = manifiesto['columnas']
+    filas = manifiesto['filas']
+    nuevas = list(COLUMNAS_FIJAS)
+    for pregunta_id, option_ids in opciones_db.items():
+        conocidas = manifiesto['opciones'].setdefault(str(pregunta_id), [])
+        conocidas.extend(o for o in option_ids if o not in conocidas)
+        nuevas.append((f'p{pregunta_id}', 'int8'))
+
+    for nombre, dtype in nuevas:
+        if nombre not in columnas:
+            columnas[nombre] = {'archivo': f'{nombre}.bin', 'dtype': dtype}
+            # Pregunta agregada después: las filas anteriores quedan sin respuesta
+            with open(os.path.join(directorio, columnas[nombre]['archivo']), 'wb') as f:
+                array(TIPOS[dtype], [-1 if nombre.startswith('p') else 0] * filas).tofile(f)
+
+    for columna in columnas.values():
+        ruta = os.path.join(directorio, columna['archivo'])
+        esperado = filas * array(TIPOS[columna['dtype']]).itemsize
+        # Datos agregados sin manifiesto actualizado (ejecución interrumpida): descartarlos
+        if os.path.getsize(ruta) != esperado:
+            with open(ruta, 'r+b') as f:
+                f.truncate(esperado)
+
+
+def _codigo(manifiesto, enum, valor):
+    valores = manifiesto['enums'][enum]
+    if valor not in valores:
+        if len(valores) >= MAX_INT8 or not isinstance(valor, (str, type(None))):
+            return SIN_DATO
+        valores.append(valor)
+    return valores.index(valor)
+
+
+def _entero16(valor):
+    """Entero para una columna int16 (SQLite guarda lo que llegue: '30', 'treinta'...)"""
+    try:
+        valor = int(valor)
+    except (TypeError, ValueError):
+        return SIN_DATO
+    return valor if -MAX_INT16 <= valor <= MAX_INT16 else SIN_DATO
+
+
+def _microsegundos(timestamp):
+    if not isinstance(timestamp, datetime):
+        timestamp = datetime.fromisoformat(str(timestamp))
+    return (timestamp.replace(tzinfo=None) - EPOCA) // timedelta(microseconds=1)
+
+
+def _limite_postgres(conn, manifiesto):
+    """
+    Mayor id bajo el cual ninguna transacción en curso puede confirmar un usuario.
+    Los ids salen de la secuencia antes del commit (escritura.py reserva varios con
+    nextval antes de insertar), así que un id menor puede hacerse visible después de
+    uno mayor. Cada ejecución anota el valor de la secuencia con la hora; la marca
+    queda firme cuando ya no sigue abierta ninguna transacción que empezó antes.
+    Requiere ver las sesiones de los demás en pg_stat_activity (mismo rol o
+    pg_read_all_stats).
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT COALESCE(pg_sequence_last_value(pg_get_serial_sequence('users', 'id')::regclass), 0), "
+                "clock_timestamp()")
+    secuencia, ahora = cur.fetchone()
+    cur.execute("""
+        SELECT MIN(xact_start) FROM pg_stat_activity
+        WHERE datname = current_database() AND pid <> pg_backend_pid() AND xact_start IS NOT NULL
+    """)
+    mas_antigua = cur.fetchone()[0]
+    cur.close()
+    conn.rollback()
+
+    marcas = [(datetime.fromisoformat(fecha), id_) for fecha, id_ in manifiesto['marcas']]
+    marcas.append((ahora, secuencia))
+    firmes = [id_ for fecha, id_ in marcas if mas_antigua is None or fecha < mas_antigua]
+    pendientes = [(fecha, id_) for fecha, id_ in marcas if mas_antigua is not None and fecha >= mas_antigua]
+    # Con una transacción larga abierta las marcas se acumulan: perder las más viejas solo atrasa el corte
+    manifiesto['marcas'] = [[fecha.isoformat(), id_] for fecha, id_ in pendientes[-MAX_MARCAS:]]
+    return max(firmes, default=manifiesto['ultimo_user_id'])
+
+
+def actualizar(conn, use_sqlite, directorio=DIRECTORIO, tam_lote=10000):
+    """
+    Agregar a la instantánea los usuarios con id mayor al último exportado y que ya
+    no pueden quedar atrás de una transacción en curso. En SQLite los ids se asignan
+    con el bloqueo de escritura tomado y se confirman en orden, así que todo id
+    visible es firme. Devuelve filas agregadas.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    manifiesto = leer_manifiesto(directorio) or _manifiesto_nuevo()
+    if manifiesto['orden_bytes'] != sys.byteorder:
+        raise ValueError(f"Instantánea escrita en {manifiesto['orden_bytes']}-endian")
+    manifiesto.setdefault('marcas', [])
+    limite = None if use_sqlite else _limite_postgres(conn, manifiesto)
+
+    cur = conn.cursor()
+    cur.execute("SELECT pregunta_id, id FROM options ORDER BY pregunta_id, id")
+    opciones_db = {}
+    for pregunta_id, option_id in cur.fetchall():
+        opciones_db.setdefault(pregunta_id, []).append(option_id)
+    cur.close()
+    conn.rollback()
+
+    _preparar_columnas(directorio, manifiesto, opciones_db)
+    columnas = manifiesto['columnas']
+    # Posiciones que caben en int8; una opción más allá queda como SIN_DATO
+    posiciones = {int(q): {o: i for i, o in enumerate(ids) if i <= MAX_INT8}
+                  for q, ids in manifiesto['opciones'].items()}
+    preguntas = [(f'p{q}', q) for q in posiciones]
+
+    archivos = {nombre: open(os.path.join(directorio, c['archivo']), 'ab') for nombre, c in columnas.items()}
+    agregadas = 0
+    ultimo_id = manifiesto['ultimo_user_id']
+    try:
+        lote = {nombre: array(TIPOS[c['dtype']]) for nombre, c in columnas.items()}
+        encuestas = exportar.iterar_encuestas(conn, use_sqlite, {}, desde_id=manifiesto['ultimo_user_id'])
+        try:
+            for encuesta in encuestas:
+                if limite is not None and encuesta['id'] > limite:
+                    break
+                lote['user_id'].append(encuesta['id'])
+                lote['edad'].append(_entero16(encuesta['edad']))
+                lote['puntaje_total'].append(_entero16(encuesta['puntaje_total']))
+                lote['sexo'].append(_codigo(manifiesto, 'sexo', encuesta['sexo']))
+                lote['clasificacion'].append(_codigo(manifiesto, 'clasificacion', encuesta['clasificacion']))
+                lote['timestamp'].append(_microsegundos(encuesta['timestamp']))
+                respuestas = encuesta['respuestas']
+                for nombre, q in preguntas:
+                    lote[nombre].append(posiciones[q].get(respuestas.get(q), SIN_DATO))
+                agregadas += 1
+                ultimo_id = encuesta['id']
+                if len(lote['user_id']) >= tam_lote:
+                    for nombre, valores in lote.items():
+                        valores.tofile(archivos[nombre])
+                    lote = {nombre: array(valores.typecode) for nombre, valores in lote.items()}
+            for nombre, valores in lote.items():
+                valores.tofile(archivos[nombre])
+        finally:
+            encuestas.close()
+    finally:
+        for f in archivos.values():
+            f.close()
+
+    manifiesto['ultimo_user_id'] = ultimo_id
+    manifiesto['filas'] += agregadas
+    manifiesto['actualizado'] = datetime.now().isoformat(timespec='seconds')
+    _guardar_manifiesto(directorio, manifiesto)
+    return agregadas
+
+
+class Instantanea:
+    """Columnas mapeadas en memoria: memoryview sobre mmap, o numpy.memmap si NumPy está instalado"""
+
+    def __init__(self, directorio=DIRECTORIO):
+        self.manifiesto = leer_manifiesto(directorio)
+        if self.manifiesto is None:
+            raise FileNotFoundError(f"No hay instantánea en {directorio}")
+        self.filas = self.manifiesto['filas']
+        self._mapas = []
+        self.columnas = {}
+        for nombre, columna in self.manifiesto['columnas'].items():
+            ruta = os.path.join(directorio, columna['archivo'])
+            self.columnas[nombre] = self._mapear(ruta, columna['dtype'])
+
+    def _mapear(self, ruta, dtype):
+        typecode = TIPOS[dtype]
+        if self.filas == 0:
+            return numpy.zeros(0, dtype=dtype) if numpy is not None else memoryview(array(typecode))
+        if numpy is not None:
+            return numpy.memmap(ruta, dtype=dtype, mode='r', shape=(self.filas,))
+        with open(ruta, 'rb') as f:
+            mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._mapas.append(mapa)
+        # Solo las filas del manifiesto (el archivo puede tener datos de una escritura en curso)
+        return memoryview(mapa).cast(typecode)[:self.filas]
+
+    def __getitem__(self, nombre):
+        return self.columnas[nombre]
+
+    def decodificar(self, enum, codigo):
+        """Valor original del código (None para SIN_DATO)"""
+        return None if codigo == SIN_DATO else self.manifiesto['enums'][enum][codigo]
+
+    def opcion(self, pregunta_id, posicion):
+        return self.manifiesto['opciones'][str(pregunta_id)][posicion]
+
+    def cerrar(self):
+        self.columnas = {}
+        for mapa in self._mapas:
+            mapa.close()
+        self._mapas = []
+
+
+def resumen(instantanea):
+    """Los mismos conteos del dashboard calculados sobre la instantánea"""
+    conteos = {
+        'encuestas': instantanea.filas,
+        'sexo': Counter(),
+        'clasificacion': Counter(),
+        'opciones': Counter(),
+    }
+    for enum in ('sexo', 'clasificacion'):
+        for codigo, total in Counter(instantanea[enum]).items():
+            conteos[enum][instantanea.decodificar(enum, codigo)] = total
+    for pregunta_id in instantanea.manifiesto['opciones']:
+        for posicion, total in Counter(instantanea[f'p{pregunta_id}']).items():
+            if posicion >= 0:
+                conteos['opciones'][instantanea.opcion(pregunta_id, posicion)] = total
+    return conteos
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Instantánea columnar de encuestas')
+    parser.add_argument('directorio', nargs='?', default=DIRECTORIO)
+    parser.add_argument('--resumen', action='store_true')
+    args = parser.parse_args(argv)
+
+    if args.resumen:
+        instantanea = Instantanea(args.directorio)
+        conteos = resumen(instantanea)
+        instantanea.cerrar()
+        print(f"📊 {conteos['encuestas']} encuestas")
+        for clave in ('sexo', 'clasificacion'):
+            print(f"   {clave}: {dict(conteos[clave].most_common())}")
+        print(f"   opciones: {dict(sorted(conteos['opciones'].items()))}")
+        return 0
+
+    from app import get_db_connection, USE_SQLITE
+
+    inicio = time.perf_counter()
+    conn = get_db_connection()
+    try:
+        agregadas = actualizar(conn, USE_SQLITE, args.directorio)
+    finally:
+        conn.close()
+    manifiesto = leer_manifiesto(args.directorio)
+    print(f"✅ {agregadas} usuarios agregados ({manifiesto['filas']} en total, "
+          f"último id {manifiesto['ultimo_user_id']}) en {time.perf_counter() - inicio:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,258 @@
+"""
+Métricas en formato de texto de Prometheus (/metrics), sin dependencias ni consultas
+- Latencia por ruta (histograma) y errores (4xx/5xx) por ruta y código
+- Consultas del repositorio por petición: cantidad y tiempo (histogramas por ruta)
+- Espera para obtener una conexión del pool
+- Al exponer: llamadas/tiempo acumulados por sentencia y estado del pool
+- Ruta e id de cada petición (X-Request-ID) para el registro de consultas lentas
+Cada hilo observa sobre sus propios contadores (sin locks: bisect + dos sumas);
+la exposición suma los de todos los hilos (y el acumulado de los que terminaron). Las cifras son del proceso: con
+varios workers de gunicorn cada scrape ve al worker que lo atiende.
+"""
+import threading
+import time
+import uuid
+import weakref
+from bisect import bisect_left
+
+from flask import request
+
+BUCKETS_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 8, 13, 21)
+BUCKETS_ESPERA = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+TIPO_CONTENIDO = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class _Testigo:
+    """Vive en el threading.local del hilo: se libera cuando el hilo termina"""
+    __slots__ = ('__weakref__',)
+
+
+class _PorHilo:
+    """
+    Un dict {etiquetas: valores} por hilo; se registran todos para poder sumarlos.
+    Cuando un hilo termina (werkzeug crea uno por conexión) sus valores pasan al
+    acumulado de los hilos retirados y su dict se suelta
+    """
+
+    def __init__(self, nombre, ayuda, etiquetas):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self._local = threading.local()
+        self._hilos = {}
+        self._retirados = {}
+        self._lock = threading.Lock()
+
+    def _propios(self):
+        try:
+            return self._local.valores
+        except AttributeError:
+            valores = self._local.valores = {}
+            testigo = self._local.testigo = _Testigo()
+            weakref.finalize(testigo, self._retirar, id(valores))
+            with self._lock:
+                self._hilos[id(valores)] = valores
+            return valores
+
+    def _retirar(self, clave):
+        with self._lock:
+            valores = self._hilos.pop(clave, None)
+            if valores is None:
+                return
+            for etiquetas, valor in valores.items():
+                self._acumular(self._retirados, etiquetas, valor)
+
+    def _acumular(self, totales, etiquetas, valor):
+        raise NotImplementedError
+
+    def _series(self):
+        with self._lock:
+            hilos = list(self._hilos.values())
+            retirados = [(etiquetas, self._copia(valor)) for etiquetas, valor in self._retirados.items()]
+        # list(dict.items()) no suelta el GIL: copia consistente aunque el hilo siga observando
+        return retirados + [serie for valores in hilos for serie in list(valores.items())]
+
+    @staticmethod
+    def _copia(valor):
+        return valor
+
+    def _etiquetas(self, valores, extra=()):
+        pares = list(zip(self.etiquetas, valores)) + list(extra)
+        if not pares:
+            return ''
+        return '{' + ','.join(f'{k}="{_escapar(str(v))}"' for k, v in pares) + '}'
+
+
+class Contador(_PorHilo):
+    tipo = 'counter'
+
+    def sumar(self, *etiquetas, valor=1):
+        valores = self._propios()
+        valores[etiquetas] = valores.get(etiquetas, 0) + valor
+
+    def _acumular(self, totales, etiquetas, valor):
+        totales[etiquetas] = totales.get(etiquetas, 0) + valor
+
+    def exponer(self):
+        totales = {}
+        for etiquetas, valor in self._series():
+            self._acumular(totales, etiquetas, valor)
+        return [f"{self.nombre}{self._etiquetas(etiquetas)} {_numero(valor)}"
+                for etiquetas, valor in sorted(totales.items())]
+
+
+class Histograma(_PorHilo):
+    tipo = 'histogram'
+
+    def __init__(self, nombre, ayuda, etiquetas, buckets):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(buckets)
+
+    def observar(self, valor, *etiquetas):
+        valores = self._propios()
+        serie = valores.get(etiquetas)
+        if serie is None:
+            # Un contador por bucket, uno para +Inf y la suma al final
+            serie = valores[etiquetas] = [0] * (len(self.buckets) + 1) + [0.0]
+        serie[bisect_left(self.buckets, valor)] += 1
+        serie[-1] += valor
+
+    def _acumular(self, totales, etiquetas, serie):
+        acumulada = totales.get(etiquetas)
+        if acumulada is None:
+            totales[etiquetas] = list(serie)
+        else:
+            for i, valor in enumerate(serie):
+                acumulada[i] += valor
+
+    _copia = staticmethod(list)
+
+    def exponer(self):
+        totales = {}
+        for etiquetas, serie in self._series():
+            self._acumular(totales, etiquetas, serie)
+        lineas = []
+        for etiquetas, serie in sorted(totales.items()):
+            conteo = 0
+            for limite, cantidad in zip(self.buckets + ('+Inf',), serie):
+                conteo += cantidad
+                le = limite if limite == '+Inf' else _numero(limite)
+                lineas.append(f"{self.nombre}_bucket{self._etiquetas(etiquetas, [('le', le)])} {conteo}")
+            lineas.append(f"{self.nombre}_sum{self._etiquetas(etiquetas)} {_numero(serie[-1])}")
+            lineas.append(f"{self.nombre}_count{self._etiquetas(etiquetas)} {conteo}")
+        return lineas
+
+
+def _escapar(texto):
+    return texto.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+LATENCIA = Histograma('encuesta_http_request_duration_seconds',
+                      'Latencia de las peticiones hasta entregar la respuesta', ('route', 'method'),
+                      BUCKETS_LATENCIA)
+ERRORES = Contador('encuesta_http_request_errors_total', 'Respuestas 4xx y 5xx', ('route', 'code'))
+CONSULTAS = Histograma('encuesta_db_queries_per_request', 'Consultas del repositorio por petición',
+                       ('route',), BUCKETS_CONSULTAS)
+TIEMPO_DB = Histograma('encuesta_db_query_seconds_per_request', 'Tiempo en consultas por petición',
+                       ('route',), BUCKETS_LATENCIA)
+ESPERA_CONEXION = Histograma('encuesta_db_connection_acquire_seconds',
+                             'Tiempo para obtener una conexión del pool', (), BUCKETS_ESPERA)
+
+METRICAS = (LATENCIA, ERRORES, CONSULTAS, TIEMPO_DB, ESPERA_CONEXION)
+
+
+class _Peticion(threading.local):
+    # [consultas, segundos en la base] de la petición en curso del hilo, o None
+    actual = None
+    inicio = 0.0
+    ruta = None
+    id = None
+
+
+_peticion = _Peticion()
+
+
+def registrar_consulta(segundos):
+    """Sumar una consulta a la petición en curso del hilo (fuera de una petición no hace nada)"""
+    actual = _peticion.actual
+    if actual is not None:
+        actual[0] += 1
+        actual[1] += segundos
+
+
+def peticion_actual():
+    """(ruta, id de la petición) en curso en el hilo, o (None, None) fuera de una petición"""
+    return _peticion.ruta, _peticion.id
+
+
+def _metrica_simple(nombre, ayuda, tipo, valores):
+    lineas = [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} {tipo}"]
+    for etiquetas, valor in valores:
+        sufijo = '{' + ','.join(f'{k}="{_escapar(str(v))}"' for k, v in etiquetas) + '}' if etiquetas else ''
+        lineas.append(f"{nombre}{sufijo} {_numero(valor)}")
+    return lineas
+
+
+def exponer(pool=None, repositorio=None):
+    """Texto de exposición de Prometheus con las métricas del proceso"""
+    lineas = []
+    for metrica in METRICAS:
+        lineas.append(f"# HELP {metrica.nombre} {metrica.ayuda}")
+        lineas.append(f"# TYPE {metrica.nombre} {metrica.tipo}")
+        lineas.extend(metrica.exponer())
+    if repositorio is not None:
+        sentencias = [(nombre, datos) for nombre, datos in repositorio.estadisticas().items()
+                      if not nombre.startswith('_')]
+        lineas += _metrica_simple('encuesta_db_statement_calls_total', 'Ejecuciones por sentencia del repositorio',
+                                  'counter', [((('statement', n),), d['llamadas']) for n, d in sentencias])
+        lineas += _metrica_simple('encuesta_db_statement_seconds_total', 'Tiempo por sentencia del repositorio',
+                                  'counter', [((('statement', n),), d['total_ms'] / 1000) for n, d in sentencias])
+    if pool is not None:
+        stats = pool.estadisticas()
+        lineas += _metrica_simple('encuesta_db_pool_in_use', 'Conexiones prestadas', 'gauge',
+                                  [((), stats['en_uso'])])
+        lineas += _metrica_simple('encuesta_db_pool_checkouts_total', 'Conexiones entregadas', 'counter',
+                                  [((), stats['checkouts'])])
+        lineas += _metrica_simple('encuesta_db_pool_timeouts_total', 'Esperas de conexión agotadas (503)',
+                                  'counter', [((), stats['timeouts'])])
+    return '\n'.join(lineas) + '\n'
+
+
+def registrar(app):
+    """
+    Medir todas las peticiones de la app. Registrar antes que los demás hooks
+    after_request (corren en orden inverso) para que su tiempo quede incluido.
+    """
+    @app.before_request
+    def _iniciar_medicion():
+        _peticion.inicio = time.perf_counter()
+        _peticion.actual = [0, 0.0]
+        # Plantilla de la ruta (no la URL): cardinalidad acotada
+        _peticion.ruta = request.url_rule.rule if request.url_rule is not None else 'sin_ruta'
+        # Id del proxy si lo trae (acotado), si no uno propio; vuelve en X-Request-ID
+        _peticion.id = request.headers.get('X-Request-ID', '')[:64] or uuid.uuid4().hex[:16]
+
+    @app.after_request
+    def _terminar_medicion(response):
+        actual = _peticion.actual
+        if actual is not None:
+            _peticion.actual = None
+            regla = _peticion.ruta
+            response.headers.setdefault('X-Request-ID', _peticion.id)
+            LATENCIA.observar(time.perf_counter() - _peticion.inicio, regla, request.method)
+            CONSULTAS.observar(actual[0], regla)
+            TIEMPO_DB.observar(actual[1], regla)
+            if response.status_code >= 400:
+                ERRORES.sumar(regla, str(response.status_code))
+        return response
+
+    @app.teardown_request
+    def _cerrar_medicion(exc):
+        _peticion.actual = None
+        _peticion.ruta = _peticion.id = None
@@ -0,0 +1,386 @@
+"""
+Migraciones versionadas del esquema (tabla schema_version)
+
+Cada migración corre una sola vez por base: en su propia transacción, bajo un
+bloqueo que serializa a todos los procesos (advisory lock en PostgreSQL, el
+bloqueo de escritura del archivo con BEGIN IMMEDIATE en SQLite), y vuelve a
+leer la versión ya con el bloqueo tomado. Los workers solo comparan la versión
+al iniciar; si el esquema está atrasado migra el primero y los demás esperan.
+En PostgreSQL los índices (FUERA_DE_TRANSACCION) se crean con CREATE INDEX
+CONCURRENTLY en autocommit, sin bloquear las escrituras de users/responses.
+
+Uso por línea de comandos (paso de release del deploy):
+    python migraciones.py            # aplicar las pendientes
+    python migraciones.py --estado   # versión actual y pendientes
+"""
+import os
+import sys
+import time
+
+import estadisticas
+from catalogo import crear_tabla_version, leer_version, marcar_version
+from indices import crear_indices
+
+# Clave del pg_advisory_xact_lock de las migraciones (cualquier bigint fijo)
+CLAVE_BLOQUEO = 0x656E63756573
+
+# Espera máxima por el bloqueo del archivo SQLite mientras otro proceso migra
+ESPERA_SQLITE_MS = 120000
+
+# Pausa entre intentos por el advisory lock de PostgreSQL
+ESPERA_BLOQUEO_SEG = 0.5
+
+PREGUNTAS = [
+    "¿Cómo describirías el ambiente en tu hogar?",
+    "¿Te han hecho sentir miedo, humillado/a o culpable dentro de tu familia recientemente?",
+    "¿Te han hecho sentir miedo con miradas, gestos o silencios prolongados?",
+    "¿A quién acudirías si te sintieras en peligro dentro de tu hogar?",
+    "¿Alguna vez alguien en tu familia te ha golpeado, empujado o agredido físicamente?",
+    "¿Has presenciado actos de violencia hacia ti u otros miembros de tu familia?"
+]
+
+# (pregunta_id, texto, puntaje)
+OPCIONES = [
+    # Pregunta 1 - Ambiente en el hogar
+    (1, "Tranquilo y de respeto mutuo", 0),
+    (1, "A veces tenso, con discusiones esporádicas", 1),
+    (1, "Frecuentemente hay gritos, insultos o agresiones", 2),
+    (1, "Me siento incómodo/a o inseguro/a en casa", 3),
+
+    # Pregunta 2 - Miedo, humillación, culpa
+    (2, "No, nunca", 0),
+    (2, "A veces, pero no sé si es normal", 1),
+    (2, "Sí, con frecuencia", 2),
+    (2, "Sí, siempre", 3),
+
+    # Pregunta 3 - Miedo con gestos
+    (3, "No, nunca", 0),
+    (3, "A veces", 1),
+    (3, "Sí, frecuentemente", 2),
+    (3, "Sí, constantemente", 3),
+
+    # Pregunta 4 - A quién acudir
+    (4, "A un amigo/familiar de confianza", 0),
+    (4, "A un profesional de salud, asistente social o Carabineros", 1),
+    (4, "No sabría qué hacer", 2),
+    (4, "No tengo a quién acudir", 3),
+
+    # Pregunta 5 - Agresión física
+    (5, "No, nunca", 0),
+    (5, "Una vez, en una situación puntual", 1),
+    (5, "Varias veces", 2),
+    (5, "Sí, actualmente ocurre", 3),
+
+    # Pregunta 6 - Presenciar violencia
+    (6, "No", 0),
+    (6, "Sí, una vez", 1),
+    (6, "Varias veces", 2),
+    (6, "Sí, recientemente", 3)
+]
+
+TABLAS_SQLITE = [
+    '''
+    CREATE TABLE IF NOT EXISTS questions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        texto TEXT NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS options (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        pregunta_id INTEGER,
+        texto TEXT NOT NULL,
+        puntaje INTEGER NOT NULL DEFAULT 0,
+        FOREIGN KEY (pregunta_id) REFERENCES questions (id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre TEXT NOT NULL,
+        email TEXT NOT NULL,
+        edad INTEGER NOT NULL,
+        sexo TEXT NOT NULL,
+        puntaje_total INTEGER DEFAULT 0,
+        clasificacion TEXT DEFAULT 'leve',
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS responses (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        pregunta_id INTEGER,
+        respuesta INTEGER,
+        puntaje INTEGER DEFAULT 0,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id),
+        FOREIGN KEY (pregunta_id) REFERENCES questions (id),
+        FOREIGN KEY (respuesta) REFERENCES options (id)
+    )
+    ''',
+]
+
+TABLAS_POSTGRES = [
+    '''
+    CREATE TABLE IF NOT EXISTS questions (
+        id SERIAL PRIMARY KEY,
+        texto TEXT NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS options (
+        id SERIAL PRIMARY KEY,
+        pregunta_id INTEGER REFERENCES questions(id) ON DELETE CASCADE,
+        texto TEXT NOT NULL,
+        puntaje INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        id SERIAL PRIMARY KEY,
+        nombre VARCHAR(255) NOT NULL,
+        email VARCHAR(255) NOT NULL,
+        edad INTEGER NOT NULL,
+        sexo VARCHAR(50) NOT NULL,
+        puntaje_total INTEGER DEFAULT 0,
+        clasificacion VARCHAR(50) DEFAULT 'leve',
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS responses (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+        pregunta_id INTEGER REFERENCES questions(id) ON DELETE CASCADE,
+        respuesta INTEGER REFERENCES options(id) ON DELETE CASCADE,
+        puntaje INTEGER DEFAULT 0,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+]
+
+
+# Las migraciones son idempotentes (IF NOT EXISTS, semillas solo en tablas
+# vacías): una base creada antes de schema_version las recorre sin cambios
+
+def _tablas_base(cur, use_sqlite):
+    for ddl in TABLAS_SQLITE if use_sqlite else TABLAS_POSTGRES:
+        cur.execute(ddl)
+    crear_tabla_version(cur)
+
+
+def _cuestionario_inicial(cur, use_sqlite):
+    placeholder = '?' if use_sqlite else '%s'
+    cur.execute("SELECT COUNT(*) FROM questions")
+    if cur.fetchone()[0] == 0:
+        cur.executemany(f"INSERT INTO questions (texto) VALUES ({placeholder})",
+                        [(texto,) for texto in PREGUNTAS])
+        cur.executemany(f"INSERT INTO options (pregunta_id, texto, puntaje) "
+                        f"VALUES ({placeholder}, {placeholder}, {placeholder})", OPCIONES)
+        marcar_version(cur, placeholder)
+    elif leer_version(cur) is None:
+        # Cuestionario de una base anterior al sello de versión
+        marcar_version(cur, placeholder)
+
+
+def _contadores_dashboard(cur, use_sqlite):
+    estadisticas.crear_tablas(cur)
+    # Se calculan desde los datos existentes la primera vez
+    if estadisticas.tablas_vacias(cur):
+        estadisticas.reconstruir(cur)
+
+
+def _indices(cur, use_sqlite):
+    crear_indices(cur, concurrente=not use_sqlite)
+
+
+# (versión, nombre, función): solo se agregan al final, nunca se editan las aplicadas
+MIGRACIONES = (
+    (1, 'tablas_base', _tablas_base),
+    (2, 'cuestionario_inicial', _cuestionario_inicial),
+    (3, 'contadores_dashboard', _contadores_dashboard),
+    (4, 'indices', _indices),
+)
+
+VERSION_ESQUEMA = MIGRACIONES[-1][0]
+
+# En PostgreSQL corren en autocommit (CREATE INDEX CONCURRENTLY no admite
+# transacciones) con el advisory lock de sesión en vez del de transacción
+FUERA_DE_TRANSACCION = {'indices'}
+
+
+def _crear_tabla_schema_version(cur):
+    """Misma DDL en SQLite y PostgreSQL"""
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            nombre TEXT NOT NULL,
+            aplicada TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _version_registrada(cur):
+    cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    return cur.fetchone()[0]
+
+
+def version_actual(cur, use_sqlite):
+    """Versión del esquema (0 si la base no tiene schema_version)"""
+    if use_sqlite:
+        cur.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'")
+    else:
+        cur.execute("SELECT to_regclass('schema_version')")
+    fila = cur.fetchone()
+    if not fila or fila[0] is None:
+        return 0
+    return _version_registrada(cur)
+
+
+def _bloquear(cur, use_sqlite, sesion=False):
+    """Abrir la transacción de una migración con el bloqueo entre procesos tomado"""
+    if use_sqlite:
+        # Reserva la escritura del archivo: otro proceso espera (busy timeout) o falla
+        cur.execute("BEGIN IMMEDIATE")
+        return
+    # El de transacción se libera solo al terminar (commit o rollback); el de sesión
+    # con pg_advisory_unlock. Se reintenta en vez de esperar dentro del servidor: un
+    # proceso bloqueado ahí retiene su snapshot y el CREATE INDEX CONCURRENTLY de
+    # quien migra esperaría por él
+    funcion = 'pg_try_advisory_lock' if sesion else 'pg_try_advisory_xact_lock'
+    while True:
+        cur.execute(f"SELECT {funcion}(%s)", (CLAVE_BLOQUEO,))
+        if cur.fetchone()[0]:
+            return
+        time.sleep(ESPERA_BLOQUEO_SEG)
+
+
+def _aplicar(conn, cur, use_sqlite, version, nombre, aplicar):
+    """Una migración en su transacción; ms que tomó o None si otro proceso ya la aplicó"""
+    placeholder = '?' if use_sqlite else '%s'
+    _bloquear(cur, use_sqlite)
+    try:
+        _crear_tabla_schema_version(cur)
+        # Releer con el bloqueo tomado: otro proceso pudo aplicarla mientras esperábamos
+        if _version_registrada(cur) >= version:
+            conn.rollback()
+            return None
+        inicio = time.perf_counter()
+        aplicar(cur, use_sqlite)
+        cur.execute(f"INSERT INTO schema_version (version, nombre) VALUES ({placeholder}, {placeholder})",
+                    (version, nombre))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return (time.perf_counter() - inicio) * 1000
+
+
+def _aplicar_sin_transaccion(conn, cur, version, nombre, aplicar):
+    """
+    PostgreSQL en autocommit: cada sentencia confirma por su cuenta, así que la
+    migración tiene que ser idempotente (IF NOT EXISTS) por si se corta a la mitad
+    """
+    conn.autocommit = True
+    try:
+        _bloquear(cur, False, sesion=True)
+        try:
+            _crear_tabla_schema_version(cur)
+            if _version_registrada(cur) >= version:
+                return None
+            inicio = time.perf_counter()
+            aplicar(cur, False)
+            cur.execute("INSERT INTO schema_version (version, nombre) VALUES (%s, %s)", (version, nombre))
+            return (time.perf_counter() - inicio) * 1000
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (CLAVE_BLOQUEO,))
+    finally:
+        conn.autocommit = False
+
+
+def migrar(conn, use_sqlite):
+    """
+    Aplicar las migraciones pendientes. La conexión no debe tener una transacción
+    abierta. Devuelve [(versión, nombre)] de las aplicadas por este proceso.
+    """
+    aplicadas = []
+    cur = conn.cursor()
+    if use_sqlite:
+        cur.execute("PRAGMA busy_timeout")
+        espera_original = cur.fetchone()[0]
+        cur.execute(f"PRAGMA busy_timeout = {ESPERA_SQLITE_MS}")
+    try:
+        for version, nombre, aplicar in MIGRACIONES:
+            if use_sqlite or nombre not in FUERA_DE_TRANSACCION:
+                ms = _aplicar(conn, cur, use_sqlite, version, nombre, aplicar)
+            else:
+                ms = _aplicar_sin_transaccion(conn, cur, version, nombre, aplicar)
+            if ms is None:
+                continue
+            aplicadas.append((version, nombre))
+            print(f"🛠️ Migración {version} ({nombre}) aplicada en {ms:.0f} ms")
+    finally:
+        if use_sqlite:
+            cur.execute(f"PRAGMA busy_timeout = {int(espera_original)}")
+        cur.close()
+    return aplicadas
+
+
+def asegurar_esquema(obtener_conexion, use_sqlite, auto=True):
+    """
+    Chequeo de arranque de cada worker: una lectura de la versión. Si el esquema
+    está atrasado migra (auto) o lanza RuntimeError. Devuelve las migraciones aplicadas.
+    """
+    conn = obtener_conexion()
+    try:
+        cur = conn.cursor()
+        try:
+            version = version_actual(cur, use_sqlite)
+        finally:
+            cur.close()
+        conn.rollback()
+        if version >= VERSION_ESQUEMA:
+            return []
+        if not auto:
+            raise RuntimeError(f"Esquema en versión {version}, se requiere {VERSION_ESQUEMA}: "
+                               "ejecuta python migraciones.py")
+        return migrar(conn, use_sqlite)
+    finally:
+        conn.close()
+
+
+def conectar():
+    """Conexión directa según DATABASE_URL (sin importar app.py ni abrir su pool)"""
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        import sqlite3
+        return sqlite3.connect('survey_local.db'), True
+    import psycopg2
+    if database_url.startswith('postgres://'):
+        database_url = database_url.replace('postgres://', 'postgresql://', 1)
+    return psycopg2.connect(database_url), False
+
+
+def main(argv):
+    conn, use_sqlite = conectar()
+    try:
+        cur = conn.cursor()
+        version = version_actual(cur, use_sqlite)
+        cur.close()
+        conn.rollback()
+        pendientes = [(v, nombre) for v, nombre, _ in MIGRACIONES if v > version]
+        if '--estado' in argv:
+            print(f"📋 Esquema en versión {version} de {VERSION_ESQUEMA}")
+            for v, nombre in pendientes:
+                print(f"   pendiente: {v} ({nombre})")
+            return 1 if pendientes else 0
+        aplicadas = migrar(conn, use_sqlite)
+        print(f"✅ Esquema en versión {VERSION_ESQUEMA} ({len(aplicadas)} migraciones aplicadas)")
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
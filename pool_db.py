@@ -0,0 +1,410 @@
+"""
+Pool de conexiones por worker
+- PostgreSQL: pool thread-safe con tamaño mínimo/máximo, timeout de espera,
+  chequeo de salud al prestar y reciclaje tras N usos
+- SQLite: una conexión reutilizada por hilo y un solo escritor a la vez por
+  proceso. En modo producción (SQLITE_MODO=produccion) las conexiones usan WAL:
+  las lecturas no esperan a las escrituras y los workers se turnan para escribir
+  con busy_timeout en vez de fallar con "database is locked"
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+import metricas
+
+
+class PoolAgotado(Exception):
+    """No se obtuvo una conexión dentro del timeout configurado"""
+
+
+class ConexionPool:
+    """Envoltura de una conexión prestada: close() la devuelve al pool"""
+
+    def __init__(self, pool, conn):
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_conn', conn)
+
+    def __getattr__(self, name):
+        conn = object.__getattribute__(self, '_conn')
+        if conn is None:
+            raise RuntimeError("La conexión ya fue devuelta al pool")
+        return getattr(conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    @property
+    def raw(self):
+        return object.__getattribute__(self, '_conn')
+
+    def close(self):
+        conn = object.__getattribute__(self, '_conn')
+        if conn is None:
+            return
+        object.__setattr__(self, '_conn', None)
+        self._pool.liberar(conn)
+
+    def __del__(self):
+        # Evita fugas si un handler olvida cerrar la conexión
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class _Entrada:
+    __slots__ = ('conn', 'usos', 'ultimo_uso')
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.usos = 0
+        self.ultimo_uso = time.monotonic()
+
+
+class PoolPostgres:
+    """Pool de conexiones psycopg2 para un proceso (worker de gunicorn)"""
+
+    def __init__(self, dsn, minimo=1, maximo=10, timeout=5.0, max_usos=1000,
+                 chequeo_inactividad=30.0):
+        self.dsn = dsn
+        self.minimo = minimo
+        self.maximo = max(maximo, minimo, 1)
+        self.timeout = timeout
+        self.max_usos = max_usos
+        self.chequeo_inactividad = chequeo_inactividad
+        self._cond = threading.Condition()
+        self._reiniciar_estado()
+
+    def es_transitorio(self, error):
+        """Error de conexión (no del dato): vale la pena reintentar la misma escritura"""
+        import psycopg2
+        return isinstance(error, (PoolAgotado, psycopg2.OperationalError, psycopg2.InterfaceError))
+
+    def _reiniciar_estado(self):
+        self._pid = os.getpid()
+        self._inactivas = []
+        self._prestadas = {}
+        self._total = 0
+        self._stats = {
+            'checkouts': 0,
+            'creadas': 0,
+            'recicladas': 0,
+            'descartadas': 0,
+            'esperas': 0,
+            'espera_total_ms': 0.0,
+            'espera_max_ms': 0.0,
+            'timeouts': 0,
+        }
+
+    def _verificar_fork(self):
+        # Tras un fork (gunicorn --preload) las conexiones heredadas pertenecen
+        # al proceso padre: se conservan sin cerrarlas y se empieza de cero
+        if self._pid != os.getpid():
+            huerfanas = [e.conn for e in self._inactivas] + list(self._prestadas)
+            self._reiniciar_estado()
+            self._huerfanas = huerfanas
+
+    def _conectar(self):
+        # Se llama sin el lock: quien llama cuenta 'creadas' al volver a tomarlo
+        import psycopg2
+        return _Entrada(psycopg2.connect(self.dsn))
+
+    def _esta_sana(self, entrada):
+        """SELECT 1 sobre una conexión inactiva; se llama sin el lock (es un viaje a la base)"""
+        try:
+            cur = entrada.conn.cursor()
+            cur.execute("SELECT 1")
+            cur.fetchone()
+            cur.close()
+            entrada.conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _descartar(self, entrada):
+        try:
+            entrada.conn.close()
+        except Exception:
+            pass
+
+    def _precalentar(self):
+        while self._total < self.minimo:
+            self._total += 1
+            try:
+                entrada = self._conectar()
+            except Exception:
+                self._total -= 1
+                raise
+            self._stats['creadas'] += 1
+            self._inactivas.append(entrada)
+
+    def obtener(self):
+        inicio = time.monotonic()
+        limite = inicio + self.timeout
+        espero = False
+        with self._cond:
+            self._verificar_fork()
+            if self._total == 0 and self.minimo > 0:
+                self._precalentar()
+            while True:
+                entrada = None
+                if self._inactivas:
+                    entrada = self._inactivas.pop()
+                elif self._total < self.maximo:
+                    self._total += 1
+                    try:
+                        self._cond.release()
+                        try:
+                            entrada = self._conectar()
+                        finally:
+                            self._cond.acquire()
+                    except Exception:
+                        self._total -= 1
+                        self._cond.notify()
+                        raise
+                    self._stats['creadas'] += 1
+                else:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolAgotado(
+                            f"Sin conexiones libres tras {self.timeout}s "
+                            f"({self._total}/{self.maximo} en uso)")
+                    espero = True
+                    self._cond.wait(restante)
+                    continue
+
+                sana = not entrada.conn.closed
+                if sana and time.monotonic() - entrada.ultimo_uso >= self.chequeo_inactividad:
+                    # La entrada ya es de este hilo: el chequeo va sin el lock para que un
+                    # servidor lento no frene los préstamos y devoluciones de los demás
+                    self._cond.release()
+                    try:
+                        sana = self._esta_sana(entrada)
+                    finally:
+                        self._cond.acquire()
+                if not sana:
+                    self._stats['descartadas'] += 1
+                    self._total -= 1
+                    self._descartar(entrada)
+                    # Hay lugar para una conexión nueva: despertar a quien espera
+                    self._cond.notify()
+                    continue
+
+                self._prestadas[entrada.conn] = entrada
+                self._stats['checkouts'] += 1
+                if espero:
+                    espera_ms = (time.monotonic() - inicio) * 1000
+                    self._stats['esperas'] += 1
+                    self._stats['espera_total_ms'] += espera_ms
+                    self._stats['espera_max_ms'] = max(self._stats['espera_max_ms'], espera_ms)
+                metricas.ESPERA_CONEXION.observar(time.monotonic() - inicio)
+                return ConexionPool(self, entrada.conn)
+
+    def liberar(self, conn):
+        from psycopg2 import extensions
+
+        with self._cond:
+            prestada = conn in self._prestadas
+        if not prestada:
+            # Conexión de otro proceso (fork) o ya liberada
+            return
+        # Sigue prestada a este hilo: el rollback (un viaje a la base) va sin el lock
+        reutilizable = not conn.closed
+        if reutilizable and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except Exception:
+                reutilizable = False
+
+        with self._cond:
+            entrada = self._prestadas.pop(conn, None)
+            if entrada is None:
+                return
+            entrada.usos += 1
+            entrada.ultimo_uso = time.monotonic()
+            if not reutilizable:
+                self._stats['descartadas'] += 1
+            elif entrada.usos >= self.max_usos:
+                self._stats['recicladas'] += 1
+                reutilizable = False
+
+            if reutilizable:
+                self._inactivas.append(entrada)
+            else:
+                self._total -= 1
+                self._descartar(entrada)
+            self._cond.notify()
+
+    def escritura(self):
+        """PostgreSQL admite escritores concurrentes: no hace falta turno"""
+        return nullcontext()
+
+    def estadisticas(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'tipo': 'postgresql',
+                'en_uso': len(self._prestadas),
+                'inactivas': len(self._inactivas),
+                'total': self._total,
+                'minimo': self.minimo,
+                'maximo': self.maximo,
+                'espera_promedio_ms': round(
+                    stats['espera_total_ms'] / stats['esperas'], 3) if stats['esperas'] else 0.0,
+            })
+            stats['espera_total_ms'] = round(stats['espera_total_ms'], 3)
+            stats['espera_max_ms'] = round(stats['espera_max_ms'], 3)
+            return stats
+
+    def cerrar(self):
+        with self._cond:
+            for entrada in self._inactivas:
+                self._descartar(entrada)
+            self._total -= len(self._inactivas)
+            self._inactivas = []
+
+
+class PoolSQLite:
+    """Reutiliza una conexión SQLite por hilo; las escrituras del proceso van de a una"""
+
+    def __init__(self, ruta, pragmas=(), busy_timeout=5.0):
+        self.ruta = ruta
+        self.pragmas = tuple(pragmas)
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._escritor = threading.Lock()
+        self._pid = os.getpid()
+        self._stats = {'checkouts': 0, 'creadas': 0, 'en_uso': 0,
+                       'escrituras': 0, 'espera_escritura_total_ms': 0.0, 'espera_escritura_max_ms': 0.0}
+
+    def _conectar(self):
+        # timeout = busy_timeout: si otro proceso escribe, esperar el bloqueo en vez de fallar
+        conn = sqlite3.connect(self.ruta, timeout=self.busy_timeout)
+        conn.row_factory = sqlite3.Row
+        for pragma in self.pragmas:
+            conn.execute(f"PRAGMA {pragma}")
+        with self._lock:
+            self._stats['creadas'] += 1
+        return conn
+
+    @staticmethod
+    def es_transitorio(error):
+        """
+        Solo base bloqueada u ocupada vale la pena reintentar. Otros OperationalError
+        ("no such table", "no such column") son del esquema o del dato y no se
+        arreglan esperando
+        """
+        if isinstance(error, PoolAgotado):
+            return True
+        if not isinstance(error, sqlite3.OperationalError):
+            return False
+        codigo = getattr(error, 'sqlite_errorcode', None)
+        if codigo is not None:
+            # Los códigos extendidos (SQLITE_BUSY_SNAPSHOT...) llevan el básico en el byte bajo
+            return codigo & 0xff in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+        mensaje = str(error).lower()
+        return 'locked' in mensaje or 'busy' in mensaje
+
+    @contextmanager
+    def escritura(self):
+        """
+        Turno de escritura del proceso: SQLite admite un escritor por base, así que
+        los hilos esperan aquí en orden en vez de reintentar el bloqueo del archivo
+        (solo compiten por él los demás workers)
+        """
+        inicio = time.monotonic()
+        with self._escritor:
+            espera = (time.monotonic() - inicio) * 1000
+            with self._lock:
+                self._stats['escrituras'] += 1
+                self._stats['espera_escritura_total_ms'] += espera
+                self._stats['espera_escritura_max_ms'] = max(self._stats['espera_escritura_max_ms'], espera)
+            yield
+
+    def obtener(self):
+        inicio = time.monotonic()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = self._conectar()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        metricas.ESPERA_CONEXION.observar(time.monotonic() - inicio)
+        if getattr(self._local, 'prestada', False):
+            # Préstamo anidado en el mismo hilo: conexión propia y temporal
+            return ConexionPool(self, self._conectar())
+        self._local.prestada = True
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._stats['en_uso'] += 1
+        return ConexionPool(self, conn)
+
+    def liberar(self, conn):
+        if conn is not getattr(self._local, 'conn', None):
+            conn.close()
+            return
+        if conn.in_transaction:
+            conn.rollback()
+        self._local.prestada = False
+        with self._lock:
+            self._stats['en_uso'] -= 1
+
+    def estadisticas(self):
+        with self._lock:
+            stats = dict(self._stats)
+        escrituras = stats['escrituras']
+        stats.update({
+            'tipo': 'sqlite',
+            'modo': 'produccion' if self.pragmas else 'desarrollo',
+            'espera_promedio_ms': 0.0,
+            'timeouts': 0,
+            'espera_escritura_promedio_ms': round(stats.pop('espera_escritura_total_ms') / escrituras, 3)
+            if escrituras else 0.0,
+            'espera_escritura_max_ms': round(stats['espera_escritura_max_ms'], 3),
+        })
+        return stats
+
+    def cerrar(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def pragmas_sqlite():
+    """
+    PRAGMAs de cada conexión según SQLITE_MODO. En producción:
+    - WAL: los lectores leen la última versión confirmada mientras alguien escribe
+    - synchronous=NORMAL: con WAL no corrompe la base ante un corte; a lo sumo se
+      pierden las últimas transacciones si se cae el sistema operativo
+    - caché y mmap por conexión (en KB y MB) y un tope para el archivo -wal
+    """
+    if os.environ.get('SQLITE_MODO', 'desarrollo') != 'produccion':
+        return ()
+    return (
+        'journal_mode = WAL',
+        f"synchronous = {os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')}",
+        f"cache_size = -{int(os.environ.get('SQLITE_CACHE_KB', 65536))}",
+        f"mmap_size = {int(os.environ.get('SQLITE_MMAP_MB', 256)) * 1024 * 1024}",
+        'temp_store = MEMORY',
+        f"journal_size_limit = {64 * 1024 * 1024}",
+    )
+
+
+def crear_pool(database_url, use_sqlite, ruta_sqlite='survey_local.db'):
+    """Crear el pool del proceso según la configuración del entorno"""
+    if use_sqlite:
+        return PoolSQLite(ruta_sqlite, pragmas=pragmas_sqlite(),
+                          busy_timeout=int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)) / 1000)
+    return PoolPostgres(
+        database_url,
+        minimo=int(os.environ.get('DB_POOL_MIN', 1)),
+        maximo=int(os.environ.get('DB_POOL_MAX', 10)),
+        timeout=float(os.environ.get('DB_POOL_TIMEOUT', 5)),
+        max_usos=int(os.environ.get('DB_POOL_MAX_USOS', 1000)),
+        chequeo_inactividad=float(os.environ.get('DB_POOL_CHEQUEO_SEG', 30)),
+    )
@@ -0,0 +1,320 @@
+"""
+Repositorio: las sentencias calientes detrás de una llamada por operación
+(catálogo, envíos con sus contadores, importación masiva, versión de datos y
+lecturas del dashboard), con una implementación por dialecto. Cada operación toma una
+conexión del pool, ejecuta y confirma; los handlers no ven SQL ni marcadores.
+- PostgreSQL: cada sentencia se prepara (PREPARE) una vez por conexión del pool
+  y después solo se ejecuta (EXECUTE), sin volver a parsear ni planificar
+- SQLite: cada sentencia es un texto constante, así la caché de sentencias de
+  la conexión de cada hilo la reutiliza ya compilada
+Llamadas y tiempos acumulados por sentencia en estadisticas() (/api/debug); las
+que superan el umbral van al registro de consultas lentas (consultas_lentas.py).
+"""
+import os
+import re
+import threading
+import time
+import weakref
+import zlib
+from contextlib import contextmanager
+from functools import lru_cache
+
+import escritura
+import estadisticas
+import metricas
+from catalogo import CONSULTA_OPCIONES, CONSULTA_PREGUNTAS, CONSULTA_VERSION, Catalogo
+
+
+@lru_cache(maxsize=256)
+def marcadores_postgres(sql):
+    """'%s' -> '$n' (el SQL del repo no usa % literales)"""
+    contador = iter(range(1, 10000))
+    return re.sub(r'%s', lambda m: f"${next(contador)}", sql)
+
+
+@lru_cache(maxsize=256)
+def _sentencia_preparada(sql):
+    """(nombre, PREPARE, EXECUTE con marcadores %s) para un texto SQL"""
+    nombre = f"repo_{zlib.crc32(sql.encode()):08x}"
+    # Los argumentos de EXECUTE llevan el mismo cast que el marcador original
+    # (ARRAY['25'] no se convierte solo a int[] como sí lo hace '25' a int)
+    argumentos = [m.group(0) for m in re.finditer(r'%s(?:::\w+(?:\[\])?)?', sql)]
+    ejecutar = f"EXECUTE {nombre}" + (f"({', '.join(argumentos)})" if argumentos else '')
+    return nombre, f"PREPARE {nombre} AS {marcadores_postgres(sql)}", ejecutar
+
+
+class Repositorio:
+    """Operaciones comunes; cada dialecto define cómo se ejecuta una sentencia y cómo se inserta"""
+
+    sqlite = None
+
+    def __init__(self, pool, lentas=None):
+        self.pool = pool
+        # RegistroConsultasLentas (consultas_lentas.py) o None
+        self.lentas = lentas
+        self._lock = threading.Lock()
+        self._tiempos = {}
+
+    @contextmanager
+    def _cursor(self):
+        conn = self.pool.obtener()
+        cur = conn.cursor()
+        try:
+            yield conn, cur
+        finally:
+            cur.close()
+            conn.close()
+
+    def _ejecutar_sql(self, conn, cur, sql, parametros):
+        raise NotImplementedError
+
+    def _ejecutar(self, conn, cur, nombre, sql, parametros=(), resultado=None):
+        """Ejecutar y leer el resultado ('filas', 'fila' o nada) midiendo ambos pasos"""
+        inicio = time.perf_counter()
+        try:
+            self._ejecutar_sql(conn, cur, sql, parametros)
+            if resultado == 'filas':
+                filas = cur.fetchall()
+            elif resultado == 'fila':
+                filas = cur.fetchone()
+            else:
+                filas = None
+        except Exception:
+            # Sin conexión: no se pide el plan sobre una transacción con error
+            self._medir(nombre, inicio, sql=sql, parametros=parametros)
+            raise
+        self._medir(nombre, inicio, conn, sql, parametros)
+        return filas
+
+    def _ejecutar_muchos(self, conn, cur, nombre, sql, filas):
+        inicio = time.perf_counter()
+        try:
+            cur.executemany(sql, filas)
+        except Exception:
+            self._medir(nombre, inicio, sql=sql, parametros=filas[0] if filas else None, filas=len(filas))
+            raise
+        self._medir(nombre, inicio, conn, sql, filas[0] if filas else None, len(filas))
+
+    def _medir(self, nombre, inicio, conn=None, sql=None, parametros=None, filas=None):
+        segundos = time.perf_counter() - inicio
+        metricas.registrar_consulta(segundos)
+        ms = segundos * 1000
+        with self._lock:
+            tiempo = self._tiempos.get(nombre)
+            if tiempo is None:
+                tiempo = self._tiempos[nombre] = [0, 0.0, 0.0]
+            tiempo[0] += 1
+            tiempo[1] += ms
+            tiempo[2] = max(tiempo[2], ms)
+        if self.lentas is not None and ms >= self.lentas.umbral_ms:
+            self.lentas.observar(nombre, ms, conn, sql, parametros, filas, self.sqlite)
+
+    def _insertar(self, conn, cur, envios):
+        raise NotImplementedError
+
+    def _importar(self, conn, cur, envios, revisar_fk):
+        raise NotImplementedError
+
+    # --- Operaciones ---
+
+    def catalogo_vigente(self, actual=None):
+        """`actual` si su sello de versión sigue vigente; si no, el catálogo recién leído"""
+        with self._cursor() as (conn, cur):
+            fila = self._ejecutar(conn, cur, 'version_catalogo', CONSULTA_VERSION, resultado='fila')
+            version = fila[0] if fila else None
+            if actual is not None and version == actual.version:
+                return actual
+            preguntas = self._ejecutar(conn, cur, 'preguntas', CONSULTA_PREGUNTAS, resultado='filas')
+            opciones = self._ejecutar(conn, cur, 'opciones', CONSULTA_OPCIONES, resultado='filas')
+            return Catalogo.desde_filas(version, preguntas, opciones)
+
+    def guardar_encuestas(self, envios):
+        """Usuarios, respuestas y contadores de uno o más envíos en una transacción; devuelve los ids"""
+        # En SQLite, un escritor a la vez por proceso (pool.escritura)
+        with self.pool.escritura(), self._cursor() as (conn, cur):
+            try:
+                user_ids = self._insertar(conn, cur, envios)
+                conn.commit()
+                return user_ids
+            except Exception:
+                conn.rollback()
+                raise
+
+    def importar_encuestas(self, envios, revisar_fk=True):
+        """
+        Como guardar_encuestas pero con carga masiva (importación de CSV); devuelve los ids.
+        revisar_fk=False omite los disparadores de claves foráneas en PostgreSQL (requiere
+        superusuario): las opciones ya se validaron contra el catálogo y los ids son propios.
+        """
+        with self.pool.escritura(), self._cursor() as (conn, cur):
+            try:
+                user_ids = self._importar(conn, cur, envios, revisar_fk)
+                conn.commit()
+                return user_ids
+            except Exception:
+                conn.rollback()
+                raise
+
+    def version_datos(self):
+        with self._cursor() as (conn, cur):
+            fila = self._ejecutar(conn, cur, 'version_datos', estadisticas.CONSULTA_VERSION, resultado='fila')
+        return fila[0] if fila else 0
+
+    def leer_contadores(self):
+        with self._cursor() as (conn, cur):
+            filas = self._ejecutar(conn, cur, 'contadores', estadisticas.CONSULTA_CONTADORES, resultado='filas')
+        return estadisticas.armar_contadores(filas)
+
+    def leer_dashboard(self, desde=None, hasta=None):
+        """Contexto del dashboard desde los contadores; con rango, desde los rollups diarios"""
+        sql, parametros = estadisticas.consulta_dashboard(desde, hasta, self.sqlite)
+        nombre = 'dashboard_periodo' if parametros else 'dashboard'
+        with self._cursor() as (conn, cur):
+            filas = self._ejecutar(conn, cur, nombre, sql, parametros, resultado='filas')
+        return estadisticas.contexto_dashboard(filas)
+
+    def leer_series(self, desde, hasta, granularidad=None):
+        """Volumen de envíos y mezcla de riesgo por hora o por día"""
+        sql, parametros, serie = estadisticas.consulta_series(desde, hasta, granularidad, self.sqlite)
+        with self._cursor() as (conn, cur):
+            filas = self._ejecutar(conn, cur, 'series', sql, parametros, resultado='filas')
+        return estadisticas.armar_series(serie, filas)
+
+    def estadisticas(self):
+        with self._lock:
+            tiempos = {nombre: list(valores) for nombre, valores in self._tiempos.items()}
+        return {
+            nombre: {
+                'llamadas': llamadas,
+                'total_ms': round(total, 1),
+                'promedio_ms': round(total / llamadas, 3) if llamadas else 0.0,
+                'max_ms': round(maximo, 3),
+            }
+            for nombre, (llamadas, total, maximo) in sorted(tiempos.items())
+        }
+
+
+class RepositorioSQLite(Repositorio):
+    sqlite = True
+
+    def _ejecutar_sql(self, conn, cur, sql, parametros):
+        cur.execute(sql, parametros)
+
+    def _insertar(self, conn, cur, envios):
+        user_ids = []
+        filas = []
+        for envio in envios:
+            self._ejecutar(conn, cur, 'insertar_usuario', escritura.INSERTAR_USUARIO_SQLITE,
+                           escritura.parametros_usuario(envio))
+            user_ids.append(cur.lastrowid)
+            filas.extend(escritura.filas_respuestas(cur.lastrowid, envio))
+        self._ejecutar_muchos(conn, cur, 'insertar_respuestas', escritura.INSERTAR_RESPUESTAS_SQLITE, filas)
+        # Contadores del dashboard en la misma transacción
+        for tabla, sql, parametros in estadisticas.sentencias_registro(envios, True):
+            self._ejecutar_muchos(conn, cur, f'registrar_{tabla}', sql, parametros)
+        return user_ids
+
+    def _importar(self, conn, cur, envios, revisar_fk):
+        # SQLite no revisa claves foráneas (PRAGMA foreign_keys desactivado).
+        # Con el bloqueo de escritura tomado, los ids siguientes al máximo son nuestros
+        if not conn.in_transaction:
+            cur.execute("BEGIN IMMEDIATE")
+        fila = self._ejecutar(conn, cur, 'ultimo_id', "SELECT COALESCE(MAX(id), 0) FROM users", resultado='fila')
+        user_ids = list(range(fila[0] + 1, fila[0] + 1 + len(envios)))
+        usuarios = []
+        respuestas = []
+        for user_id, envio in zip(user_ids, envios):
+            # Fecha a texto una vez por encuesta (el adaptador de sqlite3 lo haría en cada fila)
+            envio = envio._replace(timestamp=envio.timestamp.isoformat(sep=' '))
+            usuarios.append((user_id,) + escritura.parametros_usuario(envio))
+            respuestas.extend(escritura.filas_respuestas(user_id, envio))
+        self._ejecutar_muchos(conn, cur, 'importar_usuarios', escritura.INSERTAR_USUARIO_CON_ID_SQLITE, usuarios)
+        self._ejecutar_muchos(conn, cur, 'importar_respuestas', escritura.INSERTAR_RESPUESTAS_SQLITE, respuestas)
+        for tabla, sql, parametros in estadisticas.sentencias_registro(envios, True):
+            self._ejecutar_muchos(conn, cur, f'registrar_{tabla}', sql, parametros)
+        return user_ids
+
+
+class RepositorioPostgres(Repositorio):
+    sqlite = False
+
+    def __init__(self, pool, preparar=True, lentas=None):
+        super().__init__(pool, lentas)
+        self.preparar = preparar
+        # Conexión física -> nombres ya preparados en esa sesión (se van con la conexión)
+        self._preparadas = weakref.WeakKeyDictionary()
+        self._preparaciones = 0
+
+    def _ejecutar_sql(self, conn, cur, sql, parametros):
+        if not self.preparar:
+            cur.execute(sql, parametros)
+            return
+        nombre, preparar, ejecutar = _sentencia_preparada(sql)
+        fisica = getattr(conn, 'raw', conn)
+        preparadas = self._preparadas.get(fisica)
+        if preparadas is None:
+            with self._lock:
+                preparadas = self._preparadas.setdefault(fisica, set())
+        if nombre not in preparadas:
+            # PREPARE dura toda la sesión aunque la transacción termine en rollback
+            cur.execute(preparar)
+            preparadas.add(nombre)
+            with self._lock:
+                self._preparaciones += 1
+        cur.execute(ejecutar, parametros)
+
+    def _insertar(self, conn, cur, envios):
+        if len(envios) == 1:
+            # Usuario, respuestas y contadores en una sola sentencia
+            fila = self._ejecutar(conn, cur, 'insertar_encuesta',
+                                  escritura.INSERTAR_ENCUESTA_CON_CONTADORES_POSTGRES,
+                                  escritura.parametros_encuesta_con_contadores_postgres(envios[0]),
+                                  resultado='fila')
+            return [fila[0]]
+        filas = self._ejecutar(conn, cur, 'reservar_ids', escritura.RESERVAR_IDS_POSTGRES,
+                               (len(envios),), resultado='filas')
+        user_ids = [row[0] for row in filas]
+        self._ejecutar(conn, cur, 'insertar_lote', escritura.INSERTAR_LOTE_POSTGRES,
+                       escritura.parametros_lote_postgres(user_ids, envios))
+        self._ejecutar(conn, cur, 'registrar_stats', estadisticas.REGISTRO_POSTGRES,
+                       estadisticas.parametros_registro_postgres(envios))
+        return user_ids
+
+    def _copiar(self, cur, nombre, sql, filas):
+        inicio = time.perf_counter()
+        try:
+            cur.copy_expert(sql, escritura.texto_copy(filas))
+        finally:
+            # Sin parámetros ni plan: el registro lento solo anota la sentencia y las filas
+            self._medir(nombre, inicio, sql=sql, filas=cur.rowcount)
+
+    def _importar(self, conn, cur, envios, revisar_fk):
+        if not revisar_fk:
+            # LOCAL: vuelve al valor normal al confirmar o revertir el lote
+            cur.execute("SET LOCAL session_replication_role = replica")
+        filas = self._ejecutar(conn, cur, 'reservar_ids', escritura.RESERVAR_IDS_POSTGRES,
+                               (len(envios),), resultado='filas')
+        user_ids = [row[0] for row in filas]
+        self._copiar(cur, 'copiar_usuarios', escritura.COPIAR_USUARIOS_POSTGRES,
+                     escritura.filas_usuarios(user_ids, envios))
+        self._copiar(cur, 'copiar_respuestas', escritura.COPIAR_RESPUESTAS_POSTGRES,
+                     (fila for user_id, envio in zip(user_ids, envios)
+                      for fila in escritura.filas_respuestas(user_id, envio)))
+        self._ejecutar(conn, cur, 'registrar_stats', estadisticas.REGISTRO_POSTGRES,
+                       estadisticas.parametros_registro_postgres(envios))
+        return user_ids
+
+    def estadisticas(self):
+        stats = super().estadisticas()
+        with self._lock:
+            stats['_preparadas'] = {'activo': self.preparar, 'preparaciones': self._preparaciones,
+                                    'conexiones': len(self._preparadas)}
+        return stats
+
+
+def crear_repositorio(pool, use_sqlite, lentas=None):
+    """Repositorio del proceso sobre su pool (DB_SENTENCIAS_PREPARADAS=0 las desactiva)"""
+    if use_sqlite:
+        return RepositorioSQLite(pool, lentas)
+    return RepositorioPostgres(pool, preparar=os.environ.get('DB_SENTENCIAS_PREPARADAS', '1') != '0',
+                               lentas=lentas)
@@ -3,144 +3,40 @@ Script para ejecutar la aplicación localmente sin Railway
 Usa SQLite para desarrollo local
 """
 from flask import Flask, render_template, request, jsonify
-import sqlite3
 import os
-from datetime import datetime
+from datetime import date
 import json
+import estadisticas
+import estaticos
+import migraciones
+from catalogo import CacheCatalogo, RespuestaInvalida, preparar_envio
+from pool_db import crear_pool
+from repositorio import RepositorioSQLite
 
 app = Flask(__name__)
+estaticos.registrar(app)
+
+# Una conexión SQLite por hilo, reutilizada: su caché de sentencias se mantiene caliente
+db_pool = crear_pool('sqlite:///survey_local.db', True)
 
 def get_db_connection():
-    """Conexión a SQLite local"""
-    conn = sqlite3.connect('survey_local.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Conexión a SQLite local (conn.close() la devuelve al pool)"""
+    return db_pool.obtener()
+
+# Las mismas sentencias y operaciones que app.py
+repositorio = RepositorioSQLite(db_pool)
+
+# Catálogo de preguntas/opciones en memoria (puntajes y validación sin consultas)
+catalogo = CacheCatalogo(repositorio)
 
 def init_db():
-    """Inicializar base de datos SQLite local"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
+    """Verificar la versión del esquema de la base local; migrar si está atrasado"""
     try:
-        print("📝 Creando base de datos para detección de violencia intrafamiliar...")
-        
-        # Crear tablas
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS questions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                texto TEXT NOT NULL
-            )
-        ''')
-        
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS options (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                pregunta_id INTEGER,
-                texto TEXT NOT NULL,
-                puntaje INTEGER NOT NULL DEFAULT 0,
-                FOREIGN KEY (pregunta_id) REFERENCES questions (id)
-            )
-        ''')
-        
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nombre TEXT NOT NULL,
-                email TEXT NOT NULL,
-                edad INTEGER NOT NULL,
-                sexo TEXT NOT NULL,
-                puntaje_total INTEGER DEFAULT 0,
-                clasificacion TEXT DEFAULT 'leve',
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS responses (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                pregunta_id INTEGER,
-                respuesta INTEGER,
-                puntaje INTEGER DEFAULT 0,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id),
-                FOREIGN KEY (pregunta_id) REFERENCES questions (id),
-                FOREIGN KEY (respuesta) REFERENCES options (id)
-            )
-        ''')
-
-        # Verificar si ya hay datos
-        cur.execute("SELECT COUNT(*) FROM questions")
-        count = cur.fetchone()[0]
-        
-        if count == 0:
-            print("📊 Insertando preguntas sobre violencia intrafamiliar...")
-            
-            # Insertar preguntas reales
-            questions = [
-                "¿Cómo describirías el ambiente en tu hogar?",
-                "¿Te han hecho sentir miedo, humillado/a o culpable dentro de tu familia recientemente?",
-                "¿Te han hecho sentir miedo con miradas, gestos o silencios prolongados?",
-                "¿A quién acudirías si te sintieras en peligro dentro de tu hogar?",
-                "¿Alguna vez alguien en tu familia te ha golpeado, empujado o agredido físicamente?",
-                "¿Has presenciado actos de violencia hacia ti u otros miembros de tu familia?"
-            ]
-            
-            for question in questions:
-                cur.execute("INSERT INTO questions (texto) VALUES (?)", (question,))
-            
-            # Insertar opciones con puntajes
-            options = [
-                # Pregunta 1 - Ambiente en el hogar
-                (1, "Tranquilo y de respeto mutuo", 0),
-                (1, "A veces tenso, con discusiones esporádicas", 1),
-                (1, "Frecuentemente hay gritos, insultos o agresiones", 2),
-                (1, "Me siento incómodo/a o inseguro/a en casa", 3),
-                
-                # Pregunta 2 - Miedo, humillación, culpa
-                (2, "No, nunca", 0),
-                (2, "A veces, pero no sé si es normal", 1),
-                (2, "Sí, con frecuencia", 2),
-                (2, "Sí, siempre", 3),
-                
-                # Pregunta 3 - Miedo con gestos
-                (3, "No, nunca", 0),
-                (3, "A veces", 1),
-                (3, "Sí, frecuentemente", 2),
-                (3, "Sí, constantemente", 3),
-                
-                # Pregunta 4 - A quién acudir
-                (4, "A un amigo/familiar de confianza", 0),
-                (4, "A un profesional de salud, asistente social o Carabineros", 1),
-                (4, "No sabría qué hacer", 2),
-                (4, "No tengo a quién acudir", 3),
-                
-                # Pregunta 5 - Agresión física
-                (5, "No, nunca", 0),
-                (5, "Una vez, en una situación puntual", 1),
-                (5, "Varias veces", 2),
-                (5, "Sí, actualmente ocurre", 3),
-                
-                # Pregunta 6 - Presenciar violencia
-                (6, "No", 0),
-                (6, "Sí, una vez", 1),
-                (6, "Varias veces", 2),
-                (6, "Sí, recientemente", 3)
-            ]
-            
-            for question_id, texto, puntaje in options:
-                cur.execute("INSERT INTO options (pregunta_id, texto, puntaje) VALUES (?, ?, ?)", 
-                          (question_id, texto, puntaje))
-        
-        conn.commit()
-        print("✅ Base de datos de violencia intrafamiliar lista!")
-        
+        if migraciones.asegurar_esquema(get_db_connection, True):
+            catalogo.invalidar()
+            print("✅ Base de datos de violencia intrafamiliar lista!")
     except Exception as e:
         print(f"❌ Error: {e}")
-        conn.rollback()
-    finally:
-        cur.close()
-        conn.close()
 
 @app.route('/')
 def index():
@@ -152,223 +48,82 @@ def mision():
 
 @app.route('/survey')
 def survey():
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    # Obtener preguntas
-    cur.execute("SELECT id, texto as pregunta FROM questions ORDER BY id")
-    questions_data = cur.fetchall()
-    
-    questions = []
-    for q in questions_data:
-        # Obtener opciones para cada pregunta
-        cur.execute("SELECT id, texto FROM options WHERE pregunta_id = ? ORDER BY id", (q['id'],))
-        opciones = cur.fetchall()
-        questions.append({
-            'id': q['id'],
-            'pregunta': q['pregunta'],
-            'opciones': [{'id': o['id'], 'texto': o['texto']} for o in opciones]
-        })
-    
-    cur.close()
-    conn.close()
-    
-    return render_template('survey.html', questions=questions)
+    # Preguntas y opciones del catálogo en memoria
+    return render_template('survey.html', questions=catalogo.obtener().preguntas)
 
 @app.route('/api/submit-survey', methods=['POST'])
 def submit_survey():
-    data = request.json
-    conn = get_db_connection()
-    cur = conn.cursor()
+    # Validar y puntuar contra el catálogo en memoria (sin consultas)
+    try:
+        envio = preparar_envio(catalogo, request.get_json(silent=True))
+    except RespuestaInvalida as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    puntaje_total = envio.puntaje_total
+    clasificacion = envio.clasificacion
     
     try:
-        user_id = None
-        puntaje_total = 0
-        
-        # Calcular puntaje total primero
-        for question_id, option_id in data['responses'].items():
-            cur.execute("SELECT puntaje FROM options WHERE id = ?", (int(option_id),))
-            result = cur.fetchone()
-            if result:
-                puntaje_total += result['puntaje']
-        
-        # Determinar clasificación
-        if puntaje_total <= 5:
-            clasificacion = 'Leve'
-        elif puntaje_total <= 11:
-            clasificacion = 'Moderado'
-        else:
-            clasificacion = 'Grave'
-        
-        # CREAR USUARIO SIEMPRE (anónimo o no)
-        if data.get('is_anonymous'):
-            # Para encuestas anónimas, usar datos genéricos
-            cur.execute("""
-                INSERT INTO users (nombre, email, edad, sexo, puntaje_total, clasificacion, timestamp)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                "Anónimo",
-                "anonimo@encuesta.com",
-                0,  # Edad genérica
-                "Prefiero no decirlo",  # Género para anónimos
-                puntaje_total,
-                clasificacion,
-                datetime.now()
-            ))
-            user_id = cur.lastrowid
-        else:
-            # Para encuestas con datos personales
-            cur.execute("""
-                INSERT INTO users (nombre, email, edad, sexo, puntaje_total, clasificacion, timestamp)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                data['nombre'],
-                data['email'],
-                data['edad'],
-                data['sexo'],
-                puntaje_total,
-                clasificacion,
-                datetime.now()
-            ))
-            user_id = cur.lastrowid
-        
-        # Insertar respuestas con puntajes
-        for question_id, option_id in data['responses'].items():
-            # Obtener puntaje de la opción
-            cur.execute("SELECT puntaje FROM options WHERE id = ?", (int(option_id),))
-            result = cur.fetchone()
-            puntaje_respuesta = result['puntaje'] if result else 0
-            
-            cur.execute("""
-                INSERT INTO responses (user_id, pregunta_id, respuesta, puntaje)
-                VALUES (?, ?, ?, ?)
-            """, (user_id, int(question_id), int(option_id), puntaje_respuesta))
-        
-        conn.commit()
-        print(f"✅ Encuesta guardada - Usuario: {user_id}, Puntaje: {puntaje_total}, Clasificación: {clasificacion}")
-        return jsonify({
-            'success': True, 
-            'puntaje': puntaje_total, 
-            'clasificacion': clasificacion
-        })
-        
+        # Usuario, respuestas y contadores del dashboard en una transacción
+        user_id = repositorio.guardar_encuestas([envio])[0]
     except Exception as e:
-        conn.rollback()
         print(f"❌ Error: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
-    finally:
-        cur.close()
-        conn.close()
+    
+    print(f"✅ Encuesta guardada - Usuario: {user_id}, Puntaje: {puntaje_total}, Clasificación: {clasificacion}")
+    return jsonify({
+        'success': True, 
+        'puntaje': puntaje_total, 
+        'clasificacion': clasificacion
+    })
+
+def leer_rango():
+    """Fechas ?from=&to= (YYYY-MM-DD, inclusivas); las inválidas se ignoran"""
+    rango = []
+    for parametro in ('from', 'to'):
+        try:
+            rango.append(date.fromisoformat(request.args.get(parametro, '')))
+        except ValueError:
+            rango.append(None)
+    desde, hasta = rango
+    if desde and hasta and desde > hasta:
+        desde, hasta = hasta, desde
+    return desde, hasta
 
 @app.route('/dashboard')
 def dashboard():
-    conn = get_db_connection()
-    cur = conn.cursor()
+    # Las cifras se cargan desde /api/stats
+    return render_template('dashboard.html')
+
+@app.route('/api/stats/stream')
+def api_stats_stream():
+    # Sin conexiones largas en modo local/Vercel: 204 indica al navegador que no
+    # reconecte y el dashboard consulta /api/stats periódicamente
+    return '', 204
+
+@app.route('/api/stats')
+def api_stats():
+    desde, hasta = leer_rango()
     
     try:
-        # Total de ENCUESTAS COMPLETADAS (ahora todas están en users)
-        cur.execute("SELECT COUNT(*) as total FROM users")
-        result = cur.fetchone()
-        total_surveys = result['total'] if result else 0
-        
-        # Estadísticas por género CON PORCENTAJES (incluye anónimos como "Prefiero no decirlo")
-        cur.execute("SELECT sexo, COUNT(*) as count FROM users GROUP BY sexo")
-        gender_data = cur.fetchall()
-        
-        # Calcular porcentajes de género
-        total_users = sum(row['count'] for row in gender_data)
-        gender_stats = []
-        for row in gender_data:
-            percentage = (row['count'] / total_users * 100) if total_users > 0 else 0
-            gender_stats.append({
-                'sexo': row['sexo'],
-                'count': row['count'],
-                'percentage': round(percentage, 1)
-            })
-        
-        # Contar encuestas anónimas para el porcentaje
-        cur.execute("SELECT COUNT(*) as count FROM users WHERE nombre = 'Anónimo'")
-        result = cur.fetchone()
-        total_anonymous = result['count'] if result else 0
-        
-        # Porcentaje de encuestas anónimas
-        anonymous_percentage = (total_anonymous / total_surveys * 100) if total_surveys > 0 else 0
-        
-        # Estadísticas de CLASIFICACIÓN (incluye anónimos)
-        cur.execute("""
-            SELECT clasificacion, COUNT(*) as count
-            FROM users 
-            GROUP BY clasificacion
-        """)
-        classification_data = cur.fetchall()
-        
-        # Calcular porcentajes de clasificación
-        total_classified = sum(row['count'] for row in classification_data)
-        classification_stats = []
-        for row in classification_data:
-            percentage = (row['count'] / total_classified * 100) if total_classified > 0 else 0
-            classification_stats.append({
-                'clasificacion': row['clasificacion'],
-                'count': row['count'],
-                'percentage': round(percentage, 1)
-            })
-        
-        # Estadísticas por pregunta (sin cambios)
-        cur.execute("""
-            SELECT q.id, q.texto as pregunta,
-                   o.id as option_id, o.texto as opcion, o.puntaje,
-                   COUNT(r.id) as count
-            FROM questions q
-            LEFT JOIN options o ON q.id = o.pregunta_id
-            LEFT JOIN responses r ON o.id = r.respuesta
-            GROUP BY q.id, q.texto, o.id, o.texto, o.puntaje
-            ORDER BY q.id, o.id
-        """)
-        
-        question_stats = cur.fetchall()
-        
-        # Organizar por pregunta
-        questions_data = {}
-        for stat in question_stats:
-            q_id = stat['id']
-            if q_id not in questions_data:
-                questions_data[q_id] = {
-                    'pregunta': stat['pregunta'],
-                    'opciones': [],
-                    'total_responses': 0
-                }
-            
-            questions_data[q_id]['opciones'].append({
-                'opcion': stat['opcion'],
-                'puntaje': stat['puntaje'],
-                'count': stat['count']
-            })
-            questions_data[q_id]['total_responses'] += stat['count']
-        
-        # Calcular porcentajes
-        for q_data in questions_data.values():
-            total = q_data['total_responses']
-            for opcion in q_data['opciones']:
-                opcion['percentage'] = (opcion['count'] / total * 100) if total > 0 else 0
-        
+        # Todas las cifras salen de las tablas de contadores (rollups diarios si hay rango)
+        contexto = repositorio.leer_dashboard(desde, hasta)
     except Exception as e:
-        print(f"Error en dashboard: {e}")
-        total_surveys = 0
-        gender_stats = []
-        anonymous_percentage = 0
-        classification_stats = []
-        questions_data = {}
-    
-    finally:
-        cur.close()
-        conn.close()
+        print(f"Error en stats: {e}")
+        return jsonify({'error': str(e)}), 500
     
-    return render_template('dashboard.html', 
-                         total_surveys=total_surveys,
-                         gender_stats=gender_stats,
-                         anonymous_percentage=anonymous_percentage,
-                         classification_stats=classification_stats,
-                         questions_data=questions_data)
+    response = jsonify(estadisticas.a_json(contexto, desde, hasta))
+    sufijo = f"-{desde or ''}-{hasta or ''}" if desde or hasta else ''
+    response.set_etag(f"v{contexto['data_version']}{sufijo}")
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@app.route('/api/series')
+def series():
+    try:
+        desde, hasta = estadisticas.rango_series(*leer_rango())
+    except estadisticas.RangoInvalido as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(repositorio.leer_series(desde, hasta,
+                                           estadisticas.granularidad_series(request.args.get('granularidad'))))
 
 if __name__ == '__main__':
     print("🚀 Iniciando aplicación de encuestas (modo local)...")
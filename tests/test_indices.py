@@ -0,0 +1,52 @@
+"""
+Planes de las consultas calientes sobre una base SQLite sembrada: ninguna puede
+recorrer users/responses (ni un índice entero fuera de las reconstrucciones)
+
+    python -m unittest discover tests
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import indices
+import migraciones
+
+
+class PlanesConsultasCalientes(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directorio = tempfile.TemporaryDirectory()
+        cls.ruta = os.path.join(cls.directorio.name, 'survey_local.db')
+        conn = sqlite3.connect(cls.ruta)
+        try:
+            migraciones.migrar(conn, True)
+        finally:
+            conn.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directorio.cleanup()
+
+    def verificar(self, consultas=indices.CONSULTAS_CALIENTES):
+        return indices.verificar_planes(None, True, 5000, ruta_sqlite=self.ruta, consultas=consultas)
+
+    def test_consultas_calientes_sin_recorridos(self):
+        self.assertEqual(self.verificar(), [])
+
+    def test_detecta_recorrido_con_alias(self):
+        fallas = self.verificar([('con_alias', "SELECT r.id FROM responses r WHERE r.puntaje > 2")])
+        self.assertEqual([nombre for nombre, _ in fallas], ['con_alias'])
+
+    def test_indice_entero_solo_en_reconstrucciones(self):
+        consulta = "SELECT sexo, COUNT(*) FROM users GROUP BY sexo"
+        self.assertEqual(self.verificar([('reconstruir_stats_sexo', consulta)]), [])
+        fallas = self.verificar([('dashboard', consulta)])
+        self.assertEqual([nombre for nombre, _ in fallas], ['dashboard'])
+
+
+if __name__ == '__main__':
+    unittest.main()